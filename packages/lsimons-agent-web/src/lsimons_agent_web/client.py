@@ -2,9 +2,11 @@
 
 import json
 import sys
+import uuid
 from typing import Any
 
 import httpx
+from lsimons_agent.agent import format_timing
 
 # ANSI color codes
 CYAN = "\033[36m"
@@ -32,13 +34,15 @@ ASCII_ART = f"""{CYAN}{BOLD}
 def run() -> None:
     """Run the CLI client that connects to the web server."""
     base_url = "http://localhost:8765"
+    session_id = uuid.uuid4().hex  # Keeps this client's conversation apart from others
 
     print(ASCII_ART)
     print(f"{BOLD}{MAGENTA}lsimons-agent{RESET}")
     print(f"{DIM}{'─' * 40}{RESET}")
-    print(f"{DIM}Type a message, /clear to reset, Ctrl+C to exit{RESET}")
+    print(f"{DIM}Type a message, /clear to reset, /timing to time turns, Ctrl+C to exit{RESET}")
     print()
 
+    timing = False
     while True:
         try:
             user_input = input(f"{BOLD}{GREEN}You:{RESET} ").strip()
@@ -51,24 +55,29 @@ def run() -> None:
 
         if user_input == "/clear":
             try:
-                httpx.post(f"{base_url}/clear", timeout=10.0)
+                httpx.post(f"{base_url}/clear", json={"session_id": session_id}, timeout=10.0)
                 print(f"{DIM}Cleared.{RESET}")
             except httpx.RequestError as e:
                 print(f"{RED}Error: {e}{RESET}")
             continue
 
+        if user_input == "/timing":
+            timing = not timing
+            print(f"{DIM}Timing {'on' if timing else 'off'}.{RESET}")
+            continue
+
         try:
-            _send_message(base_url, user_input)
+            _send_message(base_url, user_input, session_id, timing)
         except httpx.RequestError as e:
             print(f"{RED}Error: {e}{RESET}")
 
 
-def _send_message(base_url: str, message: str) -> None:
+def _send_message(base_url: str, message: str, session_id: str, timing: bool = False) -> None:
     """Send a message and stream the response."""
     with httpx.stream(
         "POST",
         f"{base_url}/chat",
-        json={"message": message},
+        json={"message": message, "session_id": session_id, "timing": timing},
         timeout=300.0,
     ) as response:
         response.raise_for_status()
@@ -82,18 +91,18 @@ def _send_message(base_url: str, message: str) -> None:
             elif line.startswith("data: "):
                 data: dict[str, Any] = json.loads(line[6:])
                 _handle_event(event_type, data, current_text)
-                if event_type == "text":
+                if event_type in ("text", "text_delta"):
                     if not current_text:
                         current_text = str(data.get("content", ""))
                     else:
                         current_text += str(data.get("content", ""))
-                elif event_type in ("tool", "done"):
+                elif event_type in ("tool", "tool_output", "compacted", "timing", "done"):
                     current_text = ""
 
 
 def _handle_event(event_type: str | None, data: dict[str, Any], current_text: str) -> None:
     """Handle a single SSE event."""
-    if event_type == "text":
+    if event_type in ("text", "text_delta"):
         content = str(data.get("content", ""))
         if not current_text:
             # First text chunk - print prefix
@@ -105,6 +114,14 @@ def _handle_event(event_type: str | None, data: dict[str, Any], current_text: st
         name = str(data.get("name", ""))
         args: dict[str, Any] = data.get("args", {})
         print(f"\n{YELLOW}[Tool: {name}({format_args(args)})]{RESET}")
+    elif event_type == "tool_output":
+        sys.stdout.write(f"{DIM}{data.get('content', '')}{RESET}")
+        sys.stdout.flush()
+    elif event_type == "compacted":
+        before, after = data.get("tokens_before"), data.get("tokens_after")
+        print(f"\n{DIM}[Context compacted: {before} -> {after} tokens]{RESET}")
+    elif event_type == "timing" and data.get("step") == "turn":
+        print(f"\n{DIM}[{format_timing(data)}]{RESET}")
     elif event_type == "done":
         print("\n")
 
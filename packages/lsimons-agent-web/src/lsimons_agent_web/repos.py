@@ -0,0 +1,126 @@
+"""In-memory index of the git repositories under ~/git/<org>/<repo>.
+
+Adding, removing or renaming a repo directory changes the mtime of its org
+directory, so an org is only rescanned when its mtime changed. Directories
+that are not (yet) git repos are re-checked on every refresh, which catches
+a `git init` in an existing directory. Orgs that need a rescan are scanned
+in parallel.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from lsimons_agent import metrics
+
+_refresh_seconds = metrics.histogram(
+    "lsimons_agent_web_repo_scan_seconds",
+    "Refreshes of the repo list: listing orgs and rescanning the ones that changed",
+)
+
+
+@dataclass
+class _Org:
+    mtime_ns: int
+    repos: list[str]
+    candidates: list[str] = field(default_factory=list[str])  # Subdirectories without .git
+
+
+def _is_repo(path: str) -> bool:
+    return os.path.exists(os.path.join(path, ".git"))
+
+
+def _scan_org(path: str, mtime_ns: int) -> _Org:
+    """List the git repos (and other subdirectories) of an org directory."""
+    org = _Org(mtime_ns, [])
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_dir():
+                    continue
+                if _is_repo(entry.path):
+                    org.repos.append(entry.name)
+                else:
+                    org.candidates.append(entry.name)
+    except OSError:
+        pass  # Removed or unreadable since it was listed
+    org.repos.sort()
+    return org
+
+
+class RepoIndex:
+    """Repos per org, refreshed incrementally."""
+
+    def __init__(self, base_dir: Path, max_workers: int = 8):
+        self.base_dir = base_dir
+        self.max_workers = max_workers
+        self.scans = 0  # Org directories scanned so far
+        self._orgs: dict[str, _Org] = {}
+        self._repos: dict[str, list[str]] = {}
+        self._etag = ""
+        self._lock = threading.Lock()
+        self._update_etag()
+
+    def get(self) -> tuple[dict[str, list[str]], str]:
+        """Refresh the index and return (repos by org, ETag)."""
+        with self._lock, _refresh_seconds.time():
+            if self._refresh():
+                self._repos = {
+                    name: org.repos for name, org in sorted(self._orgs.items()) if org.repos
+                }
+                self._update_etag()
+            return self._repos, self._etag
+
+    def _refresh(self) -> bool:
+        """Bring the index up to date; return whether anything changed."""
+        current: dict[str, int] = {}
+        try:
+            with os.scandir(self.base_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_dir():
+                        continue
+                    try:
+                        current[entry.name] = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+        except OSError:
+            pass  # No ~/git
+
+        changed = current.keys() != self._orgs.keys()
+        for name in self._orgs.keys() - current.keys():
+            del self._orgs[name]
+
+        stale = [
+            name
+            for name, mtime in current.items()
+            if name not in self._orgs or self._orgs[name].mtime_ns != mtime
+        ]
+        if stale:
+            changed = True
+            paths = [str(self.base_dir / name) for name in stale]
+            mtimes = [current[name] for name in stale]
+            if len(stale) == 1:
+                scanned = [_scan_org(paths[0], mtimes[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(stale))) as pool:
+                    scanned = list(pool.map(_scan_org, paths, mtimes))
+            self._orgs.update(zip(stale, scanned, strict=True))
+            self.scans += len(stale)
+
+        # A directory can become a repo without its org's mtime changing
+        for name, org in self._orgs.items():
+            path = self.base_dir / name
+            initialized = [d for d in org.candidates if _is_repo(str(path / d))]
+            if initialized:
+                changed = True
+                org.candidates = [d for d in org.candidates if d not in initialized]
+                org.repos = sorted(org.repos + initialized)
+        return changed
+
+    def _update_etag(self) -> None:
+        body = json.dumps(self._repos, separators=(",", ":")).encode()
+        self._etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
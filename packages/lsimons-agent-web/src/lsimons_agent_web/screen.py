@@ -0,0 +1,645 @@
+"""Headless terminal screen model for terminal reconnects.
+
+Screen interprets PTY output the way xterm.js does (the subset of VT100/xterm
+control sequences that shells and full-screen TUIs use) and keeps the visible
+screen plus a bounded number of history lines. snapshot() serializes that
+state, with as much recent history as fits in SNAPSHOT_HISTORY_BYTES, into a
+compact byte stream which redraws it on a fresh terminal, so a reconnecting
+viewer gets a small bounded payload instead of a replay of raw output, which
+might also start in the middle of an escape sequence.
+
+Every code point is one column wide, except East Asian wide characters (two)
+and combining characters (zero).
+"""
+
+import codecs
+import re
+import unicodedata
+from collections import deque
+
+# A cell is (text, style); style is the SGR parameter string, "" for default.
+# The second column of a wide character holds ("", style).
+Cell = tuple[str, str]
+Line = list[Cell]
+
+BLANK: Cell = (" ", "")
+
+# Escape sequences: CSI (params, intermediates, final), OSC and DCS/SOS/PM/APC
+# strings (ignored), and two-character ESC sequences (intermediates, final).
+_ESCAPE = re.compile(
+    r"\x1b(?:\[([0-?]*)([ -/]*)([@-~])"
+    r"|\][^\x07\x1b]*(?:\x07|\x1b\\)"
+    r"|[P^_X].*?\x1b\\"
+    r"|([ -/]*)([0-OQ-WYZ\\`-~]))",
+    re.DOTALL,
+)
+# The start of an escape sequence that continues in the next chunk
+_PARTIAL_ESCAPE = re.compile(
+    r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[P^_X].*|[ -/]*)\Z", re.DOTALL
+)
+_TEXT = re.compile(r"[^\x00-\x1f\x7f-\x9f]+")
+MAX_PARTIAL = 16 * 1024  # Longest incomplete escape sequence kept between chunks
+SNAPSHOT_HISTORY_BYTES = 16 * 1024  # History that snapshot() includes, newest lines first
+
+# DEC special graphics (ESC ( 0), used for line drawing
+_DEC_GRAPHICS = str.maketrans(
+    "`abcdefghijklmnopqrstuvwxyz{|}~",
+    "◆▒␉␌␍␊°±␤␋┘┐┌└┼⎺⎻─⎼⎽├┤┴┬│≤≥π≠£·",
+)
+
+# SGR attribute flags, in the order they are serialized
+_FLAGS = {
+    1: "bold",
+    2: "dim",
+    3: "italic",
+    4: "underline",
+    5: "blink",
+    7: "inverse",
+    8: "hidden",
+    9: "strike",
+}
+_FLAG_OFF = {
+    22: ("bold", "dim"),
+    23: ("italic",),
+    24: ("underline",),
+    25: ("blink",),
+    27: ("inverse",),
+    28: ("hidden",),
+    29: ("strike",),
+}
+
+# Private modes (CSI ? n h/l) replayed by snapshot(), with their defaults:
+# cursor keys, cursor blink, cursor visible, mouse reporting, focus events
+# and bracketed paste.
+_TRACKED_MODES = {
+    1: False,
+    12: False,
+    25: True,
+    1000: False,
+    1002: False,
+    1003: False,
+    1004: False,
+    1005: False,
+    1006: False,
+    1015: False,
+    2004: False,
+}
+
+
+def _char_width(char: str) -> int:
+    if unicodedata.combining(char) or char in "\u200b\u200c\u200d\ufe0e\ufe0f":
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in "WF" else 1
+
+
+def _apply_sgr(attrs: dict[str, bool | str], params: str) -> dict[str, bool | str]:
+    """Update SGR attributes (bold, colors, ...) from the parameters of CSI ... m."""
+    parts = params.split(";") if params else ["0"]
+    i = 0
+    while i < len(parts):
+        part = parts[i]
+        i += 1
+        if ":" in part:
+            # Sub-parameters: 38:2::r:g:b colors, 4:3 curly underline
+            head, _, rest = part.partition(":")
+            if head == "38":
+                attrs["fg"] = part
+            elif head == "48":
+                attrs["bg"] = part
+            elif head == "4":
+                attrs["underline"] = rest not in ("", "0")
+            continue
+        code = int(part) if part.isdigit() else 0
+        if code == 0:
+            attrs.clear()
+        elif code in _FLAGS:
+            attrs[_FLAGS[code]] = True
+        elif code == 6:
+            attrs["blink"] = True
+        elif code == 21:
+            attrs["underline"] = True
+        elif code in _FLAG_OFF:
+            for name in _FLAG_OFF[code]:
+                attrs.pop(name, None)
+        elif 30 <= code <= 37 or 90 <= code <= 97:
+            attrs["fg"] = str(code)
+        elif 40 <= code <= 47 or 100 <= code <= 107:
+            attrs["bg"] = str(code)
+        elif code == 39:
+            attrs.pop("fg", None)
+        elif code == 49:
+            attrs.pop("bg", None)
+        elif code in (38, 48, 58) and i < len(parts):
+            # Extended color: 5;n (256 colors) or 2;r;g;b (truecolor)
+            count = 2 if parts[i] == "5" else 4 if parts[i] == "2" else 1
+            color = ";".join([part, *parts[i : i + count]])
+            i += count
+            if code != 58:  # Underline color is not tracked
+                attrs["fg" if code == 38 else "bg"] = color
+    return attrs
+
+
+def _style_of(attrs: dict[str, bool | str]) -> tuple[str, Cell]:
+    """Return the style string for SGR attributes, and the cell that erasing leaves."""
+    codes = [str(code) for code, name in _FLAGS.items() if attrs.get(name)]
+    for key in ("fg", "bg"):
+        value = attrs.get(key)
+        if isinstance(value, str):
+            codes.append(value)
+    # Erasing fills with the current background color, like xterm
+    background = attrs.get("bg")
+    return ";".join(codes), (" ", background) if isinstance(background, str) else BLANK
+
+
+class Screen:
+    """Terminal screen state kept up to date from PTY output."""
+
+    def __init__(self, rows: int = 24, cols: int = 80, history: int = 1000):
+        self.rows = rows
+        self.cols = cols
+        self.history: deque[Line] = deque(maxlen=history)  # Lines scrolled off the top
+        self.lines: list[Line] = self._blank_lines(rows)  # Visible screen
+        self._main_lines: list[Line] | None = None  # Main screen while the alternate is shown
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial = ""  # Incomplete escape sequence from the previous chunk
+        self._sgr_cache: dict[tuple[str, str], tuple[dict[str, bool | str], str, Cell]] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Full reset (ESC c): clear the screen and history, default modes."""
+        self.history.clear()
+        self.lines = self._blank_lines(self.rows)
+        self._main_lines = None
+        self.x = 0
+        self.y = 0
+        self._wrap_pending = False
+        self.top = 0
+        self.bottom = self.rows - 1
+        self._reset_modes()
+
+    def _reset_modes(self) -> None:
+        self._attrs: dict[str, bool | str] = {}  # Never mutated: shared with the SGR cache
+        self.style = ""
+        self._erase: Cell = BLANK
+        self.modes = dict(_TRACKED_MODES)
+        self.autowrap = True
+        self.origin = False
+        self.keypad = False
+        self.graphics = False
+        self._saved: tuple[int, int, dict[str, bool | str], bool, bool] | None = None
+        self._last_char = " "
+
+    @property
+    def alternate(self) -> bool:
+        """Whether the alternate screen (used by full-screen programs) is shown."""
+        return self._main_lines is not None
+
+    def _blank_lines(self, count: int) -> list[Line]:
+        return [[BLANK] * self.cols for _ in range(count)]
+
+    def feed(self, data: bytes) -> None:
+        """Apply a chunk of PTY output."""
+        text = self._partial + self._decoder.decode(data)
+        self._partial = ""
+        pos = 0
+        end = len(text)
+        while pos < end:
+            char = text[pos]
+            if char == "\x1b":
+                match = _ESCAPE.match(text, pos)
+                if match is None:
+                    if end - pos < MAX_PARTIAL and _PARTIAL_ESCAPE.match(text, pos):
+                        self._partial = text[pos:]
+                        return
+                    pos += 1  # Malformed: drop the ESC, print the rest
+                    continue
+                pos = match.end()
+                final = match.group(3)
+                if final is not None:
+                    self._csi(match.group(1), match.group(2), final)
+                elif match.group(5) is not None:
+                    self._esc(match.group(4), match.group(5))
+            elif char < " " or "\x7f" <= char <= "\x9f":
+                self._control(char)
+                pos += 1
+            else:
+                match = _TEXT.match(text, pos)
+                assert match is not None
+                self._print(match.group())
+                pos = match.end()
+
+    # Printing
+
+    def _print(self, text: str) -> None:
+        if self.graphics:
+            text = text.translate(_DEC_GRAPHICS)
+        if text.isascii():
+            self._put(text)
+            return
+        run: list[str] = []
+        for char in text:
+            width = _char_width(char)
+            if width == 1:
+                run.append(char)
+                continue
+            if run:
+                self._put("".join(run))
+                run.clear()
+            if width == 0:
+                self._combine(char)
+            else:
+                self._put_wide(char)
+        if run:
+            self._put("".join(run))
+
+    def _wrap(self) -> None:
+        if self._wrap_pending:
+            self._wrap_pending = False
+            self.x = 0
+            self._linefeed()
+
+    def _put(self, text: str) -> None:
+        """Write single-width characters at the cursor, wrapping at the right margin."""
+        style = self.style
+        start = 0
+        while start < len(text):
+            self._wrap()
+            count = min(len(text) - start, self.cols - self.x)
+            chunk = text[start : start + count]
+            self.lines[self.y][self.x : self.x + count] = [(char, style) for char in chunk]
+            start += count
+            self.x += count
+            if self.x >= self.cols:
+                self.x = self.cols - 1
+                self._wrap_pending = self.autowrap
+        self._last_char = text[-1]
+
+    def _put_wide(self, char: str) -> None:
+        if self.cols < 2:
+            return
+        self._wrap()
+        if self.x == self.cols - 1:
+            if not self.autowrap:
+                return
+            self.lines[self.y][self.x] = self._erase
+            self._wrap_pending = True
+            self._wrap()
+        line = self.lines[self.y]
+        line[self.x] = (char, self.style)
+        line[self.x + 1] = ("", self.style)
+        self.x += 2
+        if self.x >= self.cols:
+            self.x = self.cols - 1
+            self._wrap_pending = self.autowrap
+        self._last_char = char
+
+    def _combine(self, char: str) -> None:
+        x = self.x if self._wrap_pending else self.x - 1
+        line = self.lines[self.y]
+        if x > 0 and line[x][0] == "":
+            x -= 1  # Second half of a wide character
+        if x >= 0:
+            text, style = line[x]
+            line[x] = (text + char, style)
+
+    # Control characters and escape sequences
+
+    def _control(self, char: str) -> None:
+        if char == "\r":
+            self.x = 0
+            self._wrap_pending = False
+        elif char in "\n\x0b\x0c":
+            self._linefeed()
+        elif char == "\b":
+            self.x = max(0, self.x - 1)
+            self._wrap_pending = False
+        elif char == "\t":
+            self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+            self._wrap_pending = False
+
+    def _esc(self, intermediates: str, final: str) -> None:
+        if intermediates == "(":
+            self.graphics = final == "0"
+        elif intermediates:
+            pass
+        elif final == "c":
+            self.reset()
+        elif final == "7":
+            self._save_cursor()
+        elif final == "8":
+            self._restore_cursor()
+        elif final == "D":
+            self._linefeed()
+        elif final == "E":
+            self.x = 0
+            self._linefeed()
+        elif final == "M":
+            self._reverse_index()
+        elif final == "=":
+            self.keypad = True
+        elif final == ">":
+            self.keypad = False
+
+    def _csi(self, params: str, intermediates: str, final: str) -> None:
+        prefix = ""
+        if params and params[0] in "<=>?":
+            prefix, params = params[0], params[1:]
+        if intermediates:
+            if intermediates == "!" and final == "p":
+                self._reset_modes()  # DECSTR soft reset
+            return
+        if prefix == "?":
+            if final in "hl":
+                for mode in self._ints(params):
+                    self._set_private_mode(mode, final == "h")
+            return
+        if prefix:
+            return
+        if final == "m":
+            self._sgr(params)
+            return
+
+        args = self._ints(params)
+        n = args[0] if args and args[0] > 0 else 1
+        self._wrap_pending = False
+        if final == "A":
+            self.y = max(self.top if self.y >= self.top else 0, self.y - n)
+        elif final in "Be":
+            self.y = min(self.bottom if self.y <= self.bottom else self.rows - 1, self.y + n)
+        elif final in "Ca":
+            self.x = min(self.cols - 1, self.x + n)
+        elif final == "D":
+            self.x = max(0, self.x - n)
+        elif final == "E":
+            self.y = min(self.bottom if self.y <= self.bottom else self.rows - 1, self.y + n)
+            self.x = 0
+        elif final == "F":
+            self.y = max(self.top if self.y >= self.top else 0, self.y - n)
+            self.x = 0
+        elif final in "G`":
+            self.x = min(self.cols - 1, n - 1)
+        elif final in "Hf":
+            column = args[1] if len(args) > 1 and args[1] > 0 else 1
+            self._move_to(n - 1, column - 1)
+        elif final == "d":
+            self._move_to(n - 1, self.x)
+        elif final == "J":
+            self._erase_display(args[0] if args else 0)
+        elif final == "K":
+            self._erase_line(args[0] if args else 0)
+        elif final == "L":
+            self._insert_lines(n)
+        elif final == "M":
+            self._delete_lines(n)
+        elif final == "@":
+            line = self.lines[self.y]
+            line[self.x : self.x] = [self._erase] * min(n, self.cols - self.x)
+            del line[self.cols :]
+        elif final == "P":
+            line = self.lines[self.y]
+            count = min(n, self.cols - self.x)
+            del line[self.x : self.x + count]
+            line.extend([self._erase] * count)
+        elif final == "X":
+            count = min(n, self.cols - self.x)
+            self.lines[self.y][self.x : self.x + count] = [self._erase] * count
+        elif final == "S":
+            self._scroll_up(n)
+        elif final == "T" and len(args) <= 1:
+            self._scroll_down(n)
+        elif final == "r":
+            top = n - 1
+            bottom = (args[1] if len(args) > 1 and args[1] > 0 else self.rows) - 1
+            if top < bottom < self.rows:
+                self.top, self.bottom = top, bottom
+            else:
+                self.top, self.bottom = 0, self.rows - 1
+            self._move_to(0, 0)
+        elif final == "s":
+            self._save_cursor()
+        elif final == "u":
+            self._restore_cursor()
+        elif final == "b":
+            self._put(self._last_char * min(n, self.rows * self.cols))
+        elif final == "I":
+            for _ in range(n):
+                self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+        elif final == "Z":
+            for _ in range(n):
+                self.x = max(0, (self.x - 1) // 8 * 8)
+
+    @staticmethod
+    def _ints(params: str) -> list[int]:
+        return [int(p) if p.isdigit() else 0 for p in params.split(";")] if params else []
+
+    def _set_private_mode(self, mode: int, enabled: bool) -> None:
+        if mode in _TRACKED_MODES:
+            self.modes[mode] = enabled
+        elif mode == 7:
+            self.autowrap = enabled
+        elif mode == 6:
+            self.origin = enabled
+            self._move_to(0, 0)
+        elif mode in (47, 1047, 1049):
+            if mode == 1049 and enabled:
+                self._save_cursor()
+            if enabled and self._main_lines is None:
+                self._main_lines = self.lines
+                self.lines = self._blank_lines(self.rows)
+            elif not enabled and self._main_lines is not None:
+                self.lines = self._main_lines
+                self._main_lines = None
+            if mode == 1049 and not enabled:
+                self._restore_cursor()
+
+    def _sgr(self, params: str) -> None:
+        # Programs repeat the same few SGR sequences, so cache their effect
+        key = (self.style, params)
+        cached = self._sgr_cache.get(key)
+        if cached is None:
+            attrs = _apply_sgr(dict(self._attrs), params)
+            if len(self._sgr_cache) >= 4096:
+                self._sgr_cache.clear()
+            cached = self._sgr_cache[key] = (attrs, *_style_of(attrs))
+        self._attrs, self.style, self._erase = cached
+
+    # Cursor movement, scrolling and erasing
+
+    def _move_to(self, row: int, column: int) -> None:
+        if self.origin:
+            row = min(self.bottom, self.top + row)
+        self.y = max(0, min(self.rows - 1, row))
+        self.x = max(0, min(self.cols - 1, column))
+        self._wrap_pending = False
+
+    def _save_cursor(self) -> None:
+        self._saved = (self.x, self.y, self._attrs, self.origin, self.graphics)
+
+    def _restore_cursor(self) -> None:
+        if self._saved is None:
+            self._move_to(0, 0)
+            return
+        x, y, attrs, self.origin, self.graphics = self._saved
+        self.x = min(x, self.cols - 1)
+        self.y = min(y, self.rows - 1)
+        self._wrap_pending = False
+        self._attrs = attrs
+        self.style, self._erase = _style_of(attrs)
+
+    def _linefeed(self) -> None:
+        self._wrap_pending = False
+        if self.y == self.bottom:
+            self._scroll_up(1)
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _reverse_index(self) -> None:
+        self._wrap_pending = False
+        if self.y == self.top:
+            self._scroll_down(1)
+        elif self.y > 0:
+            self.y -= 1
+
+    def _scroll_up(self, count: int, top: int | None = None) -> None:
+        top = self.top if top is None else top
+        for _ in range(min(count, self.bottom - top + 1)):
+            line = self.lines.pop(top)
+            if top == 0 and self._main_lines is None:
+                self.history.append(line)
+            self.lines.insert(self.bottom, [self._erase] * self.cols)
+
+    def _scroll_down(self, count: int, top: int | None = None) -> None:
+        top = self.top if top is None else top
+        for _ in range(min(count, self.bottom - top + 1)):
+            self.lines.pop(self.bottom)
+            self.lines.insert(top, [self._erase] * self.cols)
+
+    def _insert_lines(self, count: int) -> None:
+        if self.top <= self.y <= self.bottom:
+            self._scroll_down(count, top=self.y)
+            self.x = 0
+
+    def _delete_lines(self, count: int) -> None:
+        if self.top <= self.y <= self.bottom:
+            for _ in range(min(count, self.bottom - self.y + 1)):
+                self.lines.pop(self.y)
+                self.lines.insert(self.bottom, [self._erase] * self.cols)
+            self.x = 0
+
+    def _erase_line(self, mode: int) -> None:
+        line = self.lines[self.y]
+        if mode == 0:
+            line[self.x :] = [self._erase] * (self.cols - self.x)
+        elif mode == 1:
+            line[: self.x + 1] = [self._erase] * (self.x + 1)
+        elif mode == 2:
+            line[:] = [self._erase] * self.cols
+
+    def _erase_display(self, mode: int) -> None:
+        if mode == 3:
+            self.history.clear()
+            return
+        if mode in (0, 1):
+            self._erase_line(mode)
+        rows = {0: range(self.y + 1, self.rows), 1: range(self.y), 2: range(self.rows)}
+        for row in rows.get(mode, ()):
+            self.lines[row] = [self._erase] * self.cols
+
+    def resize(self, rows: int, cols: int) -> None:
+        """Change the screen size, keeping the content around the cursor."""
+        rows = max(1, rows)
+        cols = max(1, cols)
+        for lines in (self.lines, self._main_lines):
+            if lines is None:
+                continue
+            for line in lines:
+                if cols < self.cols:
+                    del line[cols:]
+                else:
+                    line.extend([BLANK] * (cols - self.cols))
+        self.cols = cols
+
+        main = self._main_lines if self._main_lines is not None else self.lines
+        if rows < self.rows:
+            # Drop rows below the cursor first, then scroll rows off the top
+            excess = self.rows - rows
+            below = min(excess, self.rows - 1 - self.y)
+            scrolled = excess - below
+            for lines in (self.lines, self._main_lines):
+                if lines is None:
+                    continue
+                del lines[len(lines) - below :]
+                if lines is main:
+                    self.history.extend(lines[:scrolled])
+                del lines[:scrolled]
+            self.y -= scrolled
+        else:
+            for lines in (self.lines, self._main_lines):
+                if lines is not None:
+                    lines.extend(self._blank_lines(rows - self.rows))
+        self.rows = rows
+        self.top, self.bottom = 0, rows - 1
+        self.x = min(self.x, cols - 1)
+        self.y = max(0, min(self.y, rows - 1))
+        self._wrap_pending = False
+
+    # Serialization
+
+    @staticmethod
+    def _render(line: Line) -> str:
+        end = len(line)
+        while end and line[end - 1] == BLANK:
+            end -= 1
+        parts: list[str] = []
+        style = ""
+        for text, cell_style in line[:end]:
+            if cell_style != style:
+                parts.append(f"\x1b[0;{cell_style}m" if cell_style else "\x1b[0m")
+                style = cell_style
+            parts.append(text)
+        if style:
+            parts.append("\x1b[0m")
+        return "".join(parts)
+
+    def text(self) -> str:
+        """The visible screen as plain text, one line per row."""
+        return "\n".join("".join(text for text, _ in line).rstrip() for line in self.lines)
+
+    def snapshot(self, history_bytes: int = SNAPSHOT_HISTORY_BYTES) -> bytes:
+        """
+        Serialize the screen so that writing it to a fresh terminal of the same
+        size reproduces it: the most recent history_bytes of history, visible
+        screen (and the main screen under the alternate one), cursor, colors
+        and modes.
+        """
+        main = self._main_lines if self._main_lines is not None else self.lines
+        rows: list[str] = []
+        for line in reversed(self.history):
+            row = self._render(line)
+            history_bytes -= len(row.encode()) + 2
+            if history_bytes < 0:
+                break
+            rows.append(row)
+        rows.reverse()
+        rows += [self._render(line) for line in main]
+        out = ["\x1bc", "\r\n".join(rows)]
+        if self._main_lines is not None:
+            out.append("\x1b[?1049h")
+            out += [f"\x1b[{row + 1}H{self._render(line)}" for row, line in enumerate(self.lines)]
+        if (self.top, self.bottom) != (0, self.rows - 1):
+            out.append(f"\x1b[{self.top + 1};{self.bottom + 1}r")
+        if self.origin:
+            out.append("\x1b[?6h")
+        out.append(f"\x1b[{self.y - (self.top if self.origin else 0) + 1};{self.x + 1}H")
+        for mode, enabled in self.modes.items():
+            if enabled != _TRACKED_MODES[mode]:
+                out.append(f"\x1b[?{mode}{'h' if enabled else 'l'}")
+        if not self.autowrap:
+            out.append("\x1b[?7l")
+        if self.keypad:
+            out.append("\x1b=")
+        if self.graphics:
+            out.append("\x1b(0")
+        if self.style:
+            out.append(f"\x1b[0;{self.style}m")
+        return "".join(out).encode()
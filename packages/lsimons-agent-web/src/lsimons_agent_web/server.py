@@ -1,21 +1,40 @@
 """Web server for lsimons-agent."""
 
-import asyncio
 import contextlib
 import json
 import subprocess
 import sys
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from pathlib import Path
 from typing import Any
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
-from lsimons_agent.agent import new_conversation, process_message
-
+import anyio
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from lsimons_agent import llm, metrics, trigram
+from lsimons_agent.agent import aprocess_message
+
+from lsimons_agent_web.repos import RepoIndex
+from lsimons_agent_web.sessions import DEFAULT_SESSION, Session, SessionStore
 from lsimons_agent_web.terminal import Terminal
 
-app = FastAPI()
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    """Release the shared LLM connection pool and the sessions' shells on shutdown."""
+    yield
+    sessions.close()
+    llm.close()
+    await llm.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Terminal sessions keyed by (project_path, terminal_type, agent)
 # e.g., ("/Users/foo/git/org/repo", "agent", "claude") or ("...", "shell", None)
@@ -33,6 +52,7 @@ AGENT_COMMANDS: dict[str, list[str]] = {
 # Git base directory
 GIT_BASE_DIR = Path.home() / "git"
 DEFAULT_PROJECT = GIT_BASE_DIR / "lsimons" / "lsimons-agent"
+repo_index = RepoIndex(GIT_BASE_DIR)
 
 
 def get_resource_path(relative_path: str) -> Path:
@@ -47,44 +67,66 @@ def get_resource_path(relative_path: str) -> Path:
 TEMPLATES_DIR = get_resource_path("templates")
 STATIC_DIR = get_resource_path("static")
 
-# Single-user conversation state
-messages = new_conversation()
-
-
-def event_stream(user_message: str) -> Generator[str]:
-    """Generate SSE events for a chat response."""
-    for event_type, data in process_message(messages, user_message):
-        if event_type == "text":
-            yield f"event: text\ndata: {json.dumps({'content': data})}\n\n"
-        elif event_type == "tool":
-            yield f"event: tool\ndata: {json.dumps(data)}\n\n"
-        elif event_type == "done":
-            yield "event: done\ndata: {}\n\n"
-
-
-def scan_git_repos() -> dict[str, list[str]]:
-    """Scan ~/git for git repositories, organized by org."""
-    repos: dict[str, list[str]] = {}
-
-    if not GIT_BASE_DIR.exists():
-        return repos
-
-    for org_dir in sorted(GIT_BASE_DIR.iterdir()):
-        if not org_dir.is_dir() or org_dir.name.startswith("."):
-            continue
-
-        org_repos: list[str] = []
-        for repo_dir in sorted(org_dir.iterdir()):
-            if not repo_dir.is_dir() or repo_dir.name.startswith("."):
-                continue
-            # Check if it's a git repo
-            if (repo_dir / ".git").exists():
-                org_repos.append(repo_dir.name)
-
-        if org_repos:
-            repos[org_dir.name] = org_repos
-
-    return repos
+# Conversations, keyed by the session ID clients send with /chat and /clear
+sessions = SessionStore()
+
+# Scraped from /metrics in a worker thread while the event loop changes terminals,
+# so the gauge iterates over a copy
+metrics.gauge(
+    "lsimons_agent_web_terminals",
+    "Terminals running",
+    function=lambda: sum(terminal.is_running() for terminal in list(terminals.values())),
+)
+metrics.gauge(
+    "lsimons_agent_web_chat_sessions", "Chat sessions held", function=lambda: len(sessions)
+)
+_chats = metrics.gauge(
+    "lsimons_agent_web_chats_in_flight", "Chat requests being answered or waiting for their turn"
+)
+_chat_seconds = metrics.histogram(
+    "lsimons_agent_web_chat_seconds", "Time to answer a chat request, including tool calls"
+)
+_websockets = metrics.gauge("lsimons_agent_web_websockets", "Terminal WebSockets open")
+_websocket_bytes = metrics.counter(
+    "lsimons_agent_web_websocket_bytes_total",
+    "Bytes of terminal WebSocket messages, sent (output) or received (input)",
+    ["direction"],
+)
+_websocket_sent = _websocket_bytes.labels("sent")
+_websocket_received = _websocket_bytes.labels("received")
+
+
+async def event_stream(
+    user_message: str, session: Session, timing: bool = False
+) -> AsyncGenerator[str]:
+    """Generate SSE events for a chat response, with timing events if asked for."""
+    _chats.inc()
+    try:
+        async with session.lock:
+            with _chat_seconds.time():
+                events = aprocess_message(
+                    session.messages,
+                    user_message,
+                    stream=True,
+                    shell=session.shell,
+                    budget=session.budget,
+                    timing=timing,
+                )
+                async for event_type, data in events:
+                    if event_type in ("text", "text_delta", "tool_output"):
+                        yield f"event: {event_type}\ndata: {json.dumps({'content': data})}\n\n"
+                    elif event_type in ("tool", "compacted", "timing"):
+                        yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+                    elif event_type == "done":
+                        yield "event: done\ndata: {}\n\n"
+    finally:
+        _chats.dec()
+
+
+def get_session(request: dict[str, Any]) -> Session:
+    """Look up the session named by a request body's session_id."""
+    session_id = str(request.get("session_id") or DEFAULT_SESSION)[:128]
+    return sessions.get(session_id)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -106,77 +148,110 @@ def logo() -> FileResponse:
 
 
 @app.post("/chat")
-def chat_endpoint(request: dict[str, Any]) -> StreamingResponse:
+async def chat_endpoint(request: dict[str, Any]) -> StreamingResponse:
     """Handle chat messages and return SSE stream."""
+    message, timing = str(request.get("message", "")), bool(request.get("timing"))
     return StreamingResponse(
-        event_stream(str(request.get("message", ""))),
+        event_stream(message, get_session(request), timing),
         media_type="text/event-stream",
     )
 
 
+@app.get("/metrics")
+def metrics_endpoint() -> PlainTextResponse:
+    """Serve metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.exposition(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/clear")
-def clear() -> dict[str, str]:
+async def clear(request: dict[str, Any] | None = None) -> dict[str, str]:
     """Clear conversation history."""
-    global messages
-    messages = new_conversation()
+    await get_session(request or {}).reset()
     return {"status": "ok"}
 
 
+def repos_response(repos: dict[str, list[str]], etag: str, request: Request) -> Response:
+    """Return the repo list, or 304 Not Modified if the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(repos, headers=headers)
+
+
 @app.get("/api/repos")
-def list_repos() -> dict[str, list[str]]:
+def list_repos(request: Request) -> Response:
     """List available git repositories."""
-    return scan_git_repos()
+    repos, etag = repo_index.get()
+    return repos_response(repos, etag, request)
 
 
 @app.post("/api/sync")
-def sync_repos() -> dict[str, list[str]]:
+def sync_repos(request: Request) -> Response:
     """Run auto git-sync and return updated repo list."""
     with contextlib.suppress(subprocess.CalledProcessError, FileNotFoundError):
         subprocess.run(["auto", "git-sync"], check=True, capture_output=True)
-    return scan_git_repos()
+    repos, etag = repo_index.get()
+    return repos_response(repos, etag, request)
 
 
-async def _handle_terminal_websocket(websocket: WebSocket, terminal: Terminal) -> None:
-    """Handle WebSocket I/O for a terminal."""
-    try:
+async def _handle_terminal_websocket(
+    websocket: WebSocket, terminal: Terminal, rows: int | None = None, cols: int | None = None
+) -> None:
+    """
+    Handle WebSocket I/O for a terminal until either side closes.
+
+    Each WebSocket gets its own subscription, starting with a snapshot of the
+    screen, so any number of viewers can watch (and type into) the same
+    terminal. The client passes its size so the snapshot matches its screen.
+    """
+    if rows and cols:
+        terminal.resize(rows, cols)
+    subscription = terminal.subscribe(replay=True)
+    _websockets.inc()
+
+    async def send_output() -> None:
+        while True:
+            data = await subscription.read()
+            if data is None:
+                return
+            await websocket.send_bytes(data)
+            _websocket_sent.inc(len(data))
+
+    async def receive_input() -> None:
         while True:
-            # Check if terminal is still running
-            if not terminal.is_running():
-                break
-
-            # Poll for terminal output
-            while True:
-                data = terminal.read_nowait()
-                if data is None:
-                    break
+            message = await websocket.receive()
+            if message.get("type") == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                terminal.write(message["bytes"])
+                _websocket_received.inc(len(message["bytes"]))
+            elif message.get("text") is not None:
+                _websocket_received.inc(len(message["text"].encode()))
+                # Handle JSON commands (resize)
                 try:
-                    await websocket.send_bytes(data)
-                except RuntimeError:
-                    # WebSocket already closed
-                    return
-
-            # Check for websocket input (with timeout)
-            try:
-                message = await asyncio.wait_for(websocket.receive(), timeout=0.05)
-                if message.get("type") == "websocket.disconnect":
-                    break
-                if "bytes" in message:
-                    terminal.write(message["bytes"])
-                elif "text" in message:
-                    # Handle JSON commands (resize)
-                    try:
-                        cmd: dict[str, Any] = json.loads(message["text"])
-                        if cmd.get("type") == "resize":
-                            terminal.resize(cmd["rows"], cmd["cols"])
-                    except json.JSONDecodeError:
-                        # Plain text input
-                        terminal.write(message["text"].encode())
-            except TimeoutError:
-                pass
-
-    except WebSocketDisconnect, RuntimeError:
-        # WebSocket disconnected
-        pass
+                    cmd: dict[str, Any] = json.loads(message["text"])
+                    if cmd.get("type") == "resize":
+                        terminal.resize(cmd["rows"], cmd["cols"])
+                except json.JSONDecodeError:
+                    # Plain text input
+                    terminal.write(message["text"].encode())
+
+    try:
+        async with anyio.create_task_group() as tasks:
+
+            async def run_until_closed(pump: Callable[[], Awaitable[None]]) -> None:
+                # A closed WebSocket surfaces as WebSocketDisconnect or RuntimeError,
+                # which just means the session is over.
+                with contextlib.suppress(WebSocketDisconnect, RuntimeError):
+                    await pump()
+                tasks.cancel_scope.cancel()
+
+            tasks.start_soon(run_until_closed, send_output)
+            tasks.start_soon(run_until_closed, receive_input)
+    finally:
+        subscription.close()
+        _websockets.dec()
 
 
 def get_project_path(project: str | None) -> str:
@@ -191,9 +266,20 @@ def get_project_path(project: str | None) -> str:
     return str(DEFAULT_PROJECT)
 
 
+def index_project(project_path: str) -> None:
+    """Bring the project's search index up to date in the background."""
+    project = trigram.project_root(project_path)
+    if trigram.enabled() and project is not None:
+        trigram.update_in_background(project)
+
+
 @app.websocket("/ws/terminal/agent")
 async def terminal_agent_websocket(
-    websocket: WebSocket, agent: str = "lsimons", project: str | None = None
+    websocket: WebSocket,
+    agent: str = "lsimons",
+    project: str | None = None,
+    rows: int | None = None,
+    cols: int | None = None,
 ) -> None:
     """WebSocket endpoint for agent terminal."""
     global terminals
@@ -205,6 +291,7 @@ async def terminal_agent_websocket(
         agent = "lsimons"
 
     project_path = get_project_path(project)
+    index_project(project_path)
     key = (project_path, "agent", agent)
 
     # Clean up dead terminal
@@ -212,28 +299,29 @@ async def terminal_agent_websocket(
         terminals[key].stop()
         del terminals[key]
 
-    # Start new terminal or reconnect to existing
+    # Start new terminal or attach to the existing one
     if key not in terminals:
         terminal = Terminal(command=AGENT_COMMANDS[agent], cwd=project_path)
         terminal.start()
         terminals[key] = terminal
-    else:
-        # Reconnecting - replay scrollback buffer
-        scrollback = terminals[key].get_scrollback()
-        if scrollback:
-            await websocket.send_bytes(scrollback)
 
-    await _handle_terminal_websocket(websocket, terminals[key])
+    await _handle_terminal_websocket(websocket, terminals[key], rows, cols)
 
 
 @app.websocket("/ws/terminal/shell")
-async def terminal_shell_websocket(websocket: WebSocket, project: str | None = None) -> None:
+async def terminal_shell_websocket(
+    websocket: WebSocket,
+    project: str | None = None,
+    rows: int | None = None,
+    cols: int | None = None,
+) -> None:
     """WebSocket endpoint for shell terminal."""
     global terminals
 
     await websocket.accept()
 
     project_path = get_project_path(project)
+    index_project(project_path)
     key = (project_path, "shell", None)
 
     # Clean up dead terminal
@@ -241,22 +329,17 @@ async def terminal_shell_websocket(websocket: WebSocket, project: str | None = N
         terminals[key].stop()
         del terminals[key]
 
-    # Start new terminal or reconnect to existing
+    # Start new terminal or attach to the existing one
     if key not in terminals:
         terminal = Terminal(cwd=project_path)
         terminal.start()
         terminals[key] = terminal
-    else:
-        # Reconnecting - replay scrollback buffer
-        scrollback = terminals[key].get_scrollback()
-        if scrollback:
-            await websocket.send_bytes(scrollback)
 
-    await _handle_terminal_websocket(websocket, terminals[key])
+    await _handle_terminal_websocket(websocket, terminals[key], rows, cols)
 
 
 @app.post("/terminal/stop")
-def terminal_stop() -> dict[str, str]:
+async def terminal_stop() -> dict[str, str]:
     """Stop all terminal sessions."""
     global terminals
     for terminal in terminals.values():
@@ -0,0 +1,109 @@
+"""Conversation sessions for the web server's /chat endpoint.
+
+Each client (e.g. every lsimons-agent-client running in an agent terminal)
+sends its own session ID, so concurrent conversations don't share history.
+Sessions live in a bounded store: the least recently used ones are evicted
+when it is full, and idle ones after a timeout.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import anyio
+from lsimons_agent.agent import new_conversation
+from lsimons_agent.context import ContextBudget
+from lsimons_agent.shell import ShellSession
+
+DEFAULT_SESSION = "default"  # Used by clients that don't send a session ID
+
+
+@dataclass
+class Session:
+    """One conversation and the shell its tool calls run in."""
+
+    id: str
+    messages: list[dict[str, Any]] = field(default_factory=new_conversation)
+    shell: ShellSession = field(default_factory=ShellSession)
+    budget: ContextBudget = field(default_factory=ContextBudget)
+    # Held for a whole turn, so turns within a session run one at a time.
+    # Only used on the event loop.
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = 0.0
+
+    async def reset(self) -> None:
+        """Start a new conversation (waits for a running turn to finish)."""
+        async with self.lock:
+            self.messages = new_conversation()
+            self.budget = ContextBudget()
+            await anyio.to_thread.run_sync(self.shell.close)
+
+
+class SessionStore:
+    """Sessions by ID, bounded in number and idle time."""
+
+    def __init__(
+        self,
+        max_sessions: int = 100,
+        idle_timeout: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self._sessions: OrderedDict[str, Session] = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Session:
+        """Return the session with this ID, creating it if needed."""
+        with self._lock:
+            now = self.clock()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            evicted = self._evict(now)
+        if evicted:
+            # Closing a shell kills its processes and waits for them, which
+            # must not hold up the caller (the event loop, for /chat)
+            threading.Thread(target=_close_shells, args=(evicted,), daemon=True).start()
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _evict(self, now: float) -> list[Session]:
+        """Drop idle sessions, then the least recently used ones over the limit."""
+        evicted: list[Session] = []
+        excess = len(self._sessions) - self.max_sessions
+        for session in list(self._sessions.values())[:-1]:  # Never the one just used
+            idle = now - session.last_used > self.idle_timeout
+            if not idle and excess <= 0:
+                break  # Every later session was used more recently
+            # A session in the middle of a turn is kept until it finishes
+            if not session.lock.locked():
+                del self._sessions[session.id]
+                evicted.append(session)
+                excess -= 1
+        return evicted
+
+    def close(self) -> None:
+        """Stop every session's shell."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.shell.close()
+            self._sessions.clear()
+
+
+def _close_shells(sessions: list[Session]) -> None:
+    for session in sessions:
+        session.shell.close()
@@ -1,43 +1,216 @@
-"""PTY terminal management for browser-based terminal."""
+"""PTY terminal management for browser-based terminal.
 
+PTY output is read on the asyncio event loop (loop.add_reader), so terminals
+must be started, read and stopped from the event loop thread.
+
+Output is appended to a shared log (the scrollback ring buffer). Every
+viewer reads it through its own Subscription cursor, so several WebSockets
+can watch the same terminal without taking chunks from each other.
+
+Output also updates a headless Screen model. A viewer that attaches, or
+falls too far behind, starts from a snapshot of that screen rather than
+from a replay of raw output. Parsing output into the screen is slow, so the
+event loop only appends to the log: the screen catches up with it when a
+snapshot is taken, and in a worker thread once a quarter of the log is
+unparsed. Reading pauses while the unparsed output would no longer fit.
+Resizes are noted at their offset in the log and applied as it catches up.
+"""
+
+import asyncio
 import contextlib
 import fcntl
 import glob
 import os
 import pty
-import select
 import struct
 import termios
 import threading
-from queue import Empty, Queue
+
+from lsimons_agent import metrics
+
+from lsimons_agent_web.screen import Screen
+
+_started = metrics.counter("lsimons_agent_web_terminals_started_total", "Terminals started")
+_output_bytes = metrics.counter(
+    "lsimons_agent_web_terminal_output_bytes_total", "Bytes read from terminals' PTYs"
+).labels()
+_resyncs = metrics.counter(
+    "lsimons_agent_web_terminal_resyncs_total",
+    "Times a viewer fell too far behind and was sent a screen snapshot instead",
+)
+
+
+class RingBuffer:
+    """
+    Fixed-size byte log that keeps the most recent capacity bytes.
+
+    Bytes are addressed by absolute offset (total bytes written before them),
+    so readers can hold a position that stays valid while the buffer wraps.
+    Writes cost O(len(data)) regardless of capacity, and reads return
+    memoryviews into the buffer instead of copies.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.end = 0  # Absolute offset just past the newest byte
+        self._buffer = bytearray(capacity)
+
+    @property
+    def start(self) -> int:
+        """Absolute offset of the oldest byte still held."""
+        return max(0, self.end - self.capacity)
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def write(self, data: bytes) -> None:
+        """Append data, overwriting the oldest bytes once the buffer is full."""
+        size = len(data)
+        pos = self.end % self.capacity
+        if pos + size <= self.capacity:
+            # Common case: fits without wrapping
+            self._buffer[pos : pos + size] = data
+            self.end += size
+            return
+
+        view = memoryview(data)
+        if size > self.capacity:
+            # Only the tail survives; place it where it would have landed
+            self.end += size - self.capacity
+            view = view[size - self.capacity :]
+            size = self.capacity
+        pos = self.end % self.capacity
+        first = min(size, self.capacity - pos)
+        self._buffer[pos : pos + first] = view[:first]
+        self._buffer[: size - first] = view[first:]
+        self.end += size
+
+    def read(self, offset: int, size: int) -> memoryview:
+        """
+        Return up to size bytes starting at an absolute offset, without copying.
+
+        The view stops at the physical end of the buffer, so it may be shorter
+        than what is available; read again from offset + len(view) for the rest.
+        It is only valid until the next write.
+        """
+        if not self.start <= offset <= self.end:
+            raise IndexError(f"offset {offset} outside [{self.start}, {self.end}]")
+        pos = offset % self.capacity
+        size = min(size, self.end - offset, self.capacity - pos)
+        return memoryview(self._buffer)[pos : pos + size].toreadonly()
+
+    def getvalue(self) -> bytes:
+        """Copy out everything held, oldest first."""
+        buffer = memoryview(self._buffer)
+        if self.end <= self.capacity:
+            return bytes(buffer[: self.end])
+        pos = self.end % self.capacity
+        return b"".join((buffer[pos:], buffer[:pos]))
+
+
+class Subscription:
+    """One viewer's cursor into a terminal's output log."""
+
+    MAX_READ = 64 * 1024  # Largest chunk returned by a single read()
+
+    def __init__(self, terminal: Terminal, cursor: int, max_lag: int, replay: bool = False):
+        self.terminal = terminal
+        self.cursor = cursor  # Absolute offset of the next byte to deliver
+        self.max_lag = max_lag  # Unread bytes allowed before the viewer is resynced
+        self._replay = replay  # Deliver a screen snapshot before any output
+        self.resyncs = 0
+        self.closed = False
+        self._wakeup = asyncio.Event()
+
+    def notify(self) -> None:
+        """Wake up a pending read() (called by the terminal)."""
+        self._wakeup.set()
+
+    async def read(self) -> bytes | None:
+        """Wait for output past the cursor and return it, or None once the terminal ends."""
+        terminal = self.terminal
+        while True:
+            if self.closed:
+                return None
+            if self._replay:
+                self._replay = False
+                return await self._snapshot()
+
+            start, end = terminal.log_start, terminal.log_end
+            if self.cursor < start or end - self.cursor > self.max_lag:
+                return await self._resync()
+            if self.cursor < end:
+                # Copy: the caller awaits while sending, and the log may wrap meanwhile
+                data = bytes(terminal.read_log(self.cursor, self.MAX_READ))
+                self.cursor += len(data)
+                return data
+            if not terminal.is_running():
+                return None
+
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _snapshot(self) -> bytes:
+        """A snapshot of the screen, taken in a thread; output continues from there."""
+        data, self.cursor = await asyncio.to_thread(self.terminal.snapshot)
+        return data
+
+    async def _resync(self) -> bytes:
+        """Drop what this (slow) viewer missed and redraw its screen from a snapshot."""
+        self.resyncs += 1
+        _resyncs.inc()
+        return await self._snapshot()
+
+    def close(self) -> None:
+        """Stop receiving output."""
+        self.closed = True
+        self.terminal.unsubscribe(self)
+        self._wakeup.set()
 
 
 class Terminal:
     """Manages a PTY-based terminal session."""
 
-    SCROLLBACK_SIZE = 64 * 1024  # 64KB scrollback buffer
+    SCROLLBACK_SIZE = 64 * 1024  # Default scrollback buffer size (64KB)
 
     def __init__(
         self,
         shell: str = "/bin/zsh",
         command: list[str] | None = None,
         cwd: str | None = None,
+        scrollback_size: int | None = None,
+        rows: int = 24,
+        cols: int = 80,
     ):
         self.shell = shell
         self.command = command  # Command to run instead of interactive shell
         self.cwd = cwd  # Working directory for the terminal
         self.master_fd: int | None = None
         self.pid: int | None = None
-        self.output_queue: Queue[bytes] = Queue()
-        self._reader_thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
         self._running = False
-        self._scrollback: bytearray = bytearray()
-        self._scrollback_lock = threading.Lock()
+        self._scrollback = RingBuffer(scrollback_size or self.SCROLLBACK_SIZE)
+        self._log_lock = threading.Lock()  # Held to write the log, or copy it off the loop
+        # A quarter of the log, so that reads can go on while the screen catches up
+        self._read_size = max(1, min(65536, self._scrollback.capacity // 4))
+        self.rows = rows
+        self.cols = cols
+        self._screen = Screen(rows, cols)
+        # (log offset, rows, cols) of resizes the screen hasn't applied yet
+        self._resizes: list[tuple[int, int, int]] = []
+        self._screen_end = 0  # Absolute offset just past the output the screen has seen
+        self._screen_lock = threading.Lock()
+        self._updating = False  # A worker thread is feeding the screen
+        self._paused = False  # Reading stopped until the screen catches up
+        self._subscribers: set[Subscription] = set()
 
     def start(self) -> None:
-        """Fork a PTY and spawn the shell or command."""
+        """Fork a PTY and spawn the shell or command. Must run on the event loop."""
         if self._running:
             return
+        loop = asyncio.get_running_loop()
 
         pid, fd = pty.fork()
         if pid == 0:
@@ -86,50 +259,152 @@ class Terminal:
             self.pid = pid
             self.master_fd = fd
             self._running = True
+            _started.inc()
+            self.resize(self.rows, self.cols)
 
-            # Start reader thread
-            self._reader_thread = threading.Thread(target=self._read_loop, daemon=True)
-            self._reader_thread.start()
+            # Read output whenever the PTY becomes readable
+            self._loop = loop
+            loop.add_reader(fd, self._on_readable)
 
-    def _read_loop(self) -> None:
-        """Read from PTY and queue output (runs in thread)."""
-        while self._running and self.master_fd is not None:
-            try:
-                ready, _, _ = select.select([self.master_fd], [], [], 0.1)
-                if ready:
-                    data = os.read(self.master_fd, 4096)
-                    if data:
-                        self.output_queue.put(data)
-                        # Store in scrollback buffer
-                        with self._scrollback_lock:
-                            self._scrollback.extend(data)
-                            # Trim if too large
-                            if len(self._scrollback) > self.SCROLLBACK_SIZE:
-                                excess = len(self._scrollback) - self.SCROLLBACK_SIZE
-                                del self._scrollback[:excess]
-                    else:
-                        # EOF - process exited
-                        self._running = False
-                        break
-            except OSError:
-                # FD closed
-                self._running = False
-                break
+    def _on_readable(self) -> None:
+        """Read available PTY output into the log (runs on the event loop)."""
+        if self.master_fd is None or self._loop is None:
+            return
+        try:
+            data = os.read(self.master_fd, self._read_size)
+        except OSError:
+            data = b""  # EIO once the child has exited
+
+        if not data:
+            # EOF - process exited
+            self._running = False
+            self._remove_reader()
+            self._notify_subscribers()
+            return
+
+        with self._log_lock:
+            self._scrollback.write(data)
+        _output_bytes.inc(len(data))
+        self._notify_subscribers()
+
+        unparsed = self.log_end - self._screen_end
+        if unparsed >= self._read_size and not self._updating:
+            self._updating = True
+            self._loop.run_in_executor(None, self._update_screen_in_background, self._loop)
+        if unparsed + self._read_size > self._scrollback.capacity:
+            # The next read would overwrite output the screen hasn't seen
+            self._paused = True
+            self._loop.remove_reader(self.master_fd)
+
+    def _update_screen_in_background(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            with self._screen_lock:
+                self._feed_screen()
+        finally:
+            with contextlib.suppress(RuntimeError):  # The loop is closed
+                loop.call_soon_threadsafe(self._screen_updated)
+
+    def _screen_updated(self) -> None:
+        self._updating = False
+        if self._paused and self._loop is not None and self.master_fd is not None:
+            self._paused = False
+            self._loop.add_reader(self.master_fd, self._on_readable)
+
+    def _feed_screen(self) -> int:
+        """
+        Feed the screen the output it hasn't seen, resizing it where the
+        terminal was resized; returns the offset it is up to.
+        """
+        with self._log_lock:
+            # Reading pauses before the log wraps past the screen's offset
+            start = offset = max(self._screen_end, self.log_start)
+            end = self.log_end
+            parts: list[bytes] = []
+            while offset < end:
+                parts.append(bytes(self._scrollback.read(offset, end - offset)))
+                offset += len(parts[-1])
+            resizes, self._resizes = self._resizes, []
+        data = b"".join(parts)
+        for at, rows, cols in resizes:
+            cut = max(0, at - start)
+            self._screen.feed(data[:cut])
+            self._screen.resize(rows, cols)
+            data, start = data[cut:], start + cut
+        self._screen.feed(data)
+        self._screen_end = end
+        return end
+
+    def _notify_subscribers(self) -> None:
+        for subscription in self._subscribers:
+            subscription.notify()
+
+    def _remove_reader(self) -> None:
+        if self._loop is not None and self.master_fd is not None:
+            self._loop.remove_reader(self.master_fd)
+        self._loop = None
 
     def write(self, data: bytes) -> None:
         """Send input to the PTY."""
         if self.master_fd is not None:
             os.write(self.master_fd, data)
 
-    def read_nowait(self) -> bytes | None:
-        """Non-blocking read from output queue."""
-        try:
-            return self.output_queue.get_nowait()
-        except Empty:
-            return None
+    @property
+    def log_start(self) -> int:
+        """Absolute offset of the oldest output still in the scrollback buffer."""
+        return self._scrollback.start
+
+    @property
+    def log_end(self) -> int:
+        """Total bytes of output so far (absolute offset just past the newest byte)."""
+        return self._scrollback.end
+
+    def read_log(self, offset: int, size: int) -> memoryview:
+        """Zero-copy view of scrollback from an absolute offset (see RingBuffer.read)."""
+        return self._scrollback.read(offset, size)
+
+    @property
+    def screen(self) -> Screen:
+        """The screen model, first brought up to date with the output so far."""
+        with self._screen_lock:
+            self._feed_screen()
+        return self._screen
+
+    def snapshot(self) -> tuple[bytes, int]:
+        """
+        A snapshot of the screen, brought up to date, and the log offset just
+        past the output it shows. This parses output, so run it in a thread.
+        """
+        with self._screen_lock:
+            end = self._feed_screen()
+            return self._screen.snapshot(), end
+
+    def subscribe(self, replay: bool = True, max_lag: int | None = None) -> Subscription:
+        """
+        Start following output.
+
+        With replay, the subscription first delivers a snapshot of the screen
+        (and its recent history), so a (re)connecting viewer sees the current
+        state; otherwise only new output. A viewer that falls more than
+        max_lag bytes behind (default: the whole scrollback) gets a fresh
+        snapshot instead of the output it missed.
+        """
+        max_lag = max_lag or self._scrollback.capacity
+        subscription = Subscription(self, self.log_end, max_lag, replay)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop delivering output to a subscription."""
+        self._subscribers.discard(subscription)
 
     def resize(self, rows: int, cols: int) -> None:
-        """Resize the terminal window."""
+        """
+        Resize the terminal window. The screen follows when it next catches
+        up, after the output that was laid out at the old size.
+        """
+        self.rows, self.cols = rows, cols
+        with self._log_lock:
+            self._resizes.append((self.log_end, rows, cols))
         if self.master_fd is not None:
             winsize = struct.pack("HHHH", rows, cols, 0, 0)
             fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, winsize)
@@ -141,12 +416,13 @@ class Terminal:
 
     def get_scrollback(self) -> bytes:
         """Get the scrollback buffer contents."""
-        with self._scrollback_lock:
-            return bytes(self._scrollback)
+        return self._scrollback.getvalue()
 
     def stop(self) -> None:
         """Stop the terminal session."""
         self._running = False
+        self._remove_reader()
+        self._notify_subscribers()
 
         if self.master_fd is not None:
             with contextlib.suppress(OSError):
@@ -161,10 +437,6 @@ class Terminal:
                 pass
             self.pid = None
 
-        if self._reader_thread is not None:
-            self._reader_thread.join(timeout=1.0)
-            self._reader_thread = None
-
     def is_running(self) -> bool:
         """Check if terminal is running."""
         return self._running
@@ -0,0 +1,80 @@
+"""Tests for repos module."""
+
+import os
+from pathlib import Path
+
+from lsimons_agent_web.repos import RepoIndex
+
+
+def make_repo(path: Path) -> None:
+    (path / ".git").mkdir(parents=True)
+
+
+def touch_later(path: Path) -> None:
+    """Bump a directory's mtime, in case the change happened within its resolution."""
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_lists_repos_by_org(tmp_path: Path) -> None:
+    make_repo(tmp_path / "org-b" / "two")
+    make_repo(tmp_path / "org-b" / "one")
+    make_repo(tmp_path / "org-a" / "repo")
+    (tmp_path / "org-a" / "not-a-repo").mkdir()
+    (tmp_path / "org-a" / "file.txt").write_text("x")
+    make_repo(tmp_path / "org-a" / ".hidden")
+    (tmp_path / "empty-org").mkdir()
+    make_repo(tmp_path / ".dot-org" / "repo")
+
+    repos, _ = RepoIndex(tmp_path).get()
+    assert repos == {"org-a": ["repo"], "org-b": ["one", "two"]}
+    assert list(repos) == ["org-a", "org-b"]
+
+
+def test_missing_base_dir(tmp_path: Path) -> None:
+    repos, etag = RepoIndex(tmp_path / "missing").get()
+    assert repos == {}
+    assert etag
+
+
+def test_unchanged_orgs_are_not_rescanned(tmp_path: Path) -> None:
+    make_repo(tmp_path / "org-a" / "repo")
+    make_repo(tmp_path / "org-b" / "repo")
+    index = RepoIndex(tmp_path)
+
+    _, etag = index.get()
+    assert index.scans == 2
+    assert index.get()[1] == etag
+    assert index.scans == 2
+
+    make_repo(tmp_path / "org-b" / "new")
+    touch_later(tmp_path / "org-b")
+    repos, new_etag = index.get()
+    assert index.scans == 3
+    assert repos["org-b"] == ["new", "repo"]
+    assert new_etag != etag
+
+
+def test_removed_org(tmp_path: Path) -> None:
+    make_repo(tmp_path / "org-a" / "repo")
+    make_repo(tmp_path / "org-b" / "repo")
+    index = RepoIndex(tmp_path)
+    index.get()
+
+    (tmp_path / "org-b" / "repo" / ".git").rmdir()
+    (tmp_path / "org-b" / "repo").rmdir()
+    (tmp_path / "org-b").rmdir()
+    repos, _ = index.get()
+    assert repos == {"org-a": ["repo"]}
+
+
+def test_git_init_in_existing_directory(tmp_path: Path) -> None:
+    (tmp_path / "org" / "project").mkdir(parents=True)
+    index = RepoIndex(tmp_path)
+    assert index.get()[0] == {}
+
+    stat = (tmp_path / "org").stat()
+    (tmp_path / "org" / "project" / ".git").mkdir()
+    os.utime(tmp_path / "org", ns=(stat.st_atime_ns, stat.st_mtime_ns))  # Org mtime unchanged
+    assert index.get()[0] == {"org": ["project"]}
+    assert index.scans == 1
@@ -0,0 +1,175 @@
+"""Tests for screen module."""
+
+from lsimons_agent_web.screen import Screen
+
+
+def replay(screen: Screen) -> Screen:
+    """Feed a screen's snapshot into a fresh screen of the same size."""
+    copy = Screen(screen.rows, screen.cols, history=screen.history.maxlen or 0)
+    copy.feed(screen.snapshot())
+    return copy
+
+
+def test_text_and_wrapping():
+    """Test printing, carriage return, line feed and wrapping."""
+    screen = Screen(rows=3, cols=5)
+    screen.feed(b"abc\r\nabcdefg")
+    assert screen.text() == "abc\nabcde\nfg"
+    assert (screen.x, screen.y) == (2, 2)
+
+
+def test_cursor_movement_and_erase():
+    """Test CSI cursor positioning and erasing."""
+    screen = Screen(rows=3, cols=10)
+    screen.feed(b"0123456789\r\nabcdefghij\r\nABCDEFGHIJ")
+    screen.feed(b"\x1b[2;4H\x1b[K")  # Erase to end of line from row 2, column 4
+    screen.feed(b"\x1b[1;3H\x1b[2P")  # Delete two characters
+    screen.feed(b"\x1b[3;1H\x1b[3X")  # Erase three characters
+    assert screen.text() == "01456789\nabc\n   DEFGHIJ"
+
+    screen.feed(b"\x1b[2J\x1b[Hx\ty\bz")
+    assert screen.text() == "x       z\n\n"
+
+
+def test_scrolling_keeps_bounded_history():
+    """Test that lines scrolled off the top go to history, up to its limit."""
+    screen = Screen(rows=2, cols=10, history=3)
+    for i in range(10):
+        screen.feed(b"line%d\r\n" % i)
+    assert screen.text() == "line9\n"
+    assert ["".join(text for text, _ in line).rstrip() for line in screen.history] == [
+        "line6",
+        "line7",
+        "line8",
+    ]
+
+
+def test_scroll_region():
+    """Test that a scroll region keeps the lines outside it in place."""
+    screen = Screen(rows=4, cols=10)
+    screen.feed(b"top\r\n\r\n\r\nstatus\x1b[2;3r\x1b[3;1Ha\r\nb\r\nc")
+    assert screen.text() == "top\nb\nc\nstatus"
+    assert len(screen.history) == 0
+
+
+def test_styles():
+    """Test that SGR attributes are recorded per cell."""
+    screen = Screen(rows=1, cols=10)
+    screen.feed(b"\x1b[1;31ma\x1b[22mb\x1b[38;5;200;44mc\x1b[0md")
+    styles = [style for _, style in screen.lines[0][:4]]
+    assert styles == ["1;31", "31", "38;5;200;44", ""]
+
+
+def test_alternate_screen():
+    """Test that the alternate screen leaves the main screen untouched."""
+    screen = Screen(rows=2, cols=10)
+    screen.feed(b"$ vim\r\n")
+    screen.feed(b"\x1b[?1049h\x1b[H\x1b[2Jediting")
+    assert screen.alternate
+    assert screen.text() == "editing\n"
+    screen.feed(b"\x1b[?1049l")
+    assert not screen.alternate
+    assert screen.text() == "$ vim\n"
+    assert (screen.x, screen.y) == (0, 1)
+
+
+def test_split_sequences():
+    """Test escape sequences and UTF-8 characters split across chunks."""
+    screen = Screen(rows=1, cols=10)
+    data = "\x1b[31mé\x1b]0;title\x07x".encode()
+    for i in range(len(data)):
+        screen.feed(data[i : i + 1])
+    assert screen.text() == "éx"
+    assert screen.lines[0][0] == ("é", "31")
+
+
+def test_wide_and_combining_characters():
+    """Test that wide characters take two columns and combining ones none."""
+    screen = Screen(rows=1, cols=10)
+    screen.feed("日本é!".encode())
+    assert screen.x == 6
+    assert screen.text() == "日本é!"
+
+
+def test_line_drawing_characters():
+    """Test the DEC special graphics character set."""
+    screen = Screen(rows=1, cols=10)
+    screen.feed(b"\x1b(0lqk\x1b(Bq")
+    assert screen.text() == "┌─┐q"
+
+
+def test_snapshot_round_trip():
+    """Test that replaying a snapshot reproduces the screen."""
+    screen = Screen(rows=3, cols=10, history=5)
+    for i in range(6):
+        screen.feed(b"\x1b[32mline%d\x1b[0m\r\n" % i)
+    screen.feed(b"\x1b[44mbg\x1b[K\x1b[?2004h\x1b[?25l")
+
+    copy = replay(screen)
+    assert copy.lines == screen.lines
+    assert list(copy.history) == list(screen.history)
+    assert (copy.x, copy.y) == (screen.x, screen.y)
+    assert copy.style == screen.style
+    assert copy.modes == screen.modes
+
+
+def test_snapshot_round_trip_alternate_screen():
+    """Test that a snapshot restores both the main and the alternate screen."""
+    screen = Screen(rows=3, cols=10)
+    screen.feed(b"$ top\r\n\x1b[?1049h\x1b[?1h\x1b=\x1b[2;3Hcpu 99%")
+
+    copy = replay(screen)
+    assert copy.alternate
+    assert copy.lines == screen.lines
+    assert copy.text() == "\n  cpu 99%\n"
+    assert (copy.x, copy.y) == (screen.x, screen.y)
+    assert copy.modes[1] and copy.keypad
+
+    copy.feed(b"\x1b[?1049l")
+    assert copy.text() == "$ top\n\n"
+
+
+def test_snapshot_size_is_bounded():
+    """Test that the snapshot size depends on the screen, not the output so far."""
+    screen = Screen(rows=24, cols=80, history=100)
+    screen.feed(b"x" * 80 * 200)
+    size = len(screen.snapshot())
+    screen.feed(b"x" * 80 * 10_000)
+    assert len(screen.snapshot()) == size
+
+
+def test_resize():
+    """Test that shrinking keeps the rows around the cursor."""
+    screen = Screen(rows=4, cols=10)
+    screen.feed(b"a\r\nb\r\nc")
+    screen.resize(2, 5)
+    assert screen.text() == "b\nc"
+    assert (screen.x, screen.y) == (1, 1)
+    assert ["".join(text for text, _ in line).rstrip() for line in screen.history] == ["a"]
+
+    screen.resize(3, 8)
+    assert screen.text() == "b\nc\n"
+    assert all(len(line) == 8 for line in screen.lines)
+
+
+def test_reset():
+    """Test that ESC c clears everything."""
+    screen = Screen(rows=2, cols=10)
+    screen.feed(b"\x1b[31mabc\r\n\r\n\r\n\x1b[?25l\x1bc")
+    assert screen.text() == "\n"
+    assert len(screen.history) == 0
+    assert screen.style == ""
+    assert screen.modes[25]
+
+
+def test_snapshot_is_smaller_than_the_raw_replay():
+    """Test that a snapshot after lots of colored output is smaller than that output."""
+    screen = Screen(rows=24, cols=80, history=1000)
+    line = b"".join(b"\x1b[1;3%dmcol%d\x1b[0m " % (i % 8, i) for i in range(12))
+    raw = b"\r\n".join([line] * (64 * 1024 // len(line) + 1))
+    screen.feed(raw)
+    assert len(screen.snapshot(history_bytes=len(raw))) > 64 * 1024  # All of the history
+    snapshot = screen.snapshot()
+    assert len(snapshot) < 64 * 1024 <= len(raw)
+    assert snapshot.endswith(b"H")  # The cursor, after the recent history and screen
+    assert len(Screen(24, 80).snapshot()) < 100
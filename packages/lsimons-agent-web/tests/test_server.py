@@ -1,9 +1,24 @@
 """Tests for web server module."""
 
+import asyncio
 import json
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
 from typing import Any
 
+import pytest
+from fastapi.testclient import TestClient
+from lsimons_agent_web.repos import RepoIndex
 from lsimons_agent_web.server import TEMPLATES_DIR, app, event_stream
+from lsimons_agent_web.sessions import Session, SessionStore
+
+
+def collect(stream: AsyncIterator[str]) -> list[str]:
+    async def main() -> list[str]:
+        return [event async for event in stream]
+
+    return asyncio.run(main())
 
 
 def test_templates_dir_exists() -> None:
@@ -29,23 +44,26 @@ def test_app_has_routes() -> None:
     assert "/ws/terminal/agent" in routes
     assert "/ws/terminal/shell" in routes
     assert "/terminal/stop" in routes
+    assert "/metrics" in routes
     assert "/logo.png" in routes
 
 
 def test_event_stream_formats_text_event() -> None:
     # Create a mock generator that yields a text event
-    def mock_process_message(messages: list[dict[str, Any]], user_message: str) -> Any:
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
         yield ("text", "Hello world")
         yield ("done", None)
 
-    # Temporarily replace process_message
+    # Temporarily replace aprocess_message
     import lsimons_agent_web.server as server_module
 
-    original = server_module.process_message
-    server_module.process_message = mock_process_message
+    original = server_module.aprocess_message
+    server_module.aprocess_message = mock_process_message
 
     try:
-        events = list(event_stream("test"))
+        events = collect(event_stream("test", Session("test")))
         assert len(events) == 2
 
         # Check text event
@@ -59,21 +77,23 @@ def test_event_stream_formats_text_event() -> None:
         # Check done event
         assert events[1] == "event: done\ndata: {}\n\n"
     finally:
-        server_module.process_message = original
+        server_module.aprocess_message = original
 
 
 def test_event_stream_formats_tool_event() -> None:
-    def mock_process_message(messages: list[dict[str, Any]], user_message: str) -> Any:
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
         yield ("tool", {"name": "read_file", "args": {"path": "foo.txt"}})
         yield ("done", None)
 
     import lsimons_agent_web.server as server_module
 
-    original = server_module.process_message
-    server_module.process_message = mock_process_message
+    original = server_module.aprocess_message
+    server_module.aprocess_message = mock_process_message
 
     try:
-        events = list(event_stream("test"))
+        events = collect(event_stream("test", Session("test")))
         assert len(events) == 2
 
         # Check tool event
@@ -83,4 +103,177 @@ def test_event_stream_formats_tool_event() -> None:
         assert parsed["name"] == "read_file"
         assert parsed["args"]["path"] == "foo.txt"
     finally:
-        server_module.process_message = original
+        server_module.aprocess_message = original
+
+
+def test_event_stream_formats_text_delta_event() -> None:
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        assert stream
+        yield ("text_delta", "Hel")
+        yield ("text_delta", "lo")
+        yield ("done", None)
+
+    import lsimons_agent_web.server as server_module
+
+    original = server_module.aprocess_message
+    server_module.aprocess_message = mock_process_message
+
+    try:
+        events = collect(event_stream("test", Session("test")))
+        assert len(events) == 3
+        assert events[0] == 'event: text_delta\ndata: {"content": "Hel"}\n\n'
+        assert events[1] == 'event: text_delta\ndata: {"content": "lo"}\n\n'
+    finally:
+        server_module.aprocess_message = original
+
+
+def test_event_stream_formats_tool_output_event(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        yield ("tool_output", "line 1\n")
+        yield ("done", None)
+
+    import lsimons_agent_web.server as server_module
+
+    monkeypatch.setattr(server_module, "aprocess_message", mock_process_message)
+    events = collect(event_stream("test", Session("test")))
+    assert events[0] == 'event: tool_output\ndata: {"content": "line 1\\n"}\n\n'
+
+
+def test_event_stream_forwards_timing_events(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[bool] = []
+
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        calls.append(kwargs.get("timing", False))
+        yield ("timing", {"step": "llm", "seconds": 0.5})
+        yield ("done", None)
+
+    import lsimons_agent_web.server as server_module
+
+    monkeypatch.setattr(server_module, "aprocess_message", mock_process_message)
+    events = collect(event_stream("test", Session("test"), timing=True))
+    assert events[0] == 'event: timing\ndata: {"step": "llm", "seconds": 0.5}\n\n'
+    assert calls == [True]
+
+
+def test_event_stream_waits_for_the_sessions_turn(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        yield ("done", None)
+
+    import lsimons_agent_web.server as server_module
+
+    monkeypatch.setattr(server_module, "aprocess_message", mock_process_message)
+    session = Session("test")
+
+    async def main() -> None:
+        await session.lock.acquire()  # Another turn is running
+        waiting = asyncio.create_task(anext(event_stream("test", session)))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        released = time.perf_counter()
+        session.lock.release()
+        assert await waiting == "event: done\ndata: {}\n\n"
+        assert time.perf_counter() - released < 0.04  # Woken up, not polling
+
+    asyncio.run(main())
+    assert not session.lock.locked()
+
+
+def test_list_repos_etag(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    import lsimons_agent_web.server as server_module
+
+    (tmp_path / "org" / "repo" / ".git").mkdir(parents=True)
+    monkeypatch.setattr(server_module, "repo_index", RepoIndex(tmp_path))
+    client = TestClient(app)
+
+    response = client.get("/api/repos")
+    assert response.status_code == 200
+    assert response.json() == {"org": ["repo"]}
+    etag = response.headers["etag"]
+
+    response = client.get("/api/repos", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/api/repos", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+
+def test_chat_sessions_are_isolated(monkeypatch: pytest.MonkeyPatch) -> None:
+    import lsimons_agent_web.server as server_module
+
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        messages.append({"role": "user", "content": user_message})
+        yield ("done", None)
+
+    store = SessionStore()
+    monkeypatch.setattr(server_module, "aprocess_message", mock_process_message)
+    monkeypatch.setattr(server_module, "sessions", store)
+    client = TestClient(app)
+
+    client.post("/chat", json={"message": "one", "session_id": "a"})
+    client.post("/chat", json={"message": "two", "session_id": "b"})
+    client.post("/chat", json={"message": "three", "session_id": "a"})
+    client.post("/chat", json={"message": "four"})
+
+    assert [m["content"] for m in store.get("a").messages[1:]] == ["one", "three"]
+    assert [m["content"] for m in store.get("b").messages[1:]] == ["two"]
+    assert [m["content"] for m in store.get("default").messages[1:]] == ["four"]
+
+    client.post("/clear", json={"session_id": "a"})
+    assert len(store.get("a").messages) == 1
+    assert len(store.get("b").messages) == 2
+
+
+def test_index_project_only_for_projects(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    import lsimons_agent_web.server as server_module
+    from lsimons_agent import trigram
+
+    (tmp_path / "org" / "repo").mkdir(parents=True)
+    monkeypatch.setattr(trigram, "PROJECTS_DIR", str(tmp_path))
+    started: list[str] = []
+    monkeypatch.setattr(trigram, "update_in_background", started.append)
+
+    server_module.index_project(str(tmp_path / "org" / "repo"))
+    server_module.index_project(str(tmp_path))
+    monkeypatch.setenv("AGENT_SEARCH_INDEX", "0")
+    server_module.index_project(str(tmp_path / "org" / "repo"))
+    assert started == [str(tmp_path / "org" / "repo")]
+
+
+def test_metrics_endpoint(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def mock_process_message(
+        messages: list[dict[str, Any]], user_message: str, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        yield ("done", None)
+
+    import lsimons_agent_web.server as server_module
+
+    monkeypatch.setattr(server_module, "aprocess_message", mock_process_message)
+    client = TestClient(app)
+
+    def chats() -> float:
+        text = client.get("/metrics").text
+        line = next(
+            line
+            for line in text.splitlines()
+            if line.startswith("lsimons_agent_web_chat_seconds_count")
+        )
+        return float(line.split()[-1])
+
+    before = chats()
+    client.post("/chat", json={"message": "hi", "session_id": "metrics"})
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "lsimons_agent_web_chats_in_flight 0\n" in response.text
+    assert "# TYPE lsimons_agent_llm_request_seconds histogram\n" in response.text
+    assert chats() == before + 1
@@ -0,0 +1,95 @@
+"""Tests for sessions module."""
+
+import asyncio
+import threading
+import time
+
+from lsimons_agent.shell import ShellSession
+from lsimons_agent_web.sessions import SessionStore
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_returns_same_session() -> None:
+    store = SessionStore()
+    session = store.get("a")
+    assert store.get("a") is session
+    assert store.get("b") is not session
+    assert session.messages[0]["role"] == "system"
+
+
+def test_sessions_have_separate_history() -> None:
+    store = SessionStore()
+    store.get("a").messages.append({"role": "user", "content": "hi"})
+    assert len(store.get("a").messages) == 2
+    assert len(store.get("b").messages) == 1
+
+
+def test_least_recently_used_is_evicted() -> None:
+    store = SessionStore(max_sessions=2)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert "a" in store
+    assert "b" not in store
+    assert "c" in store
+    assert len(store) == 2
+
+
+def test_idle_sessions_are_evicted() -> None:
+    clock = FakeClock()
+    store = SessionStore(idle_timeout=60, clock=clock)
+    store.get("a")
+    clock.now = 30
+    store.get("b")
+    clock.now = 80
+    store.get("c")
+    assert "a" not in store
+    assert "b" in store
+
+
+def test_busy_session_is_not_evicted() -> None:
+    store = SessionStore(max_sessions=1)
+    busy = store.get("a")
+
+    async def turn() -> None:
+        async with busy.lock:
+            store.get("b")
+            assert "a" in store
+
+    asyncio.run(turn())
+    store.get("c")
+    assert "a" not in store
+    assert "b" not in store
+
+
+def test_reset() -> None:
+    store = SessionStore()
+    session = store.get("a")
+    session.messages.append({"role": "user", "content": "hi"})
+    asyncio.run(session.reset())
+    assert len(session.messages) == 1
+
+
+def test_evicted_shells_are_closed_off_the_callers_thread() -> None:
+    closed: list[threading.Thread] = []
+
+    class Shell(ShellSession):
+        def close(self) -> None:
+            closed.append(threading.current_thread())
+
+    store = SessionStore(max_sessions=1)
+    store.get("a").shell = Shell()
+    store.get("b")
+    for _ in range(100):
+        if closed:
+            break
+        time.sleep(0.01)
+    assert closed and closed[0] is not threading.current_thread()
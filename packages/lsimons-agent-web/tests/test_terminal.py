@@ -1,104 +1,350 @@
 """Tests for terminal module."""
 
-import time
+import asyncio
 
-from lsimons_agent_web.terminal import Terminal
+import pytest
+from lsimons_agent_web.terminal import RingBuffer, Subscription, Terminal
+
+
+async def read_until(sub: Subscription, needle: bytes, timeout: float = 2.0) -> bytes:
+    """Collect subscription output until needle shows up or the timeout expires."""
+    output = b""
+    try:
+        async with asyncio.timeout(timeout):
+            while needle not in output:
+                data = await sub.read()
+                if data is None:
+                    break
+                output += data
+    except TimeoutError:
+        pass
+    return output
 
 
 def test_terminal_start_stop():
     """Test starting and stopping a terminal."""
-    term = Terminal(shell="/bin/sh")
-    assert not term.is_running()
 
-    term.start()
-    assert term.is_running()
-    assert term.pid is not None
-    assert term.master_fd is not None
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        assert not term.is_running()
+
+        term.start()
+        assert term.is_running()
+        assert term.pid is not None
+        assert term.master_fd is not None
+
+        term.stop()
+        assert not term.is_running()
+        assert term.pid is None
+        assert term.master_fd is None
 
-    term.stop()
-    assert not term.is_running()
-    assert term.pid is None
-    assert term.master_fd is None
+    asyncio.run(main())
 
 
 def test_terminal_write_read():
     """Test writing to and reading from terminal."""
-    term = Terminal(shell="/bin/sh")
-    term.start()
 
-    try:
-        # Write a command
-        term.write(b"echo hello\n")
-
-        # Wait for output
-        time.sleep(0.2)
-
-        # Read output
-        output = b""
-        while True:
-            data = term.read_nowait()
-            if data is None:
-                break
-            output += data
-
-        # Should contain our command output
-        assert b"hello" in output
-    finally:
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+        sub = term.subscribe()
+
+        try:
+            # Write a command
+            term.write(b"echo hello\n")
+
+            # Should contain our command output
+            assert b"hello" in await read_until(sub, b"hello")
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_terminal_read_returns_none_at_exit():
+    """Test that read() reports EOF once the process exits."""
+
+    async def main() -> None:
+        term = Terminal(command=["/bin/sh", "-c", "echo bye"])
+        term.start()
+        sub = term.subscribe()
+
+        try:
+            async with asyncio.timeout(2.0):
+                while await sub.read() is not None:
+                    pass
+            assert not term.is_running()
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_terminal_stop_wakes_reader():
+    """Test that stop() ends a pending read()."""
+
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+        sub = term.subscribe()
+        await read_until(sub, b"$", timeout=0.5)
+        reader = asyncio.create_task(sub.read())
+        await asyncio.sleep(0.05)
         term.stop()
+        async with asyncio.timeout(1.0):
+            assert await reader is None
+
+    asyncio.run(main())
 
 
 def test_terminal_resize():
     """Test resizing the terminal."""
-    term = Terminal(shell="/bin/sh")
-    term.start()
 
-    try:
-        # Resize should not raise
-        term.resize(40, 120)
-    finally:
-        term.stop()
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+
+        try:
+            # Resize should not raise
+            term.resize(40, 120)
+        finally:
+            term.stop()
+
+    asyncio.run(main())
 
 
 def test_terminal_start_idempotent():
     """Test that calling start twice doesn't spawn a second process."""
-    term = Terminal(shell="/bin/sh")
-    term.start()
-    pid1 = term.pid
 
-    term.start()  # Second call should be no-op
-    pid2 = term.pid
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+        pid1 = term.pid
+
+        term.start()  # Second call should be no-op
+        pid2 = term.pid
 
-    assert pid1 == pid2
-    term.stop()
+        assert pid1 == pid2
+        term.stop()
+
+    asyncio.run(main())
 
 
 def test_terminal_stop_idempotent():
     """Test that stop can be called multiple times safely."""
-    term = Terminal(shell="/bin/sh")
-    term.start()
-    term.stop()
-    term.stop()  # Should not raise
-    assert not term.is_running()
+
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+        term.stop()
+        term.stop()  # Should not raise
+        assert not term.is_running()
+
+    asyncio.run(main())
 
 
 def test_terminal_scrollback():
     """Test that scrollback buffer captures output."""
-    term = Terminal(shell="/bin/sh")
-    term.start()
 
-    try:
-        # Write a command
-        term.write(b"echo hello\n")
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
 
-        # Wait for output
-        time.sleep(0.2)
+        try:
+            # Write a command and wait for its output
+            term.write(b"echo hello\n")
+            await read_until(term.subscribe(), b"hello")
 
-        # Drain the queue
-        while term.read_nowait() is not None:
-            pass
+            # Scrollback should contain output
+            scrollback = term.get_scrollback()
+            assert b"hello" in scrollback
+        finally:
+            term.stop()
 
-        # Scrollback should contain output
-        scrollback = term.get_scrollback()
-        assert b"hello" in scrollback
-    finally:
-        term.stop()
+    asyncio.run(main())
+
+
+def test_terminal_multiple_subscribers():
+    """Test that every subscriber sees all output."""
+
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+        first = term.subscribe()
+        second = term.subscribe()
+
+        try:
+            term.write(b"echo hello\n")
+            assert b"hello" in await read_until(first, b"hello")
+            assert b"hello" in await read_until(second, b"hello")
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_terminal_subscribe_replays_scrollback():
+    """Test that a late subscriber starts with a screen snapshot, unless replay is off."""
+
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+
+        try:
+            # Quoting keeps the echoed command line from matching the output
+            term.write(b"echo hel''lo\n")
+            await read_until(term.subscribe(), b"hello")
+
+            assert b"hello" in await read_until(term.subscribe(), b"hello", timeout=0.2)
+            assert b"hello" not in await read_until(
+                term.subscribe(replay=False), b"hello", timeout=0.2
+            )
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_terminal_slow_subscriber_resyncs():
+    """Test that a subscriber too far behind gets a screen snapshot instead of the backlog."""
+
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh")
+        term.start()
+        slow = term.subscribe(replay=False, max_lag=256)
+        fast = term.subscribe()
+
+        try:
+            term.write(b"for i in $(seq 1 200); do echo line$i; done\n")
+            await read_until(fast, b"line200")
+
+            data = await slow.read()
+            assert data is not None
+            assert data.startswith(b"\x1bc")
+            assert b"line200" in data
+            assert slow.resyncs == 1
+            assert slow.cursor == term.log_end
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_subscription_close_ends_read():
+    """Test that closing a subscription ends a pending read()."""
+
+    async def main() -> None:
+        term = Terminal(command=["sleep", "5"])  # Produces no output
+        term.start()
+        sub = term.subscribe(replay=False)
+
+        try:
+            reader = asyncio.create_task(sub.read())
+            await asyncio.sleep(0.05)
+            sub.close()
+            async with asyncio.timeout(1.0):
+                assert await reader is None
+            assert sub not in term._subscribers
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_ring_buffer_wraps():
+    """Test that the ring buffer keeps the newest bytes in order."""
+    ring = RingBuffer(8)
+    ring.write(b"abcde")
+    assert (ring.start, ring.end, len(ring)) == (0, 5, 5)
+    assert ring.getvalue() == b"abcde"
+
+    ring.write(b"fghij")
+    assert (ring.start, ring.end, len(ring)) == (2, 10, 8)
+    assert ring.getvalue() == b"cdefghij"
+
+    ring.write(b"0123456789xy")  # Larger than the capacity
+    assert (ring.start, ring.end) == (14, 22)
+    assert ring.getvalue() == b"456789xy"
+
+
+def test_ring_buffer_read():
+    """Test that reads address absolute offsets and stop at the wrap point."""
+    ring = RingBuffer(8)
+    ring.write(b"abcdefghij")  # Holds offsets 2..10, physically "ij" + "cdefgh"
+
+    view = ring.read(2, 100)
+    assert bytes(view) == b"cdefgh"
+    assert view.readonly
+    assert bytes(ring.read(8, 100)) == b"ij"
+    assert bytes(ring.read(3, 2)) == b"de"
+    assert bytes(ring.read(10, 100)) == b""
+
+    with pytest.raises(IndexError):
+        ring.read(1, 1)
+    with pytest.raises(IndexError):
+        ring.read(11, 1)
+
+
+def test_terminal_scrollback_size():
+    """Test that the scrollback size is configurable per terminal."""
+
+    async def main() -> None:
+        term = Terminal(command=["/bin/sh", "-c", "seq 1 1000"], scrollback_size=100)
+        term.start()
+        sub = term.subscribe()
+
+        try:
+            output = await read_until(sub, b"1000")
+            scrollback = term.get_scrollback()
+            assert len(scrollback) == 100
+            assert scrollback.endswith(b"1000\r\n")
+            assert term.log_end - term.log_start == 100
+            assert b"1000" in output
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_terminal_snapshot_follows_resize():
+    """Test that the screen model follows the terminal size."""
+
+    async def main() -> None:
+        term = Terminal(shell="/bin/sh", rows=10, cols=40)
+        term.start()
+
+        try:
+            term.write(b"stty size\n")
+            await read_until(term.subscribe(replay=False), b"10 40")
+            with term._screen_lock:  # type: ignore[reportPrivateUsage]
+                term.resize(30, 100)  # Doesn't wait for the screen
+            assert (term.screen.rows, term.screen.cols) == (30, 100)
+            term.write(b"stty size\n")
+            await read_until(term.subscribe(replay=False), b"30 100")
+            assert "30 100" in term.screen.text()
+        finally:
+            term.stop()
+
+    asyncio.run(main())
+
+
+def test_terminal_screen_keeps_up_with_a_small_log():
+    """Test that the screen sees all output, even when much more than the log holds."""
+
+    async def main() -> None:
+        term = Terminal(command=["/bin/sh", "-c", "seq 1 20000"], scrollback_size=1024)
+        term.start()
+
+        try:
+            sub = term.subscribe(replay=False)
+            await read_until(sub, b"20000\r\n", timeout=10)
+            assert term.log_end > 100_000
+            screen = term.screen
+            lines = ["".join(text for text, _ in line) for line in screen.history]
+            numbers = [int(n) for n in " ".join([*lines, screen.text()]).split()]
+            assert numbers == list(range(20001 - len(numbers), 20001))  # No gaps
+            assert len(numbers) > 1000
+        finally:
+            term.stop()
+
+    asyncio.run(main())
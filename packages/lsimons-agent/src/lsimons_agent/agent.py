@@ -1,11 +1,19 @@
 """Agent loop for interactive conversation."""
 
+import asyncio
 import json
 import os
-from collections.abc import Generator
+import queue
+import time
+from collections.abc import AsyncGenerator, Generator
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
-from lsimons_agent.tools import TOOLS, bash, execute
+from lsimons_agent import llm
+from lsimons_agent.context import ContextBudget, default_budget
+from lsimons_agent.scheduler import run_tool_calls
+from lsimons_agent.shell import ShellSession
+from lsimons_agent.tools import TOOLS, bash
 
 # Use lsimons-llm when LLM_API_KEY is set, otherwise use local mock-compatible client
 if os.environ.get("LLM_API_KEY"):
@@ -15,13 +23,51 @@ if os.environ.get("LLM_API_KEY"):
     _client: Any = LLMClient(_config)  # type: ignore[reportUnknownVariableType]
 
     def chat(
-        messages: list[dict[str, Any]], tools: list[dict[str, Any]] | None = None
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        *,
+        stats: dict[str, Any] | None = None,  # lsimons-llm doesn't report any
     ) -> dict[str, Any]:
         """Send messages to LLM and return raw API response dict."""
         result: dict[str, Any] = _client.chat_raw(messages, tools)  # type: ignore[no-any-return]
         return result
+
+    def chat_stream(
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        *,
+        stats: dict[str, Any] | None = None,
+    ) -> Generator[tuple[str, Any]]:
+        """lsimons-llm has no streaming API; emit the whole reply as one delta."""
+        response = chat(messages, tools)
+        content = response["choices"][0]["message"].get("content")
+        if content:
+            yield ("text_delta", content)
+        yield ("response", response)
+
+    async def achat(
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        *,
+        stats: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """lsimons-llm is synchronous; run its request on a worker thread."""
+        return await asyncio.to_thread(chat, messages, tools)
+
+    async def achat_stream(
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        *,
+        stats: dict[str, Any] | None = None,
+    ) -> AsyncGenerator[tuple[str, Any]]:
+        """Async chat_stream(), emitting the whole reply as one delta."""
+        response = await achat(messages, tools)
+        content = response["choices"][0]["message"].get("content")
+        if content:
+            yield ("text_delta", content)
+        yield ("response", response)
 else:
-    from lsimons_agent.llm import chat  # noqa: F401
+    from lsimons_agent.llm import achat, achat_stream, chat, chat_stream  # noqa: F401
 
 
 SYSTEM_PROMPT = """\
@@ -29,63 +75,282 @@ You are a coding assistant. You help the user by reading, writing, and editing \
 files, and running shell commands.
 
 When editing files, use edit_file with the exact string to replace - include \
-enough context to make the match unique.
+enough context to make the match unique. Make several changes in one call: \
+edit_file takes a list of edits, and multi_edit edits several files at once.
+
+Bash commands run in one persistent shell, so `cd` and exported variables \
+carry over between calls. File tools resolve relative paths from the directory \
+the agent was started in.
 
 Be concise. Execute tasks directly without asking for confirmation."""
 
 Event = tuple[str, Any]
 
-
-def process_message(messages: list[dict[str, Any]], user_message: str) -> Generator[Event]:
+# Tool calls and compaction of async conversations run here, so that slow
+# tools can't block the event loop and many conversations share a few threads
+tool_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("AGENT_ASYNC_TOOL_THREADS", "32")),
+    thread_name_prefix="agent-tools",
+)
+
+
+def process_message(
+    messages: list[dict[str, Any]],
+    user_message: str,
+    stream: bool = False,
+    shell: ShellSession | None = None,
+    budget: ContextBudget | None = None,
+    timing: bool = False,
+) -> Generator[Event]:
     """
     Process a user message and yield events.
 
+    Bash commands run in the given shell session, which should live as long
+    as the conversation does (defaults to a process-wide session). Before
+    each LLM request the conversation is compacted when it grows past the
+    budget, which should likewise belong to the conversation.
+
     Yields tuples of (event_type, data):
-    - ("text", content) - Agent text response
+    - ("text", content) - Agent text response (when stream is False)
+    - ("text_delta", content) - Part of the agent text response (when stream is True)
     - ("tool", {"name": name, "args": args}) - Tool being executed
+    - ("tool_output", chunk) - Output of a running bash command, as it arrives
+    - ("compacted", stats) - Older messages were compacted to fit the context
+    - ("timing", data) - With timing=True: how long a step took (see _Timer)
     - ("done", None) - Processing complete
 
     Modifies messages list in place.
     """
     messages.append({"role": "user", "content": user_message})
+    budget = budget or default_budget()
+
+    timer = _Timer() if timing else None
 
     while True:
-        response = chat(messages, tools=TOOLS)
+        began = time.perf_counter()
+        stats = budget.compact(messages, chat)
+        if stats:
+            yield ("compacted", stats)
+            if timer:
+                yield timer.compact(time.perf_counter() - began)
+        llm_stats: dict[str, Any] | None = {} if timer else None
+        began = time.perf_counter()
+        if stream:
+            response: dict[str, Any] = {}
+            for event_type, data in chat_stream(messages, tools=TOOLS, stats=llm_stats):
+                if event_type == "text_delta":
+                    yield ("text_delta", data)
+                else:
+                    response = data
+        else:
+            response = chat(messages, tools=TOOLS, stats=llm_stats)
+        if timer:
+            yield timer.llm(time.perf_counter() - began, llm_stats or {}, response)
         message: dict[str, Any] = response["choices"][0]["message"]
         content: str = message.get("content", "")
-        tool_calls: list[dict[str, Any]] = message.get("tool_calls", [])
-
-        if content:
+        if content and not stream:
             yield ("text", content)
 
-        if not tool_calls:
-            messages.append(message)
+        messages.append(message)
+        calls = _tool_calls(message)
+        if not calls:
             break
+        for name, args in calls:
+            yield ("tool", {"name": name, "args": args})
 
-        messages.append(message)
-        for tool_call in tool_calls:
-            fn: dict[str, Any] = tool_call["function"]
-            name: str = fn["name"]
-            args: dict[str, str] = json.loads(fn["arguments"])
+        # Independent calls may run in parallel; results keep the call order
+        timings: list[float] | None = [] if timer else None
+        results = yield from _run_tools(calls, shell, timings)
+        _add_results(messages, message, results)
+        if timer:
+            yield from timer.tools(calls, timings or [])
 
-            yield ("tool", {"name": name, "args": args})
+    if timer:
+        yield timer.turn()
+    yield ("done", None)
+
+
+async def aprocess_message(
+    messages: list[dict[str, Any]],
+    user_message: str,
+    stream: bool = False,
+    shell: ShellSession | None = None,
+    budget: ContextBudget | None = None,
+    timing: bool = False,
+) -> AsyncGenerator[Event]:
+    """
+    Async process_message(): the same events, without blocking the event loop.
 
-            try:
-                result = execute(name, args)
-            except Exception as e:
-                result = f"Error: {e}"
+    LLM requests go through the async client; tool calls and compaction run
+    on tool_executor, whose size AGENT_ASYNC_TOOL_THREADS bounds.
+    """
+    messages.append({"role": "user", "content": user_message})
+    budget = budget or default_budget()
+    loop = asyncio.get_running_loop()
 
-            messages.append(
-                {
-                    "role": "tool",
-                    "tool_call_id": tool_call["id"],
-                    "content": result,
-                }
-            )
+    timer = _Timer() if timing else None
 
+    while True:
+        began = time.perf_counter()
+        stats = await loop.run_in_executor(tool_executor, budget.compact, messages, chat)
+        if stats:
+            yield ("compacted", stats)
+            if timer:
+                yield timer.compact(time.perf_counter() - began)
+        llm_stats: dict[str, Any] | None = {} if timer else None
+        began = time.perf_counter()
+        if stream:
+            response: dict[str, Any] = {}
+            async for event_type, data in achat_stream(messages, tools=TOOLS, stats=llm_stats):
+                if event_type == "text_delta":
+                    yield ("text_delta", data)
+                else:
+                    response = data
+        else:
+            response = await achat(messages, tools=TOOLS, stats=llm_stats)
+        if timer:
+            yield timer.llm(time.perf_counter() - began, llm_stats or {}, response)
+        message: dict[str, Any] = response["choices"][0]["message"]
+        content: str = message.get("content", "")
+        if content and not stream:
+            yield ("text", content)
+
+        messages.append(message)
+        calls = _tool_calls(message)
+        if not calls:
+            break
+        for name, args in calls:
+            yield ("tool", {"name": name, "args": args})
+
+        # Independent calls may run in parallel; results keep the call order
+        timings: list[float] | None = [] if timer else None
+        chunks, future = _start_tools(calls, shell, timings)
+        while (chunk := await chunks.get()) is not None:
+            yield ("tool_output", chunk)
+        _add_results(messages, message, await future)
+        if timer:
+            for event in timer.tools(calls, timings or []):
+                yield event
+
+    if timer:
+        yield timer.turn()
     yield ("done", None)
 
 
+class _Timer:
+    """
+    Timing events of one turn, and the turn's totals.
+
+    Only made when timing is asked for; without it a turn pays for little
+    more than a few clock reads. Each event's data has a "step":
+    - "llm": seconds, request_bytes, response_bytes, wait_seconds,
+      decode_seconds (not when streamed) or cached, and the response's
+      prompt_tokens and completion_tokens when it reports usage
+    - "tool": name and seconds of one tool call
+    - "compact": seconds spent compacting the conversation
+    - "turn": seconds, and the sums of llm_seconds, tool_seconds, llm_calls,
+      tool_calls, request_bytes, response_bytes and the token counts
+    """
+
+    TOTALS = (
+        "llm_seconds",
+        "tool_seconds",
+        "llm_calls",
+        "tool_calls",
+        "request_bytes",
+        "response_bytes",
+        "prompt_tokens",
+        "completion_tokens",
+    )
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.totals: dict[str, float] = dict.fromkeys(self.TOTALS, 0)
+
+    def llm(self, seconds: float, stats: dict[str, Any], response: dict[str, Any]) -> Event:
+        usage: dict[str, Any] = response.get("usage") or {}
+        data: dict[str, Any] = {"step": "llm", "seconds": seconds, **stats}
+        for key in ("prompt_tokens", "completion_tokens"):
+            if key in usage:
+                data[key] = usage[key]
+        self.totals["llm_seconds"] += seconds
+        self.totals["llm_calls"] += 1
+        for key in ("request_bytes", "response_bytes", "prompt_tokens", "completion_tokens"):
+            self.totals[key] += data.get(key) or 0
+        return ("timing", data)
+
+    def tools(self, calls: list[tuple[str, dict[str, Any]]], timings: list[float]) -> list[Event]:
+        self.totals["tool_seconds"] += sum(timings)
+        self.totals["tool_calls"] += len(calls)
+        return [
+            ("timing", {"step": "tool", "name": name, "seconds": seconds})
+            for (name, _), seconds in zip(calls, timings, strict=True)
+        ]
+
+    def compact(self, seconds: float) -> Event:
+        return ("timing", {"step": "compact", "seconds": seconds})
+
+    def turn(self) -> Event:
+        seconds = time.perf_counter() - self.start
+        return ("timing", {"step": "turn", "seconds": seconds, **self.totals})
+
+
+def _tool_calls(message: dict[str, Any]) -> list[tuple[str, dict[str, Any]]]:
+    """The (name, arguments) of each tool call in an assistant message."""
+    tool_calls: list[dict[str, Any]] = message.get("tool_calls") or []
+    calls: list[tuple[str, dict[str, Any]]] = []
+    for tool_call in tool_calls:
+        fn: dict[str, Any] = tool_call["function"]
+        calls.append((fn["name"], json.loads(fn["arguments"])))
+    return calls
+
+
+def _add_results(
+    messages: list[dict[str, Any]], message: dict[str, Any], results: list[str]
+) -> None:
+    """Append the results of the message's tool calls to the conversation."""
+    for tool_call, result in zip(message["tool_calls"], results, strict=True):
+        messages.append({"role": "tool", "tool_call_id": tool_call["id"], "content": result})
+
+
+def _start_tools(
+    calls: list[tuple[str, dict[str, Any]]],
+    shell: ShellSession | None,
+    timings: list[float] | None = None,
+) -> tuple[asyncio.Queue[str | None], asyncio.Future[list[str]]]:
+    """
+    Run tool calls on tool_executor, for the running event loop.
+
+    Returns a queue that receives their output as it arrives, then None,
+    and the future of their results.
+    """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def on_output(chunk: str) -> None:
+        # Queued in order, ahead of the None the future's completion adds
+        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+    future = loop.run_in_executor(tool_executor, run_tool_calls, calls, shell, on_output, timings)
+    future.add_done_callback(lambda _: chunks.put_nowait(None))
+    return chunks, future
+
+
+def _run_tools(
+    calls: list[tuple[str, dict[str, Any]]],
+    shell: ShellSession | None,
+    timings: list[float] | None = None,
+) -> Generator[Event, None, list[str]]:
+    """Run tool calls on a worker thread, yielding their output as it arrives."""
+    chunks: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(run_tool_calls, calls, shell, chunks.put, timings)
+        future.add_done_callback(lambda _: chunks.put(None))
+        while (chunk := chunks.get()) is not None:
+            yield ("tool_output", chunk)
+        return future.result()
+
+
 def new_conversation() -> list[dict[str, Any]]:
     """Create a new conversation with system prompt."""
     return [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -97,9 +362,20 @@ def run() -> None:
 
     print("lsimons-agent")
     print("-" * 40)
-    print("Type a message, /clear to reset, !cmd for bash, Ctrl+C to exit")
+    print("Type a message, /clear to reset, /timing to time turns, !cmd for bash, Ctrl+C to exit")
     print()
 
+    shell = ShellSession()
+    try:
+        _repl(messages, shell, ContextBudget())
+    finally:
+        shell.close()
+        llm.close()
+
+
+def _repl(messages: list[dict[str, Any]], shell: ShellSession, budget: ContextBudget) -> None:
+    """Read user input and dispatch it until the user exits."""
+    timing = False
     while True:
         try:
             user_input = input("You: ").strip()
@@ -112,20 +388,67 @@ def run() -> None:
 
         if user_input == "/clear":
             messages = new_conversation()
+            shell.close()
             print("Cleared.")
             continue
 
+        if user_input == "/timing":
+            timing = not timing
+            print(f"Timing {'on' if timing else 'off'}.")
+            continue
+
         if user_input.startswith("!"):
-            print(bash(user_input[1:]))
+            print(bash(user_input[1:], shell=shell))
             continue
 
-        for event_type, data in process_message(messages, user_input):
-            if event_type == "text":
-                print(f"\nAgent: {data}")
+        in_text = False
+        in_output = False  # Tool output was printed without a final newline
+        events = process_message(
+            messages, user_input, stream=True, shell=shell, budget=budget, timing=timing
+        )
+        for event_type, data in events:
+            if in_output and event_type != "tool_output":
+                print()
+                in_output = False
+            if event_type == "text_delta":
+                if not in_text:
+                    print("\nAgent: ", end="")
+                    in_text = True
+                print(data, end="", flush=True)
             elif event_type == "tool":
+                if in_text:
+                    print()
+                    in_text = False
                 print(f"[Tool: {data['name']}({format_args(data['args'])})]")
+            elif event_type == "tool_output":
+                print(data, end="", flush=True)
+                in_output = not data.endswith("\n")
+            elif event_type == "compacted":
+                if in_text:
+                    print()
+                    in_text = False
+                before, after = data["tokens_before"], data["tokens_after"]
+                print(f"[Context compacted: {before} -> {after} tokens]")
+            elif event_type == "timing" and data["step"] == "turn":
+                if in_text:
+                    print()
+                    in_text = False
+                print(f"[{format_timing(data)}]")
             elif event_type == "done":
-                print()
+                print("\n" if in_text else "")
+
+
+def format_timing(turn: dict[str, Any]) -> str:
+    """Format the totals of a turn's timing as one line."""
+    parts = [
+        f"LLM {turn['llm_seconds']:.1f}s in {int(turn['llm_calls'])} calls",
+        f"{turn['request_bytes'] / 1024:.0f} KB sent",
+        f"{turn['response_bytes'] / 1024:.0f} KB received",
+    ]
+    if turn["prompt_tokens"] or turn["completion_tokens"]:
+        parts.append(f"{int(turn['prompt_tokens'])}+{int(turn['completion_tokens'])} tokens")
+    parts.append(f"tools {turn['tool_seconds']:.1f}s in {int(turn['tool_calls'])} calls")
+    return f"Turn {turn['seconds']:.1f}s: " + ", ".join(parts)
 
 
 def format_args(args: dict[str, Any]) -> str:
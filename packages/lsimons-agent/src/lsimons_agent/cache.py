@@ -0,0 +1,141 @@
+"""On-disk cache of LLM responses, for replaying the same prompts quickly.
+
+Enabled by setting LLM_CACHE to the path of a SQLite database. Responses are
+stored zlib-compressed under a hash of the model, messages and tools, so
+identical requests are answered from disk. When the database grows past
+LLM_CACHE_MAX_MB (default 512), the least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any
+
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    elapsed REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def cache_key(body: bytes) -> str:
+    """Hash of a request body, which is encoded canonically (sorted keys, no spaces)."""
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResponseCache:
+    """LLM responses in a SQLite database, evicted least recently used first."""
+
+    def __init__(self, path: str | Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0  # LLM time the hits would have taken
+        self._lock = threading.Lock()
+        self._touched: dict[str, float] = {}  # Hits not yet written back to last_used
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared between threads, guarded by _lock
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._size = self._total_size()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the cached response for key, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, elapsed FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += row[1]
+            # Batched: a write per hit would cost more than the lookup
+            self._touched[key] = time.time()
+        response: dict[str, Any] = json.loads(zlib.decompress(row[0]))
+        return response
+
+    def put(self, key: str, response: dict[str, Any], elapsed: float) -> None:
+        """Store a response that took elapsed seconds to produce."""
+        value = zlib.compress(json.dumps(response, separators=(",", ":")).encode())
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._write_touched()
+                old = self._db.execute(
+                    "SELECT size FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), elapsed, time.time()),
+                )
+                self._size += len(value) - (old[0] if old else 0)
+                if self._size > self.max_bytes:
+                    self._evict()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counts for this process and the time the hits saved."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "bytes": self._size,
+        }
+
+    def close(self) -> None:
+        """Write back pending usage and close the database."""
+        with self._lock:
+            self._write_touched()
+            self._db.close()
+
+    def _total_size(self) -> int:
+        return int(self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0])
+
+    def _write_touched(self) -> None:
+        if self._touched:
+            self._db.executemany(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache is at 90% of max_bytes."""
+        self._size = self._total_size()  # Other processes may share the database
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if self._size <= self.max_bytes * 9 // 10:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= size
+            self.evictions += 1
+
+
+def cache_from_env() -> ResponseCache | None:
+    """The cache configured by LLM_CACHE and LLM_CACHE_MAX_MB, if any."""
+    path = os.environ.get("LLM_CACHE")
+    if not path:
+        return None
+    max_mb = float(os.environ.get("LLM_CACHE_MAX_MB", "512"))
+    return ResponseCache(path, int(max_mb * 1024 * 1024))
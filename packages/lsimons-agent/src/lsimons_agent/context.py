@@ -0,0 +1,210 @@
+"""Keep a conversation within the model's context window.
+
+Every step of process_message sends the whole conversation to the LLM, and
+tool results (full files, long command output) would otherwise stay in it
+forever. Before each request, ContextBudget estimates the conversation's size
+and, once it passes a threshold, compacts it in cheapest-first order until it
+is back under a target:
+
+1. dedupe: results of earlier read_file calls for (the same part of) a file
+   that is read again later are replaced by a note;
+2. elide: long tool results that are no longer recent are cut to their start;
+3. summarize: older messages are replaced by an LLM-written summary, kept
+   as a system message after the system prompt. A summary can end in the
+   middle of a long agentic turn, between one tool round-trip and the next.
+
+Compaction replaces message dicts in the list rather than changing them.
+"""
+
+import json
+import os
+import threading
+from collections.abc import Callable
+from typing import Any
+
+ChatFn = Callable[[list[dict[str, Any]]], dict[str, Any]]
+
+ELIDE_OVER = 1000  # Tool results longer than this (in characters) may be elided...
+ELIDE_KEEP = 400  # ...down to their first ELIDE_KEEP characters
+SUMMARY_MESSAGE_CHARS = 2000  # Per-message cap in the transcript sent for summarizing
+
+SUMMARY_PROMPT = """\
+You compress conversations between a user and a coding assistant. Write a \
+concise summary that keeps what later work depends on: the user's goals, \
+decisions made, files created or changed (with paths), commands run and \
+their important results, and open problems. Use plain prose or bullets."""
+
+SUMMARY_REQUEST = "Summarize the conversation so far.\n\n"
+SUMMARY_PREFIX = "[Summary of the earlier conversation]\n"
+
+
+def _functions(message: dict[str, Any]) -> list[dict[str, Any]]:
+    """The "function" parts (name and arguments) of a message's tool calls."""
+    tool_calls: list[dict[str, Any]] = message.get("tool_calls") or []
+    return [tool_call.get("function", {}) for tool_call in tool_calls]
+
+
+def estimate_tokens(message: dict[str, Any]) -> int:
+    """Rough token count of a message: about 4 characters per token."""
+    chars = len(str(message.get("content") or ""))
+    for function in _functions(message):
+        chars += len(str(function.get("name", ""))) + len(str(function.get("arguments", "")))
+    return chars // 4 + 4  # Plus role and framing
+
+
+def context_tokens() -> int:
+    """Context window size to budget for (AGENT_CONTEXT_TOKENS, default 100000)."""
+    return int(os.environ.get("AGENT_CONTEXT_TOKENS", "100000"))
+
+
+class ContextBudget:
+    """Token estimates and compaction for one conversation."""
+
+    def __init__(self, max_tokens: int | None = None, keep_recent: int = 8):
+        if keep_recent < 1:
+            raise ValueError("keep_recent must be at least 1")
+        self.max_tokens = max_tokens or context_tokens()
+        self.threshold = self.max_tokens * 3 // 4  # Compact when above this...
+        self.target = self.max_tokens // 2  # ...until at or below this
+        self.keep_recent = keep_recent  # The last messages are never compacted
+        # id(message) -> (message, tokens). Holding the message keeps its id
+        # from being reused, and the identity check catches replaced messages.
+        self._estimates: dict[int, tuple[dict[str, Any], int]] = {}
+
+    def tokens(self, messages: list[dict[str, Any]]) -> int:
+        """Estimated tokens of a conversation, reusing estimates of unchanged messages."""
+        total = 0
+        for message in messages:
+            cached = self._estimates.get(id(message))
+            if cached is None or cached[0] is not message:
+                cached = self._estimates[id(message)] = (message, estimate_tokens(message))
+            total += cached[1]
+        if len(self._estimates) > 2 * len(messages) + 64:
+            # Forget messages that are no longer in the conversation
+            current = {id(message) for message in messages}
+            self._estimates = {k: v for k, v in self._estimates.items() if k in current}
+        return total
+
+    def compact(self, messages: list[dict[str, Any]], chat: ChatFn) -> dict[str, Any] | None:
+        """
+        Compact messages in place if they are over the threshold.
+
+        Returns statistics about what was done, or None when nothing was needed.
+        chat is used to summarize older turns.
+        """
+        before = self.tokens(messages)
+        if before <= self.threshold:
+            return None
+
+        stats: dict[str, Any] = {"tokens_before": before, "deduped": 0, "elided": 0}
+        stats["summarized"] = 0
+        stale_end = max(0, len(messages) - self.keep_recent)
+        stats["deduped"] = _dedupe_reads(messages)
+        if self.tokens(messages) > self.target:
+            stats["elided"] = _elide_results(messages, stale_end)
+        if self.tokens(messages) > self.target:
+            try:
+                stats["summarized"] = _summarize(messages, stale_end, chat)
+            except Exception as e:
+                stats["error"] = f"summary failed: {e}"
+        stats["tokens_after"] = self.tokens(messages)
+        return stats
+
+
+def _tool_calls_by_id(messages: list[dict[str, Any]]) -> dict[str, tuple[str, dict[str, Any]]]:
+    """Map tool_call_id to (tool name, arguments) for every call in the conversation."""
+    calls: dict[str, tuple[str, dict[str, Any]]] = {}
+    for message in messages:
+        tool_calls: list[dict[str, Any]] = message.get("tool_calls") or []
+        for tool_call in tool_calls:
+            function: dict[str, Any] = tool_call.get("function", {})
+            try:
+                args = json.loads(function.get("arguments") or "{}")
+            except json.JSONDecodeError:
+                args = {}
+            calls[tool_call.get("id", "")] = (function.get("name", ""), args)
+    return calls
+
+
+def _dedupe_reads(messages: list[dict[str, Any]]) -> int:
+    """Replace the results of read_file calls for files that are read again later."""
+    calls = _tool_calls_by_id(messages)
+    seen: set[tuple[Any, ...]] = set()
+    count = 0
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if message.get("role") != "tool":
+            continue
+        name, args = calls.get(message.get("tool_call_id", ""), ("", {}))
+        if name != "read_file":
+            continue
+        path = os.path.normpath(str(args.get("path", "")))
+        part = (path, args.get("start_line"), args.get("end_line"), args.get("max_bytes"))
+        if part not in seen:
+            seen.add(part)  # The latest read of this part of the file stays
+            continue
+        note = f"[Outdated: {path} was read again later in the conversation]"
+        if message.get("content") != note:
+            messages[i] = {**message, "content": note}
+            count += 1
+    return count
+
+
+def _elide_results(messages: list[dict[str, Any]], end: int) -> int:
+    """Cut long tool results in messages[:end] down to their start."""
+    count = 0
+    for i in range(end):
+        message = messages[i]
+        content = str(message.get("content") or "")
+        if message.get("role") == "tool" and len(content) > ELIDE_OVER:
+            elided = len(content) - ELIDE_KEEP
+            content = f"{content[:ELIDE_KEEP]}\n[... {elided} characters elided ...]"
+            messages[i] = {**message, "content": content}
+            count += 1
+    return count
+
+
+def _summarize(messages: list[dict[str, Any]], end: int, chat: ChatFn) -> int:
+    """Replace the turns before messages[end] with a summary; return messages replaced."""
+    start = 1 if messages and messages[0].get("role") == "system" else 0
+    # Cut before a user message or an assistant step, so every tool result
+    # stays with the call it answers
+    cut = end
+    while cut > start and messages[cut].get("role") not in ("user", "assistant"):
+        cut -= 1
+    if cut - start < 2:
+        return 0
+
+    transcript: list[str] = []
+    for message in messages[start:cut]:
+        text = str(message.get("content") or "")
+        for function in _functions(message):
+            text += f"\n[calls {function.get('name')}({function.get('arguments')})]"
+        if len(text) > SUMMARY_MESSAGE_CHARS:
+            text = text[:SUMMARY_MESSAGE_CHARS] + " [...]"
+        transcript.append(f"{message.get('role')}: {text}")
+
+    response = chat(
+        [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": SUMMARY_REQUEST + "\n\n".join(transcript)},
+        ]
+    )
+    summary = str(response["choices"][0]["message"].get("content") or "").strip()
+    if not summary:
+        return 0
+    messages[start:cut] = [{"role": "system", "content": SUMMARY_PREFIX + summary}]
+    return cut - start
+
+
+_default_budget: ContextBudget | None = None
+_default_lock = threading.Lock()
+
+
+def default_budget() -> ContextBudget:
+    """Budget used by callers that don't manage their own."""
+    global _default_budget
+    with _default_lock:
+        if _default_budget is None:
+            _default_budget = ContextBudget()
+        return _default_budget
@@ -0,0 +1,133 @@
+"""Process-wide cache of text file contents for the file tools.
+
+In one agent turn a file is typically read, read again by edit_file, written
+and read once more. The file tools share this cache, so a read of an
+unchanged file costs one stat. An entry is valid while the file's (inode,
+mtime_ns, size) match the values the text was read or written with. The
+cache holds at most AGENT_FILE_CACHE_MB (default 64) of text, least recently
+used entries going first. Writes replace files atomically.
+"""
+
+import contextlib
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class _Entry(NamedTuple):
+    version: tuple[int, int, int]  # (st_ino, st_mtime_ns, st_size)
+    text: str
+    size: int  # Bytes on disk
+
+
+def _version(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class FileCache:
+    """Decoded (UTF-8) contents of recently used files, validated by stat."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry = max_bytes // 8  # Larger files are not cached
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, max_size: int | None = None) -> str | None:
+        """Cached text of path if the file is unchanged (and at most max_size bytes)."""
+        key = os.path.abspath(path)
+        try:
+            version = _version(os.stat(key))
+        except OSError:
+            version = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self.misses += 1
+                return None
+            if max_size is not None and entry.size > max_size:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.text
+
+    def put(self, path: str, text: str, st: os.stat_result) -> None:
+        """Remember that path, with stat result st, holds text."""
+        key = os.path.abspath(path)
+        entry = _Entry(_version(st), text, st.st_size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.size
+            if entry.size > self.max_entry or "\0" in text:
+                return  # Too large, or a file read_file describes as binary
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def read(self, path: str) -> str:
+        """Return the text of path, from the cache when it is unchanged."""
+        text = self.get(path)
+        if text is None:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())  # Before reading: a later change invalidates
+                text = f.read().decode()
+            self.put(path, text, st)
+        return text
+
+    def write(self, path: str, text: str) -> None:
+        """Write text to path atomically and cache it."""
+        self.put(path, text, atomic_write(path, text.encode()))
+
+    def stats(self) -> dict[str, float]:
+        """Hit/miss counters and the cache's current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "files": len(self._entries),
+            "bytes": self._size,
+        }
+
+
+def atomic_write(path: str, data: bytes) -> os.stat_result:
+    """
+    Replace the file at path with data, so readers see the old or new file, never a mix.
+
+    The data goes to a temporary file next to the target, which is synced
+    and then renamed over it. An existing file's permissions are kept, and a
+    symlink is followed rather than replaced. Returns the new file's stat.
+    """
+    target = os.path.realpath(path)
+    try:
+        mode = os.stat(target).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+    directory, name = os.path.split(target)
+    tmp = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)  # Subject to umask
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            if mode is not None:
+                os.fchmod(f.fileno(), mode)
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        os.replace(tmp, target)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    return st
+
+
+file_cache = FileCache(int(float(os.environ.get("AGENT_FILE_CACHE_MB", "64")) * 1024 * 1024))
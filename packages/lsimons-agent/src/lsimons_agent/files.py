@@ -0,0 +1,155 @@
+"""Reading text files of any size for the read_file tool.
+
+Whole reads of small files go through the shared file cache (filecache.py).
+Files over the byte cap are never read whole. A line range is served from a
+memory map. Line starts are found through a sparse index that records how
+many lines precede every CHUNK-sized block. The index is built lazily, only
+up to the furthest line requested so far, and is kept per file for as long
+as the file is unchanged. The first read near line N scans the file up to
+that line. Later reads around there cost O(result + CHUNK).
+"""
+
+import bisect
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from lsimons_agent.filecache import file_cache
+
+CHUNK = 64 * 1024
+MAX_BYTES = 100_000  # Default cap on the text returned by one read
+BINARY_SAMPLE = 8192  # Bytes inspected to tell binary from text
+MAX_INDEXES = 32  # Line indexes kept, for the most recently read files
+
+
+class LineIndex:
+    """Newline counts at CHUNK boundaries of one version of a file."""
+
+    def __init__(self, version: tuple[int, int, int]):
+        self.version = version  # (inode, mtime_ns, size) when the index was built
+        self.newlines = [0]  # newlines[k]: newlines in the first k chunks
+        self._lock = threading.Lock()
+
+    def line_start(self, data: mmap.mmap, line: int) -> int:
+        """Offset where line (1-based) starts, or len(data) when past the end."""
+        if line <= 1:
+            return 0
+        target = line - 1  # Newlines that precede the line
+        size = len(data)
+        with self._lock:
+            newlines = self.newlines
+            while newlines[-1] < target and (len(newlines) - 1) * CHUNK < size:
+                k = len(newlines) - 1
+                newlines.append(newlines[-1] + data[k * CHUNK : (k + 1) * CHUNK].count(b"\n"))
+        if newlines[-1] < target:
+            return size
+        # The chunk that holds the target newline
+        k = bisect.bisect_left(newlines, target) - 1
+        pos = k * CHUNK
+        for _ in range(target - newlines[k]):
+            pos = data.find(b"\n", pos) + 1
+        return pos
+
+
+_indexes: OrderedDict[str, LineIndex] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _line_index(path: str, st: os.stat_result) -> LineIndex:
+    """The cached line index for path, or a new one if the file changed."""
+    key = os.path.realpath(path)
+    version = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or index.version != version:
+            index = _indexes[key] = LineIndex(version)
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def is_binary(sample: bytes) -> bool:
+    """Whether a file starting with sample looks binary (NUL bytes or invalid UTF-8)."""
+    if b"\0" in sample:
+        return True
+    try:
+        sample.decode()
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the end of the sample is fine
+        return e.start < len(sample) - 3
+    return False
+
+
+def read_text(
+    path: str,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    max_bytes: int | None = None,
+) -> str:
+    """
+    Return a text file's contents, or lines start_line to end_line (1-based, inclusive).
+
+    At most max_bytes (default MAX_BYTES) are returned; a note at the end says
+    when the text was cut short. Binary files get a one-line description.
+    """
+    max_bytes = max_bytes or MAX_BYTES
+    whole = start_line is None and end_line is None
+    if whole and (text := file_cache.get(path, max_size=max_bytes)) is not None:
+        return text
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        sample = f.read(BINARY_SAMPLE)
+        if is_binary(sample):
+            return f"[Binary file: {st.st_size} bytes, starting with {sample[:16].hex(' ')}]"
+        if whole and st.st_size <= max_bytes:
+            data = sample + f.read()
+            try:
+                text = data.decode()
+            except UnicodeDecodeError:
+                return data.decode(errors="replace")
+            file_cache.put(path, text, st)
+            return text
+        if st.st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _read_range(path, st, data, start_line or 1, end_line, max_bytes)
+
+
+def _read_range(
+    path: str,
+    st: os.stat_result,
+    data: mmap.mmap,
+    start_line: int,
+    end_line: int | None,
+    max_bytes: int,
+) -> str:
+    start = _line_index(path, st).line_start(data, start_line)
+    if start == len(data) and start_line > 1:
+        return f"[The file has fewer than {start_line} lines]"
+    limit = min(len(data), start + max_bytes)
+    end = limit
+    complete = limit == len(data)
+    if end_line is not None:
+        end = start
+        for _ in range(max(0, end_line - start_line + 1)):
+            newline = data.find(b"\n", end, limit)
+            if newline < 0:
+                end = limit
+                break
+            end = newline + 1
+        else:
+            complete = True
+
+    text = data[start:end].decode(errors="replace")
+    if complete:
+        return text
+    # Cut short by max_bytes: end on a whole line when there is one
+    cut = text.rfind("\n") + 1
+    shown = text[:cut] if cut else text + "\n"
+    lines = shown.count("\n")
+    return (
+        f"{shown}[Truncated after {len(shown.encode())} bytes ({lines} lines from line "
+        f"{start_line}) of a {st.st_size}-byte file; use start_line/end_line to read more]"
+    )
@@ -1,39 +1,546 @@
 """LLM client for OpenAI-compatible APIs."""
 
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
 import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Generator, Iterable
 from typing import Any
 
 import httpx
 
+from lsimons_agent import metrics, retry
+from lsimons_agent.cache import ResponseCache, cache_from_env, cache_key
+from lsimons_agent.router import Router
 
-def chat(
+logger = logging.getLogger(__name__)
+
+# Shared connection pool, created on first use and reused across calls so that
+# consecutive agent steps don't pay for a new TCP/TLS handshake each time.
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+# An httpx.AsyncClient is bound to the event loop it first ran on, so the
+# async API keeps one client per loop
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+    weakref.WeakKeyDictionary()
+)
+
+_attempts = metrics.counter(
+    "lsimons_agent_llm_attempts_total",
+    "LLM request attempts, including retries and hedges, by HTTP status or error",
+    ["status"],
+)
+_request_seconds = metrics.histogram(
+    "lsimons_agent_llm_request_seconds",
+    "Time to an LLM response (to its headers, when streamed), including retries",
+    ["stream"],
+)
+_unstreamed_seconds = _request_seconds.labels("false")
+_streamed_seconds = _request_seconds.labels("true")
+_cache_hits = metrics.counter(
+    "lsimons_agent_llm_cache_hits_total", "LLM responses served from the response cache"
+)
+
+
+def _count_attempt(attempt: retry.Attempt) -> None:
+    _attempts.labels(str(attempt.status or attempt.error)).inc()
+
+
+# Called with every request attempt, including retries and hedges
+attempt_hooks: list[retry.AttemptHook] = [_count_attempt]
+
+# Recent latencies of complete responses and of streamed responses' headers,
+# from which hedged requests take their delay
+_latencies = retry.Latencies()
+_stream_latencies = retry.Latencies()
+
+# Router over the endpoints in LLM_BASE_URLS, rebuilt when they change
+_router: Router | None = None
+_router_urls = ""
+
+# Response cache from LLM_CACHE, opened on first use
+_cache: ResponseCache | None = None
+_cache_opened = False
+
+
+def _http2_enabled() -> bool:
+    """Use HTTP/2 unless disabled via LLM_HTTP2=0 or the h2 package is missing."""
+    if os.environ.get("LLM_HTTP2", "1") == "0":
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def _pool_limits(max_connections: int = 20) -> httpx.Limits:
+    """Connection pool limits, tunable via environment variables."""
+    return httpx.Limits(
+        max_connections=int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", max_connections)),
+        max_keepalive_connections=int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.environ.get("LLM_POOL_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    """Request timeout from LLM_TIMEOUT (seconds), with a short connect timeout."""
+    return httpx.Timeout(float(os.environ.get("LLM_TIMEOUT", "120")), connect=10.0)
+
+
+def get_client() -> httpx.Client:
+    """Return the shared HTTP client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                http2=_http2_enabled(),
+                limits=_pool_limits(),
+                timeout=_timeout(),
+            )
+        return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the running event loop's HTTP client, creating it on first use.
+
+    Every in-flight async request holds a connection (or an HTTP/2 stream),
+    so this pool allows more connections than the sync one by default.
+    """
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = httpx.AsyncClient(
+                http2=_http2_enabled(),
+                limits=_pool_limits(max_connections=1000),
+                timeout=_timeout(),
+            )
+        return client
+
+
+def get_router() -> Router:
+    """Return the router over LLM_BASE_URLS (comma-separated), or LLM_BASE_URL alone."""
+    global _router, _router_urls
+    urls = os.environ.get("LLM_BASE_URLS") or os.environ.get(
+        "LLM_BASE_URL", "http://localhost:8000"
+    )
+    with _client_lock:
+        if _router is None or urls != _router_urls:
+            _router = Router([url.strip() for url in urls.split(",") if url.strip()])
+            _router_urls = urls
+        return _router
+
+
+def get_cache() -> ResponseCache | None:
+    """Return the response cache if LLM_CACHE is set, opening it on first use."""
+    global _cache, _cache_opened
+    with _client_lock:
+        if not _cache_opened:
+            _cache = cache_from_env()
+            _cache_opened = True
+        return _cache
+
+
+def close() -> None:
+    """Close the shared HTTP client and response cache. Safe to call more than once."""
+    global _client, _cache, _cache_opened
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        if _cache is not None:
+            stats = _cache.stats()
+            logger.info(
+                "LLM cache: %d hits, %d misses, saved %.1fs",
+                stats["hits"],
+                stats["misses"],
+                stats["saved_seconds"],
+            )
+            _cache.close()
+            _cache = None
+        _cache_opened = False
+
+
+async def aclose() -> None:
+    """Close the running event loop's HTTP client, if it has one."""
+    with _client_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class _EncodedCache:
+    """
+    JSON encodings of recently sent messages, keyed by object identity.
+
+    A conversation only grows between requests, so each step re-sends the
+    same message dicts plus a few new ones; only the new ones get encoded.
+    An entry holds on to its message, so its id can't be reused while cached.
+    Messages must not be changed after they were sent - replace them instead.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, tuple[Any, bytes]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def encode(self, obj: Any) -> bytes:
+        """Return obj as compact JSON with sorted keys."""
+        with self._lock:
+            entry = self._entries.get(id(obj))
+            if entry is not None and entry[0] is obj:
+                self._entries.move_to_end(id(obj))
+                return entry[1]
+        data = _dumps(obj)
+        with self._lock:
+            old = self._entries.pop(id(obj), None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[id(obj)] = (obj, data)
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+
+_encoded = _EncodedCache()
+
+
+def _build_request(
     messages: list[dict[str, Any]],
-    tools: list[dict[str, Any]] | None = None,
-    model: str | None = None,
-) -> dict[str, Any]:
-    """Send messages to LLM and return raw API response dict."""
-    base_url = os.environ.get("LLM_BASE_URL", "http://localhost:8000")
+    tools: list[dict[str, Any]] | None,
+    model: str | None,
+) -> tuple[str, bytes, dict[str, str]]:
+    """Return the path, JSON body and headers for a chat completion request."""
     auth_token = os.environ.get("LLM_AUTH_TOKEN", "")
     model = model or os.environ.get("LLM_DEFAULT_MODEL", "mock-model")
 
-    payload: dict[str, Any] = {
-        "model": model,
-        "messages": messages,
-        "max_tokens": 4096,
-    }
+    # The body is joined from cached per-message encodings, in a single copy
+    parts = [b'{"model":', _dumps(model), b',"max_tokens":4096,"messages":[']
+    for message in messages:
+        parts += (_encoded.encode(message), b",")
+    if messages:
+        parts.pop()
+    parts.append(b"]")
     if tools:
-        payload["tools"] = tools
+        parts += (b',"tools":', _encoded.encode(tools))
+    parts.append(b"}")
 
-    headers: dict[str, str] = {}
+    headers = {"Content-Type": "application/json"}
     if auth_token:
         headers["Authorization"] = f"Bearer {auth_token}"
 
-    response = httpx.post(
-        f"{base_url}/chat/completions",
-        json=payload,
-        headers=headers,
-        timeout=120.0,
+    return "/chat/completions", b"".join(parts), headers
+
+
+def _affinity(messages: list[dict[str, Any]]) -> str:
+    """A routing key that stays the same for a conversation, from its first messages."""
+    digest = hashlib.blake2b(digest_size=8)
+    for message in messages[:2]:
+        digest.update(_encoded.encode(message))
+    return digest.hexdigest()
+
+
+class _Request:
+    """
+    One chat completion request, with what chat(), chat_stream(), achat() and
+    achat_stream() do around sending it: the cache lookup, the stats, the
+    latency metrics and storing the response in the cache.
+    """
+
+    def __init__(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+        model: str | None,
+        stats: dict[str, Any] | None,
+        stream: bool,
+    ):
+        self.path, body, self.headers = _build_request(messages, tools, model)
+        self.cache = get_cache()
+        self.key = cache_key(body) if self.cache else ""  # Shared by streamed and unstreamed
+        self.body = body[:-1] + b',"stream":true}' if stream else body
+        self.stats = stats
+        self.seconds = _streamed_seconds if stream else _unstreamed_seconds
+        self._record(request_bytes=len(self.body))
+        self.cached = self.cache.get(self.key) if self.cache else None
+        if self.cached is not None:
+            _cache_hits.inc()
+            self._record(cached=True)
+        self.affinity = _affinity(messages)
+        self.start = time.perf_counter()
+
+    def _record(self, **values: Any) -> None:
+        if self.stats is not None:
+            self.stats.update(values)
+
+    def replay(self) -> list[tuple[str, Any]]:
+        """The cached response as stream events: its content as a single delta."""
+        assert self.cached is not None
+        content = self.cached["choices"][0]["message"].get("content")
+        return [*([("text_delta", content)] if content else []), ("response", self.cached)]
+
+    def responded(self) -> float:
+        """Note that the response (or its headers) arrived, and return when."""
+        now = time.perf_counter()
+        self.seconds.observe(now - self.start)
+        self._record(wait_seconds=now - self.start)
+        return now
+
+    def decode(self, response: httpx.Response) -> dict[str, Any]:
+        """The result of an unstreamed response, which has just arrived."""
+        waited = self.responded()
+        response.raise_for_status()
+        result: dict[str, Any] = response.json()
+        self._record(
+            response_bytes=len(response.content), decode_seconds=time.perf_counter() - waited
+        )
+        self.store(result)
+        return result
+
+    def closed(self, response: httpx.Response) -> None:
+        """Note that a streamed response is done with, read to the end or not."""
+        self._record(response_bytes=response.num_bytes_downloaded)
+
+    def store(self, result: dict[str, Any]) -> None:
+        if self.cache:
+            self.cache.put(self.key, result, time.perf_counter() - self.start)
+
+
+def chat(
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None = None,
+    model: str | None = None,
+    *,
+    stats: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """
+    Send messages to LLM and return raw API response dict.
+
+    A stats dict, if given, receives the request_bytes and response_bytes,
+    the wait_seconds until the response arrived and the decode_seconds its
+    JSON took to parse, or cached=True for a response from the cache.
+    """
+    request = _Request(messages, tools, model, stats, stream=False)
+    if request.cached is not None:
+        return request.cached
+
+    client, router = get_client(), get_router()
+
+    def post(base_url: str) -> httpx.Response:
+        return client.post(base_url + request.path, content=request.body, headers=request.headers)
+
+    response = retry.send(
+        lambda: router.call(request.affinity, post),
+        retry.Policy.from_env(),
+        _latencies,
+        attempt_hooks,
+    )
+    return request.decode(response)
+
+
+def chat_stream(
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None = None,
+    model: str | None = None,
+    *,
+    stats: dict[str, Any] | None = None,
+) -> Generator[tuple[str, Any]]:
+    """
+    Send messages to LLM with streaming enabled.
+
+    Yields ("text_delta", text) as content arrives, then ("response", response)
+    with the reassembled response in the same shape chat() returns. A cached
+    response is replayed as a single text delta. Stats are as for chat(),
+    except that wait_seconds ends at the response headers and the parsing,
+    which happens while the response arrives, is not timed.
+    """
+    request = _Request(messages, tools, model, stats, stream=True)
+    if request.cached is not None:
+        yield from request.replay()
+        return
+
+    client, router = get_client(), get_router()
+
+    def open_stream(base_url: str) -> httpx.Response:
+        built = client.build_request(
+            "POST", base_url + request.path, content=request.body, headers=request.headers
+        )
+        return client.send(built, stream=True)
+
+    response = retry.send(
+        lambda: router.call(request.affinity, open_stream),
+        retry.Policy.from_env(),
+        _stream_latencies,
+        attempt_hooks,
+    )
+    request.responded()
+    try:
+        response.raise_for_status()
+        for event in parse_stream(response.iter_lines()):
+            if event[0] == "response":
+                request.store(event[1])
+            yield event
+    finally:
+        request.closed(response)
+        response.close()
+
+
+async def achat(
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None = None,
+    model: str | None = None,
+    *,
+    stats: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """Async chat(): the same request, response and stats, on the event loop's client."""
+    request = _Request(messages, tools, model, stats, stream=False)
+    if request.cached is not None:
+        return request.cached
+
+    client, router = get_async_client(), get_router()
+
+    async def post(base_url: str) -> httpx.Response:
+        return await client.post(
+            base_url + request.path, content=request.body, headers=request.headers
+        )
+
+    response = await retry.asend(
+        lambda: router.acall(request.affinity, post),
+        retry.Policy.from_env(),
+        _latencies,
+        attempt_hooks,
     )
-    response.raise_for_status()
-    result: dict[str, Any] = response.json()
-    return result
+    return request.decode(response)
+
+
+async def achat_stream(
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None = None,
+    model: str | None = None,
+    *,
+    stats: dict[str, Any] | None = None,
+) -> AsyncGenerator[tuple[str, Any]]:
+    """Async chat_stream(): yields the same events, on the event loop's client."""
+    request = _Request(messages, tools, model, stats, stream=True)
+    if request.cached is not None:
+        for event in request.replay():
+            yield event
+        return
+
+    parser = _StreamParser()
+    client, router = get_async_client(), get_router()
+
+    async def open_stream(base_url: str) -> httpx.Response:
+        built = client.build_request(
+            "POST", base_url + request.path, content=request.body, headers=request.headers
+        )
+        return await client.send(built, stream=True)
+
+    response = await retry.asend(
+        lambda: router.acall(request.affinity, open_stream),
+        retry.Policy.from_env(),
+        _stream_latencies,
+        attempt_hooks,
+    )
+    request.responded()
+    try:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            for event in parser.feed(line):
+                yield event
+            if parser.done:
+                break
+    finally:
+        request.closed(response)
+        await response.aclose()
+    result = parser.response()
+    request.store(result)
+    yield ("response", result)
+
+
+def parse_stream(lines: Iterable[str]) -> Generator[tuple[str, Any]]:
+    """Parse server-sent chat completion chunks into text deltas and a final response."""
+    parser = _StreamParser()
+    for line in lines:
+        yield from parser.feed(line)
+        if parser.done:
+            break
+    yield ("response", parser.response())
+
+
+class _StreamParser:
+    """The state of parse_stream, fed one line at a time by sync and async streams."""
+
+    def __init__(self) -> None:
+        self.content_parts: list[str] = []
+        self.tool_calls: dict[int, dict[str, Any]] = {}
+        self.finish_reason: str | None = None
+        self.usage: dict[str, Any] | None = None
+        self.done = False  # [DONE] was seen
+
+    def feed(self, line: str) -> list[tuple[str, Any]]:
+        """Take one line of the stream and return the text deltas it holds."""
+        if not line.startswith("data: "):
+            return []
+        data = line[6:].strip()
+        if data == "[DONE]":
+            self.done = True
+            return []
+
+        chunk: dict[str, Any] = json.loads(data)
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        choices: list[dict[str, Any]] = chunk.get("choices") or []
+        if not choices:
+            return []
+        choice = choices[0]
+        self.finish_reason = choice.get("finish_reason") or self.finish_reason
+        delta: dict[str, Any] = choice.get("delta") or {}
+
+        # Tool calls arrive as fragments keyed by index; the id and name come
+        # first and the JSON arguments are split across later chunks.
+        fragments: list[dict[str, Any]] = delta.get("tool_calls") or []
+        for fragment in fragments:
+            call = self.tool_calls.setdefault(
+                fragment.get("index", 0),
+                {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            if fragment.get("id"):
+                call["id"] = fragment["id"]
+            fn: dict[str, Any] = fragment.get("function") or {}
+            if fn.get("name"):
+                call["function"]["name"] += fn["name"]
+            if fn.get("arguments"):
+                call["function"]["arguments"] += fn["arguments"]
+
+        text: str | None = delta.get("content")
+        if not text:
+            return []
+        self.content_parts.append(text)
+        return [("text_delta", text)]
+
+    def response(self) -> dict[str, Any]:
+        """The reassembled response, in the same shape chat() returns."""
+        content = "".join(self.content_parts) or None
+        message: dict[str, Any] = {"role": "assistant", "content": content}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+
+        response: dict[str, Any] = {
+            "choices": [{"index": 0, "message": message, "finish_reason": self.finish_reason}]
+        }
+        if self.usage is not None:
+            response["usage"] = self.usage
+        return response
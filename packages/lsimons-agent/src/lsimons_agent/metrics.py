@@ -0,0 +1,287 @@
+"""Process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms with fixed buckets are kept in a registry,
+which renders them all with exposition(); the web server serves that at
+/metrics. A metric with labels holds one series per combination of label
+values. Look a series up once with labels() and keep it, so that a hot path
+pays only for the update: an addition under the series' own (uncontended)
+lock, plus a bisect into the buckets for a histogram.
+
+Values that are cheaper to read when scraped than to keep up to date, such
+as the number of open terminals, are gauges with a function instead.
+"""
+
+import abc
+import bisect
+import contextlib
+import math
+import threading
+import time
+from collections.abc import Callable, Generator, Iterable, Sequence
+
+# Seconds, from a quick tool call to a slow LLM response
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = tuple[tuple[str, str], ...]
+Sample = tuple[str, Labels, float]  # Name suffix, labels, value
+
+
+class Value:
+    """One series of a counter or gauge."""
+
+    __slots__ = ("_lock", "value")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        """Gauges only."""
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Gauges only."""
+        self.value = value
+
+
+class Buckets:
+    """One series of a histogram."""
+
+    __slots__ = ("_lock", "bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self) -> Generator[None]:
+        """Observe how long the with block took, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Metric(abc.ABC):
+    """A named metric and its series."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: tuple[str, ...]) -> Labels:
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+        return tuple(zip(self.label_names, values, strict=True))
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """Every sample of the metric, as exposition() renders them."""
+
+
+class Counter(Metric):
+    """A value that only goes up, such as requests made or bytes sent."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._series: dict[tuple[str, ...], Value] = {}
+        if not labels:
+            self.labels()
+
+    def labels(self, *values: str) -> Value:
+        """The series for these label values, created on first use."""
+        series = self._series.get(values)
+        if series is None:
+            self._labels(values)
+            with self._lock:
+                series = self._series.setdefault(values, Value())
+        return series
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Sample]:
+        for values, series in list(self._series.items()):
+            yield "", self._labels(values), series.value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from a function when scraped."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        function: Callable[[], float] | None = None,
+    ):
+        if function is not None and labels:
+            raise ValueError("A gauge with a function has no labels")
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[Sample]:
+        if self.function is not None:
+            yield "", (), self.function()
+        else:
+            yield from super().samples()
+
+
+class Histogram(Metric):
+    """Counts of observations, such as latencies, in fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], Buckets] = {}
+        if not labels:
+            self.labels()
+
+    def labels(self, *values: str) -> Buckets:
+        """The series for these label values, created on first use."""
+        series = self._series.get(values)
+        if series is None:
+            self._labels(values)
+            with self._lock:
+                series = self._series.setdefault(values, Buckets(self.bounds))
+        return series
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> contextlib.AbstractContextManager[None]:
+        return self.labels().time()
+
+    def samples(self) -> Iterable[Sample]:
+        for values, series in list(self._series.items()):
+            labels = self._labels(values)
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, count in zip((*self.bounds, math.inf), counts, strict=True):
+                cumulative += count
+                yield "_bucket", (*labels, ("le", _number(bound))), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Registry:
+    """The metrics of a process, by name."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._add(metric)
+        return metric
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        function: Callable[[], float] | None = None,
+    ) -> Gauge:
+        metric = Gauge(name, help, labels, function)
+        self._add(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._add(metric)
+        return metric
+
+    def _add(self, metric: Metric) -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def exposition(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        lines: list[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            help = _escape(metric.help)
+            lines.append(f"# HELP {metric.name} {help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value, quotes=True)}"' for name, value in labels) + "}"
+
+
+def _escape(text: str, quotes: bool = False) -> str:
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    return text.replace('"', '\\"') if quotes else text
+
+
+def _number(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 2**53:
+        return str(int(value))
+    return repr(value)
+
+
+# The process's metrics, served by lsimons-agent-web at /metrics
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+exposition = registry.exposition
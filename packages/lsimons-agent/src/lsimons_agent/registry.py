@@ -0,0 +1,196 @@
+"""Registry of the agent's tools, built from decorated functions.
+
+Each tool is a plain function plus its JSON schema and a little metadata
+the scheduler uses: whether a call only reads state, whether repeating it
+gives the same result, which paths it touches and roughly what it costs.
+The registry produces the TOOLS list sent to the LLM, checks the model's
+arguments against validators compiled once from each schema, and
+dispatches calls by name. Timing hooks see how long every call took.
+"""
+
+import inspect
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from typing import Any, cast
+
+Args = dict[str, Any]
+Validator = Callable[[Any, str], Iterator[str]]
+TimingHook = Callable[[str, float, bool], None]  # (tool name, seconds, raised)
+
+_TYPES: dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, int | float) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+_JSON_NAMES: dict[type, str] = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+    type(None): "null",
+}
+
+
+def compile_schema(schema: dict[str, Any], closed: bool = False) -> Validator:
+    """
+    A validator for the subset of JSON Schema the tool schemas use.
+
+    The validator yields one message per problem, prefixed with the path of
+    the offending value. Supports type, enum, properties, required and
+    items; with closed=True an object may not have properties the schema
+    doesn't list.
+    """
+    checks: list[Validator] = []
+    if "type" in schema:
+        name: str = schema["type"]
+        is_type = _TYPES[name]
+
+        def check_type(value: object, where: str) -> Iterator[str]:
+            if not is_type(value):
+                got = _JSON_NAMES.get(type(value), type(value).__name__)
+                yield f"{where}: expected {name}, got {got}"
+
+        checks.append(check_type)
+    if "enum" in schema:
+        allowed: list[Any] = schema["enum"]
+
+        def check_enum(value: Any, where: str) -> Iterator[str]:
+            if value not in allowed:
+                yield f"{where}: must be one of {', '.join(map(repr, allowed))}"
+
+        checks.append(check_enum)
+    if "properties" in schema or "required" in schema:
+        properties: dict[str, Validator] = {
+            key: compile_schema(sub) for key, sub in schema.get("properties", {}).items()
+        }
+        required: list[str] = schema.get("required", [])
+
+        def check_object(value: Any, where: str) -> Iterator[str]:
+            if not isinstance(value, dict):
+                return
+            obj = cast(dict[str, Any], value)
+            for key in required:
+                if key not in obj:
+                    yield f"{where}: missing required {key!r}"
+            for key, item in obj.items():
+                validate = properties.get(key)
+                if validate is not None:
+                    yield from validate(item, f"{where}.{key}")
+                elif closed:
+                    yield f"{where}: unknown argument {key!r}"
+
+        checks.append(check_object)
+    if "items" in schema:
+        validate_item = compile_schema(schema["items"])
+
+        def check_items(value: Any, where: str) -> Iterator[str]:
+            if isinstance(value, list):
+                for i, item in enumerate(cast(list[Any], value)):
+                    yield from validate_item(item, f"{where}[{i}]")
+
+        checks.append(check_items)
+
+    def validate(value: Any, where: str) -> Iterator[str]:
+        for check in checks:
+            yield from check(value, where)
+
+    return validate
+
+
+@dataclass
+class Tool:
+    """A tool the model can call, with what the scheduler needs to know about it."""
+
+    name: str
+    fn: Callable[..., str]
+    description: str
+    parameters: dict[str, Any]
+    # Only reads state; may depend on the arguments (bash's read_only flag)
+    read_only: bool | Callable[[Args], bool] = False
+    # Repeating a call, with nothing changed in between, gives the same result
+    idempotent: bool = False
+    paths: Callable[[Args], set[str]] | None = None  # Files a call reads or writes
+    cost: float = 0.01  # Typical seconds per call
+    validate: Validator = field(init=False, repr=False)
+    context: frozenset[str] = field(init=False, repr=False)  # Parameters not in the schema
+
+    def __post_init__(self) -> None:
+        self.validate = compile_schema(self.parameters, closed=True)
+        schema_args = set(self.parameters.get("properties", {}))
+        self.context = frozenset(inspect.signature(self.fn).parameters) - schema_args
+
+    def is_read_only(self, args: Args) -> bool:
+        return self.read_only(args) if callable(self.read_only) else self.read_only
+
+    def schema(self) -> dict[str, Any]:
+        """The tool's entry in the OpenAI tools list."""
+        function = {"name": self.name, "description": self.description}
+        return {"type": "function", "function": function | {"parameters": self.parameters}}
+
+
+class Registry:
+    """Tools by name, in registration order."""
+
+    def __init__(self) -> None:
+        self.tools: dict[str, Tool] = {}
+        self.timing_hooks: list[TimingHook] = []
+
+    def tool(
+        self,
+        description: str,
+        parameters: dict[str, Any],
+        *,
+        read_only: bool | Callable[[Args], bool] = False,
+        idempotent: bool = False,
+        paths: Callable[[Args], set[str]] | None = None,
+        cost: float = 0.01,
+    ) -> Callable[[Callable[..., str]], Callable[..., str]]:
+        """Decorator that registers a function as a tool named after it."""
+
+        def register(fn: Callable[..., str]) -> Callable[..., str]:
+            tool = Tool(
+                fn.__name__, fn, description, parameters, read_only, idempotent, paths, cost
+            )
+            self.tools[tool.name] = tool
+            return fn
+
+        return register
+
+    def get(self, name: str) -> Tool | None:
+        return self.tools.get(name)
+
+    def schemas(self) -> list[dict[str, Any]]:
+        return [tool.schema() for tool in self.tools.values()]
+
+    def execute(self, name: str, args: Args, **context: Any) -> str:
+        """
+        Call a tool with the model's arguments and return its result.
+
+        Arguments that don't match the schema are reported back as the
+        result, without calling the tool. Context values (the shell session,
+        an output callback) are passed to tools that take them.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Unknown tool: {name}"
+        errors = list(tool.validate(args, "arguments"))
+        if errors:
+            return f"Error: invalid arguments for {name}: " + "; ".join(errors)
+        extra = {key: value for key, value in context.items() if key in tool.context}
+        start = time.perf_counter()
+        raised = True
+        try:
+            result = tool.fn(**args, **extra)
+            raised = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in self.timing_hooks:
+                hook(name, elapsed, raised)
@@ -0,0 +1,322 @@
+"""Retries and hedging for LLM requests.
+
+A request that fails with a transport error or a 408, 429 or 5xx status is
+retried after an exponential backoff with full jitter, or after as long as
+the server's Retry-After header asks for. With hedging enabled, a second
+copy of a request is sent when the first is slower than the 95th percentile
+of recent responses, and whichever answers first is used. Every attempt is
+reported to hooks with its latency and outcome.
+
+`send` and `asend` take a function that makes one attempt; for streamed
+requests the attempt ends at the response headers, so a stream that breaks
+after it started is not retried.
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import httpx
+
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Hedged sync requests run here, so the caller can wait for whichever is first
+_pool = ThreadPoolExecutor(thread_name_prefix="llm-hedge")
+
+
+@dataclass
+class Attempt:
+    """One request attempt, as reported to attempt hooks."""
+
+    number: int  # Counts retries and hedges of one request, from 1
+    hedge: bool  # Sent because an earlier attempt was slow
+    seconds: float  # Until the response (headers, when streamed) or the error
+    status: int | None  # None when the request failed without a response
+    error: str | None = None  # Exception type of a failed request
+
+
+AttemptHook = Callable[[Attempt], None]
+Outcome = httpx.Response | BaseException
+
+
+@dataclass
+class Policy:
+    """How often and how long to wait before trying again, and whether to hedge."""
+
+    retries: int = 3
+    base_delay: float = 0.5  # Backoff before the first retry is up to this long
+    max_delay: float = 30.0  # Longest wait; a longer Retry-After gives up instead
+    hedge: bool = False
+    hedge_delay: float = 2.0  # Used until enough latencies are known for a p95
+
+    @classmethod
+    def from_env(cls) -> Policy:
+        env = os.environ.get
+        return cls(
+            retries=int(env("LLM_RETRIES", "3")),
+            base_delay=float(env("LLM_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(env("LLM_RETRY_MAX_DELAY", "30")),
+            hedge=env("LLM_HEDGE", "0") == "1",
+            hedge_delay=float(env("LLM_HEDGE_DELAY", "2")),
+        )
+
+    def backoff(self, retry: int, outcome: Outcome) -> float | None:
+        """Seconds to wait before the retry-th retry, or None to give up."""
+        if isinstance(outcome, httpx.Response):
+            after = retry_after(outcome)
+            if after is not None:
+                return after if after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    """The Retry-After header in seconds from now, given as seconds or a date."""
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except TypeError, ValueError:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class Latencies:
+    """Latencies of recent successful attempts, to derive the hedging delay from."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        """The pct-th percentile (0-100), or None while there are too few samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def retryable(outcome: Outcome) -> bool:
+    """Whether trying again may give a different outcome."""
+    if isinstance(outcome, httpx.Response):
+        return outcome.status_code in RETRY_STATUSES
+    return isinstance(outcome, httpx.TransportError)
+
+
+def _record(
+    outcome: Outcome,
+    attempt: Attempt,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook],
+) -> None:
+    if isinstance(outcome, httpx.Response):
+        attempt.status = outcome.status_code
+        if outcome.status_code < 400:
+            latencies.add(attempt.seconds)
+    else:
+        attempt.error = type(outcome).__name__
+    for hook in hooks:
+        hook(attempt)
+
+
+def _attempt(
+    start: Callable[[], httpx.Response],
+    number: int,
+    hedge: bool,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook],
+) -> httpx.Response:
+    began = time.perf_counter()
+    try:
+        outcome: Outcome = start()
+    except httpx.TransportError as e:
+        outcome = e
+    _record(outcome, Attempt(number, hedge, time.perf_counter() - began, None), latencies, hooks)
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+async def _aattempt(
+    start: Callable[[], Awaitable[httpx.Response]],
+    number: int,
+    hedge: bool,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook],
+) -> httpx.Response:
+    began = time.perf_counter()
+    try:
+        outcome: Outcome = await start()
+    except httpx.TransportError as e:
+        outcome = e
+    _record(outcome, Attempt(number, hedge, time.perf_counter() - began, None), latencies, hooks)
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+def _discard(outcome: Outcome) -> None:
+    if isinstance(outcome, httpx.Response):
+        outcome.close()
+
+
+async def _adiscard(outcome: Outcome) -> None:
+    if isinstance(outcome, httpx.Response):
+        await outcome.aclose()
+
+
+def _result(future: Future[httpx.Response] | asyncio.Task[httpx.Response]) -> Outcome:
+    error = future.exception()
+    return error if error is not None else future.result()
+
+
+def _finish(outcome: Outcome) -> httpx.Response:
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+def send(
+    start: Callable[[], httpx.Response],
+    policy: Policy,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook] = (),
+) -> httpx.Response:
+    """
+    Make a request with retries (and hedges, if the policy says so).
+
+    Returns the first response that isn't worth retrying, or the last one
+    when retries run out, for the caller to check and close; raises the
+    last transport error if no attempt got a response.
+    """
+    number = 0
+    for retry in range(policy.retries + 1):
+        if policy.hedge:
+            outcome, number = _hedged(start, policy, latencies, hooks, number)
+        else:
+            number += 1
+            try:
+                outcome = _attempt(start, number, False, latencies, hooks)
+            except httpx.TransportError as e:
+                outcome = e
+        if not retryable(outcome) or retry == policy.retries:
+            return _finish(outcome)
+        delay = policy.backoff(retry + 1, outcome)
+        if delay is None:
+            return _finish(outcome)
+        _discard(outcome)
+        time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def _hedged(
+    start: Callable[[], httpx.Response],
+    policy: Policy,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook],
+    number: int,
+) -> tuple[Outcome, int]:
+    """Send a request, and a second copy if it is slow; return the better outcome."""
+    first = _pool.submit(_attempt, start, number + 1, False, latencies, hooks)
+    pending: set[Future[httpx.Response]] = {first}
+    delay = latencies.percentile(95) or policy.hedge_delay
+    if not wait(pending, timeout=delay).done:
+        pending.add(_pool.submit(_attempt, start, number + 2, True, latencies, hooks))
+    number += len(pending)
+    outcome: Outcome | None = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = _result(future)
+            if outcome is None or retryable(outcome):
+                if outcome is not None:
+                    _discard(outcome)
+                outcome = result
+            else:
+                _discard(result)
+        if outcome is not None and not retryable(outcome):
+            for future in pending:  # Losers can't be interrupted; close them when they finish
+                future.add_done_callback(lambda f: _discard(_result(f)))
+            break
+    assert outcome is not None
+    return outcome, number
+
+
+async def asend(
+    start: Callable[[], Awaitable[httpx.Response]],
+    policy: Policy,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook] = (),
+) -> httpx.Response:
+    """Async send(): losing hedges are cancelled instead of left to finish."""
+    number = 0
+    for retry in range(policy.retries + 1):
+        if policy.hedge:
+            outcome, number = await _ahedged(start, policy, latencies, hooks, number)
+        else:
+            number += 1
+            try:
+                outcome = await _aattempt(start, number, False, latencies, hooks)
+            except httpx.TransportError as e:
+                outcome = e
+        if not retryable(outcome) or retry == policy.retries:
+            return _finish(outcome)
+        delay = policy.backoff(retry + 1, outcome)
+        if delay is None:
+            return _finish(outcome)
+        await _adiscard(outcome)
+        await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+async def _ahedged(
+    start: Callable[[], Awaitable[httpx.Response]],
+    policy: Policy,
+    latencies: Latencies,
+    hooks: Iterable[AttemptHook],
+    number: int,
+) -> tuple[Outcome, int]:
+    first = asyncio.create_task(_aattempt(start, number + 1, False, latencies, hooks))
+    pending: set[asyncio.Task[httpx.Response]] = {first}
+    delay = latencies.percentile(95) or policy.hedge_delay
+    outcome: Outcome | None = None
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            hedge = _aattempt(start, number + 2, True, latencies, hooks)
+            pending.add(asyncio.create_task(hedge))
+        number += len(pending)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = _result(task)
+                if outcome is None or retryable(outcome):
+                    if outcome is not None:
+                        await _adiscard(outcome)
+                    outcome = result
+                else:
+                    await _adiscard(result)
+            if outcome is not None and not retryable(outcome):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+    assert outcome is not None
+    return outcome, number
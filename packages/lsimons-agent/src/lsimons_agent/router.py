@@ -0,0 +1,172 @@
+"""Routing of LLM requests over several OpenAI-compatible endpoints.
+
+Each endpoint keeps moving averages of its latency and error rate, and
+requests go to the endpoint with the best score: latency, weighed by the
+requests already in flight there and by recent errors. A conversation
+sticks to the endpoint its affinity key hashes to (rendezvous hashing) as
+long as that endpoint isn't much worse than the best, so the provider's
+prompt cache for it stays warm.
+
+After a few consecutive failures an endpoint's circuit opens and it gets no
+traffic for a cooldown that doubles each time it opens again. When the
+cooldown ends it is re-admitted slowly: its share of the requests it would
+win grows over a ramp period, and a failure while ramping reopens it. The
+cooldown is back to its base length once an endpoint has ramped up fully.
+"""
+
+import hashlib
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import httpx
+
+from lsimons_agent import retry
+
+
+@dataclass
+class Endpoint:
+    """One endpoint and what the router knows about it."""
+
+    url: str
+    latency: float | None = None  # Moving average of successful requests, in seconds
+    error_rate: float = 0.0  # Moving average of failures, 0 to 1
+    failures: int = 0  # Consecutive failures
+    in_flight: int = 0
+    open_until: float = 0.0  # No traffic before this time
+    cooldown: float = 0.0  # Length of the next open period
+    ramp_start: float | None = None  # Re-admitted at this time, still ramping up
+
+
+class Router:
+    """Picks an endpoint per request and learns from the outcomes."""
+
+    def __init__(
+        self,
+        urls: list[str],
+        *,
+        alpha: float = 0.2,  # Weight of the newest sample in the moving averages
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        ramp: float = 60.0,
+        affinity_slack: float = 2.0,  # Stick with an endpoint up to this much worse
+        explore: float = 0.02,  # Share of requests sent to a random endpoint
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ):
+        if not urls:
+            raise ValueError("Router needs at least one endpoint")
+        self.endpoints = [Endpoint(url.rstrip("/"), cooldown=cooldown) for url in urls]
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.ramp = ramp
+        self.affinity_slack = affinity_slack
+        self.explore = explore
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def pick(self, affinity: str | None = None) -> Endpoint:
+        """Choose the endpoint for a request and count it as in flight."""
+        with self._lock:
+            endpoint = self._choose(affinity)
+            endpoint.in_flight += 1
+            return endpoint
+
+    def _choose(self, affinity: str | None) -> Endpoint:
+        now = self.clock()
+        available = [e for e in self.endpoints if e.open_until <= now]
+        if not available:  # Everything is down: try the one that comes back first
+            return min(self.endpoints, key=lambda e: e.open_until)
+        if len(available) > 1 and self.rng.random() < self.explore:
+            return self.rng.choice(available)
+
+        # Endpoints still ramping up take part in a growing share of picks
+        for endpoint in available:
+            if endpoint.ramp_start is not None and now - endpoint.ramp_start >= self.ramp:
+                endpoint.ramp_start = None
+                endpoint.cooldown = self.base_cooldown
+        candidates = [
+            e
+            for e in available
+            if e.ramp_start is None
+            or self.rng.random() < max(0.1, (now - e.ramp_start) / self.ramp)
+        ] or available
+
+        known = [e.latency for e in candidates if e.latency is not None]
+        typical = sum(known) / len(known) if known else 0.0
+
+        def score(endpoint: Endpoint) -> float:
+            latency = typical if endpoint.latency is None else endpoint.latency
+            return latency * (1 + endpoint.in_flight) * (1 + 4 * endpoint.error_rate)
+
+        best = min(candidates, key=score)
+        if affinity is None or len(candidates) == 1:
+            return best
+        preferred = max(candidates, key=lambda e: _rendezvous(affinity, e.url))
+        return preferred if score(preferred) <= score(best) * self.affinity_slack else best
+
+    def record(self, endpoint: Endpoint, seconds: float, ok: bool) -> None:
+        """Learn from a finished request to the endpoint."""
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.error_rate += self.alpha * ((0.0 if ok else 1.0) - endpoint.error_rate)
+            if ok:
+                if endpoint.latency is None:
+                    endpoint.latency = seconds
+                else:
+                    endpoint.latency += self.alpha * (seconds - endpoint.latency)
+                endpoint.failures = 0
+                return
+            endpoint.failures += 1
+            if endpoint.failures >= self.failure_threshold or endpoint.ramp_start is not None:
+                endpoint.open_until = self.clock() + endpoint.cooldown
+                endpoint.ramp_start = endpoint.open_until
+                endpoint.cooldown = min(self.max_cooldown, endpoint.cooldown * 2)
+                endpoint.failures = 0
+
+    def cancel(self, endpoint: Endpoint) -> None:
+        """Forget a request that ended without an outcome, such as a cancelled hedge."""
+        with self._lock:
+            endpoint.in_flight -= 1
+
+    def call(self, affinity: str | None, send: Callable[[str], httpx.Response]) -> httpx.Response:
+        """Make one request with send(base_url) on a chosen endpoint."""
+        endpoint = self.pick(affinity)
+        start = time.perf_counter()
+        try:
+            response = send(endpoint.url)
+        except httpx.TransportError:
+            self.record(endpoint, time.perf_counter() - start, ok=False)
+            raise
+        except BaseException:
+            self.cancel(endpoint)
+            raise
+        self.record(endpoint, time.perf_counter() - start, ok=not retry.retryable(response))
+        return response
+
+    async def acall(
+        self, affinity: str | None, send: Callable[[str], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        """Async call()."""
+        endpoint = self.pick(affinity)
+        start = time.perf_counter()
+        try:
+            response = await send(endpoint.url)
+        except httpx.TransportError:
+            self.record(endpoint, time.perf_counter() - start, ok=False)
+            raise
+        except BaseException:
+            self.cancel(endpoint)
+            raise
+        self.record(endpoint, time.perf_counter() - start, ok=not retry.retryable(response))
+        return response
+
+
+def _rendezvous(key: str, url: str) -> bytes:
+    return hashlib.blake2b(f"{key}\0{url}".encode(), digest_size=8).digest()
@@ -0,0 +1,213 @@
+"""Run the tool calls from one LLM response, in parallel where that is safe."""
+
+import heapq
+import json
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any
+
+from lsimons_agent import metrics
+from lsimons_agent.shell import ShellSession
+from lsimons_agent.tools import execute, registry
+
+# How a tool call touches the filesystem: ("read", path), ("write", path),
+# ("read_all", None) for searches and read-only shell commands, or
+# ("exclusive", None) for anything that may change arbitrary state and so
+# must run on its own.
+Access = tuple[str, str | None]
+
+_tool_calls = metrics.counter(
+    "lsimons_agent_tool_calls_total",
+    "Tool calls by tool and outcome: ok, or error when the result reports one",
+    ["tool", "outcome"],
+)
+
+
+def max_workers() -> int:
+    """Number of tool calls that may run at once (AGENT_TOOL_WORKERS, default 4)."""
+    return max(1, int(os.environ.get("AGENT_TOOL_WORKERS", "4")))
+
+
+def tool_access(name: str, args: dict[str, Any]) -> Access:
+    """Classify what a tool call reads or writes, from the tool's registry metadata."""
+    tool = registry.get(name)
+    if tool is None:
+        return ("exclusive", None)
+    try:
+        read_only = tool.is_read_only(args)
+        paths = {os.path.realpath(p) for p in tool.paths(args)} if tool.paths else set[str]()
+    except KeyError, TypeError, AttributeError:
+        return ("exclusive", None)  # Malformed arguments, which execute reports
+    if len(paths) == 1:
+        return ("read" if read_only else "write", paths.pop())
+    if read_only:
+        return ("read_all", None)
+    return ("exclusive", None)
+
+
+def conflicts(a: Access, b: Access) -> bool:
+    """Whether two tool calls must not overlap."""
+    if "exclusive" in (a[0], b[0]):
+        return True
+    if "write" not in (a[0], b[0]):
+        return False  # Readers never conflict with each other
+    if "read_all" in (a[0], b[0]):
+        return True
+    return a[1] == b[1]
+
+
+OutputSink = Callable[[str], None]
+
+
+def run_tool(
+    name: str,
+    args: dict[str, Any],
+    shell: ShellSession | None = None,
+    on_output: OutputSink | None = None,
+) -> str:
+    """Execute a tool, turning exceptions into an error result for the LLM."""
+    try:
+        result = execute(name, args, shell=shell, on_output=on_output)
+    except Exception as e:
+        result = f"Error: {e}"
+    tool = name if registry.get(name) else "unknown"  # Not whatever name the model made up
+    failed = result.startswith(("Error: ", "Unknown tool: "))
+    _tool_calls.labels(tool, "error" if failed else "ok").inc()
+    return result
+
+
+def _run_timed(
+    i: int,
+    timings: list[float] | None,
+    name: str,
+    args: dict[str, Any],
+    shell: ShellSession | None,
+    on_output: OutputSink | None,
+) -> str:
+    if timings is None:
+        return run_tool(name, args, shell, on_output)
+    start = time.perf_counter()
+    try:
+        return run_tool(name, args, shell, on_output)
+    finally:
+        timings[i] = time.perf_counter() - start
+
+
+def _run_after(
+    deps: list[Future[str]],
+    i: int,
+    timings: list[float] | None,
+    name: str,
+    args: dict[str, Any],
+    shell: ShellSession | None,
+    on_output: OutputSink | None,
+) -> str:
+    wait(deps)
+    return _run_timed(i, timings, name, args, shell, on_output)
+
+
+def _repeats(calls: list[tuple[str, dict[str, Any]]], accesses: list[Access]) -> list[int | None]:
+    """
+    For each call, the index of an earlier identical call whose result it can reuse.
+
+    Only read-only, idempotent calls qualify, and only when no call in
+    between conflicts with them.
+    """
+    repeats: list[int | None] = []
+    seen: dict[str, int] = {}
+    for i, (name, args) in enumerate(calls):
+        tool = registry.get(name)
+        repeats.append(None)
+        if tool is None or not tool.idempotent or not tool.is_read_only(args):
+            continue
+        key = json.dumps([name, args], sort_keys=True)
+        j = seen.get(key)
+        if j is not None and not any(conflicts(accesses[i], accesses[k]) for k in range(j + 1, i)):
+            repeats[i] = j
+        else:
+            seen[key] = i
+    return repeats
+
+
+def _start_order(
+    calls: list[tuple[str, dict[str, Any]]], accesses: list[Access], repeats: list[int | None]
+) -> list[int]:
+    """
+    The order to start calls in: the most expensive first (by the tools'
+    typical cost), among the calls whose conflicting earlier calls have all
+    been started. A call can only wait on calls started before it.
+    """
+    waiting = [0] * len(calls)  # Earlier calls that must start first
+    dependents: list[list[int]] = [[] for _ in calls]
+    for i in range(len(calls)):
+        for j in range(i):
+            if repeats[i] == j or conflicts(accesses[i], accesses[j]):
+                waiting[i] += 1
+                dependents[j].append(i)
+
+    def entry(i: int) -> tuple[float, int]:
+        tool = registry.get(calls[i][0])
+        cost = tool.cost if tool is not None and repeats[i] is None else 0.0
+        return (-cost, i)  # Ties keep the original order
+
+    ready = [entry(i) for i in range(len(calls)) if not waiting[i]]
+    heapq.heapify(ready)
+    order: list[int] = []
+    while ready:
+        _, i = heapq.heappop(ready)
+        order.append(i)
+        for k in dependents[i]:
+            waiting[k] -= 1
+            if not waiting[k]:
+                heapq.heappush(ready, entry(k))
+    return order
+
+
+def run_tool_calls(
+    calls: list[tuple[str, dict[str, Any]]],
+    shell: ShellSession | None = None,
+    on_output: OutputSink | None = None,
+    timings: list[float] | None = None,
+) -> list[str]:
+    """
+    Execute tool calls and return their results in the original order.
+
+    Output that tools produce along the way (from bash) is passed to
+    on_output as it arrives. A timings list, if given, is filled with each
+    call's wall time in seconds, not counting waits for other calls.
+
+    Each call waits for the earlier calls it conflicts with, so writes to the
+    same path (and anything not known to be read-only) keep their original
+    order while independent reads overlap. Of the calls free to start, those
+    with the highest typical cost start first. A repeated read (same tool and
+    arguments, nothing written in between) reuses the first one's result.
+    """
+    accesses = [tool_access(name, args) for name, args in calls]
+    repeats = _repeats(calls, accesses)
+    if timings is not None:
+        timings[:] = [0.0] * len(calls)  # Repeated calls take no time
+    workers = min(max_workers(), len(calls))
+    if workers <= 1:
+        results: list[str] = []
+        for i, ((name, args), j) in enumerate(zip(calls, repeats, strict=True)):
+            if j is not None:
+                results.append(results[j])
+            else:
+                results.append(_run_timed(i, timings, name, args, shell, on_output))
+        return results
+
+    # The pool starts calls in the order they are submitted, and a call is
+    # only submitted after the calls it waits on: no deadlock. Long calls go
+    # first, so a slow command doesn't start last and hold up the whole batch.
+    futures: dict[int, Future[str]] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in _start_order(calls, accesses, repeats):
+            if (j := repeats[i]) is not None:
+                futures[i] = futures[j]
+                continue
+            name, args = calls[i]
+            deps = [futures[j] for j in range(i) if conflicts(accesses[i], accesses[j])]
+            futures[i] = pool.submit(_run_after, deps, i, timings, name, args, shell, on_output)
+    return [futures[i].result() for i in range(len(calls))]
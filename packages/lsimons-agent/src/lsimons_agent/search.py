@@ -0,0 +1,263 @@
+"""Regex search over a directory tree for the search tool.
+
+The walk skips .git and whatever git would ignore (node_modules, build
+output, ...): the .gitignore files along the way and, when the root is
+inside a repository, the .gitignore files above it and .git/info/exclude.
+It also skips binary files. Files are read and matched in batches on a
+thread pool while the walk continues, and everything stops once enough
+matches have been found. The pool overlaps the file reads; the regex
+matching holds the GIL, so it only runs in parallel on a free-threaded
+build.
+"""
+
+import fnmatch
+import itertools
+import os
+import re
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
+
+from lsimons_agent.files import BINARY_SAMPLE, is_binary
+
+MAX_RESULTS = 100  # Default cap on matches returned
+MAX_LINE = 200  # Matched lines are cut to this many characters
+MAX_FILE_SIZE = 8 * 1024 * 1024  # Larger files are skipped
+BATCH = 32  # Files per task
+
+
+class Match(NamedTuple):
+    path: str
+    line: int  # 1-based
+    text: str
+
+
+class _Rule(NamedTuple):
+    regex: re.Pattern[str]
+    negate: bool
+    dir_only: bool
+    anchored: bool  # Matched against the path relative to the .gitignore, not the name
+
+
+def _translate(pattern: str) -> str:
+    """Regex for a gitignore glob ("**" spans directories, "*" and "?" don't)."""
+    out: list[str] = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 1)) > i:
+            out.append(fnmatch.translate(pattern[i : end + 1])[4:-3])  # Just the class
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def _parse_gitignore(path: str) -> list[_Rule]:
+    rules: list[_Rule] = []
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        line = line.removeprefix("!").removeprefix("\\")
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.removeprefix("/")
+        if line:
+            regex = re.compile(_translate(line) + r"\Z")
+            rules.append(_Rule(regex, negate, dir_only, anchored))
+    return rules
+
+
+class _Ignore:
+    """The gitignore rules that apply in one directory."""
+
+    def __init__(self, layers: list[tuple[str, str, list[_Rule]]]):
+        # (directory, prefix, rules), outermost first. A path's location
+        # relative to the rules' file is prefix + its path under directory;
+        # the prefix is only set for rules from above the walk's root.
+        self.layers = layers
+
+    def child(self, directory: str) -> _Ignore:
+        rules = _parse_gitignore(os.path.join(directory, ".gitignore"))
+        return _Ignore([*self.layers, (directory, "", rules)]) if rules else self
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        name = os.path.basename(path)
+        result = False
+        for directory, prefix, rules in self.layers:
+            relative = prefix + path[len(directory) + 1 :]  # path is always under directory
+            for rule in rules:
+                if rule.dir_only and not is_dir:
+                    continue
+                if rule.regex.match(relative if rule.anchored else name):
+                    result = not rule.negate
+        return result
+
+
+def _root_ignore(root: str) -> _Ignore:
+    """
+    The rules in effect at root, which inside a git repository includes its
+    info/exclude file and the .gitignore files from its top down to root.
+    """
+    top = os.path.abspath(root)
+    while not os.path.exists(os.path.join(top, ".git")):
+        parent = os.path.dirname(top)
+        if parent == top:
+            return _Ignore([]).child(root)  # Not in a repository
+        top = parent
+
+    layers: list[tuple[str, str, list[_Rule]]] = []
+    below = os.path.relpath(os.path.abspath(root), top)
+    exclude = _parse_gitignore(os.path.join(top, ".git", "info", "exclude"))
+    if below == ".":
+        layers.append((root, "", exclude))
+    else:
+        layers.append((root, below + "/", exclude))
+        parts = below.split(os.sep)
+        for depth in range(len(parts)):  # The directories above root, top first
+            above = os.path.join(top, *parts[:depth])
+            rules = _parse_gitignore(os.path.join(above, ".gitignore"))
+            layers.append((root, "/".join(parts[depth:]) + "/", rules))
+    return _Ignore([layer for layer in layers if layer[2]]).child(root)
+
+
+def walk(root: str) -> Iterator[str]:
+    """Files under root that git wouldn't ignore, skipping .git, in a stable order."""
+    if os.path.isfile(root):
+        yield root
+        return
+    stack = [(root, _root_ignore(root))]
+    while stack:
+        directory, ignore = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs: list[tuple[str, _Ignore]] = []
+        for entry in entries:
+            if entry.name == ".git":
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = entry.is_file(follow_symlinks=False)
+            except OSError:
+                continue
+            if ignore.ignored(entry.path, is_dir):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, ignore.child(entry.path)))
+            elif is_file:
+                yield entry.path
+        stack += reversed(subdirs)  # Files first, then subdirectories in name order
+
+
+def _search_file(path: str, regex: re.Pattern[str], limit: int) -> list[Match]:
+    """Up to limit matching lines of one file (none for binary or huge files)."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size > MAX_FILE_SIZE:
+                return []
+            data = f.read()
+    except OSError:
+        return []
+    if is_binary(data[:BINARY_SAMPLE]):
+        return []
+    text = data.decode(errors="replace")
+    matches: list[Match] = []
+    line, counted = 1, 0  # line is the number of the line that holds text[counted]
+    reported = -1  # End of the last line reported: one match per line
+    for m in regex.finditer(text):
+        if m.start() <= reported:
+            continue
+        line += text.count("\n", counted, m.start())
+        counted = m.start()
+        start = text.rfind("\n", 0, m.start()) + 1
+        end = text.find("\n", m.start())
+        reported = end if end >= 0 else len(text)
+        matches.append(Match(path, line, text[start:reported][:MAX_LINE]))
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def _search_batch(paths: list[str], regex: re.Pattern[str], limit: int) -> list[Match]:
+    matches: list[Match] = []
+    for path in paths:
+        matches += _search_file(path, regex, limit - len(matches))
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def find(
+    pattern: str,
+    root: str = ".",
+    glob: str | None = None,
+    ignore_case: bool = False,
+    max_results: int = MAX_RESULTS,
+    workers: int | None = None,
+    keep: Callable[[str], bool] | None = None,
+) -> tuple[list[Match], bool]:
+    """
+    Matches of a regex under root, in walk order; returns (matches, truncated).
+
+    glob filters file names (e.g. "*.py"). At most max_results matches are
+    returned, and the search stops early once that many are found. keep,
+    if given, picks the files worth reading (see trigram.candidates).
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    files = (p for p in walk(root) if glob is None or fnmatch.fnmatch(os.path.basename(p), glob))
+    if keep is not None:
+        files = filter(keep, files)
+    matches: list[Match] = []
+    pending: list[Future[list[Match]]] = []
+    limit = max_results + 1  # One more than needed tells whether there were more
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        exhausted = False
+        while not exhausted or pending:
+            # Keep a few batches in flight per worker
+            while not exhausted and len(pending) < workers * 2:
+                batch = list(itertools.islice(files, BATCH))
+                exhausted = len(batch) < BATCH
+                if batch:
+                    pending.append(pool.submit(_search_batch, batch, regex, limit))
+            if not pending:
+                break
+            matches += pending.pop(0).result()  # In order, so output is stable
+            if len(matches) >= limit:
+                for future in pending:
+                    future.cancel()
+                break
+    return matches[:max_results], len(matches) > max_results
+
+
+def format_matches(matches: list[Match], truncated: bool) -> str:
+    """Tool output: one "path:line:text" per match."""
+    if not matches:
+        return "No matches found"
+    lines = [f"{m.path.removeprefix('./')}:{m.line}:{m.text}" for m in matches]
+    if truncated:
+        lines.append(f"[Stopped after {len(matches)} matches; narrow the search to see more]")
+    return "\n".join(lines)
@@ -0,0 +1,272 @@
+"""Long-lived bash session for the bash tool.
+
+Commands run one at a time in a single bash process, so the working
+directory, environment variables and activated virtualenvs carry over from
+one command to the next. Each command is followed by a sentinel line that
+marks the end of its output and carries its exit code.
+
+Output is passed on as it arrives. Only the start and the end of long
+output are kept in memory; the whole of it is written to a spill file.
+"""
+
+import codecs
+import contextlib
+import os
+import select
+import shlex
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import BinaryIO
+
+HEAD_BYTES = 8 * 1024  # Output kept from the start of a long command output
+TAIL_BYTES = 24 * 1024  # ... and from its end
+
+
+class CommandOutput:
+    """
+    The output of one command, collected as it arrives.
+
+    Each chunk is passed to on_output, decoded. Output up to HEAD_BYTES +
+    TAIL_BYTES is kept whole. Beyond that only its first HEAD_BYTES and last
+    TAIL_BYTES are kept, and all of it goes to a file in spill_dir.
+    """
+
+    def __init__(
+        self, on_output: Callable[[str], None] | None = None, spill_dir: str | None = None
+    ):
+        self.on_output = on_output
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+        self.spill_path: str | None = None
+        self.size = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spill: BinaryIO | None = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self.on_output is not None and (text := self._decoder.decode(data)):
+            self.on_output(text)
+        if self._spill is None and self.size > HEAD_BYTES + TAIL_BYTES:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            fd, self.spill_path = tempfile.mkstemp(
+                prefix="bash-", suffix=".log", dir=self.spill_dir
+            )
+            self._spill = os.fdopen(fd, "wb")
+            self._spill.write(self._head + self._tail)  # Everything so far
+        if self._spill is not None:
+            self._spill.write(data)
+        room = HEAD_BYTES - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        self._tail += data
+        if len(self._tail) > 2 * TAIL_BYTES:  # Trimmed now and then, not on every write
+            del self._tail[:-TAIL_BYTES]
+
+    def text(self) -> str:
+        """The output, or its start and end with a note that names the spill file."""
+        if self.on_output is not None and (rest := self._decoder.decode(b"", final=True)):
+            self.on_output(rest)
+        if self._spill is None:
+            return (self._head + self._tail).decode(errors="replace")
+        self._spill.close()
+        # Cut at line boundaries where there are any
+        head = self._head[: self._head.rfind(b"\n") + 1] or self._head
+        tail = self._tail[-TAIL_BYTES:]
+        tail = tail[tail.find(b"\n") + 1 :] or tail
+        omitted = self.size - len(head) - len(tail)
+        note = (
+            f"[... {omitted:,} bytes omitted. The full output ({self.size:,} bytes) is in "
+            f"{self.spill_path}; page through it with read_file ...]\n"
+        )
+        if not head.endswith(b"\n"):
+            note = "\n" + note
+        return head.decode(errors="replace") + note + tail.decode(errors="replace")
+
+
+class ShellSession:
+    """A bash process that runs commands one at a time."""
+
+    def __init__(self, cwd: str | None = None):
+        self._start_cwd = cwd or os.getcwd()
+        self.cwd = self._start_cwd  # Updated after every command
+        self._proc: subprocess.Popen[bytes] | None = None
+        self._sentinel = f"__lsimons_agent_{uuid.uuid4().hex}__".encode()
+        self._lock = threading.Lock()
+        # Spill files of long outputs; removed by close()
+        self.spill_dir = os.path.join(tempfile.gettempdir(), f"lsimons-agent-{uuid.uuid4().hex}")
+
+    def _start(self) -> subprocess.Popen[bytes]:
+        """Start bash if it is not running yet."""
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["bash", "--noprofile", "--norc"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=self.cwd if os.path.isdir(self.cwd) else None,
+                start_new_session=True,  # Own process group, so timeouts can kill it all
+            )
+        return self._proc
+
+    def run(
+        self, command: str, timeout: float = 30, output: CommandOutput | None = None
+    ) -> tuple[str, int | None]:
+        """
+        Run a command and return (output, exit_code).
+
+        The output is collected in output (see CommandOutput), which may
+        stream it elsewhere as it arrives. exit_code is None when the command
+        timed out; the shell and everything it started are then killed and a
+        fresh shell is used for the next command.
+        """
+        with self._lock:
+            return self._run(command, timeout, output or CommandOutput(spill_dir=self.spill_dir))
+
+    def try_run(
+        self, command: str, timeout: float = 30, output: CommandOutput | None = None
+    ) -> tuple[str, int | None] | None:
+        """Like run(), but return None instead of waiting when the session is busy."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._run(command, timeout, output or CommandOutput(spill_dir=self.spill_dir))
+        finally:
+            self._lock.release()
+
+    def _run(self, command: str, timeout: float, output: CommandOutput) -> tuple[str, int | None]:
+        proc = self._start()
+        assert proc.stdin is not None and proc.stdout is not None
+
+        # eval keeps syntax errors in the command from breaking the framing,
+        # and </dev/null keeps the command from reading the script that follows.
+        script = (
+            f"eval {shlex.quote(command)} </dev/null 2>&1\n"
+            f'printf \'\\n%s %d %s\\n\' {self._sentinel.decode()} "$?" "$PWD"\n'
+        )
+        try:
+            proc.stdin.write(script.encode())
+            proc.stdin.flush()
+        except BrokenPipeError:
+            self._kill()
+            return self._run(command, timeout, output)
+
+        fd = proc.stdout.fileno()
+        marker = b"\n" + self._sentinel + b" "
+        pending = bytearray()  # Not passed on yet, as it may hold the start of the marker
+        deadline = time.monotonic() + timeout
+        while True:
+            index = pending.find(marker)
+            if index != -1 and pending.endswith(b"\n"):
+                status, _, cwd = bytes(pending[index + len(marker) : -1]).partition(b" ")
+                self.cwd = cwd.decode(errors="replace")
+                output.write(bytes(pending[:index]))
+                return output.text(), int(status)
+            if index == -1:
+                # Pass everything on except what may be the start of the marker
+                cut = pending.rfind(b"\n", max(0, len(pending) - len(marker) + 1))
+                if cut == -1 or not marker.startswith(pending[cut:]):
+                    cut = len(pending)
+                output.write(bytes(pending[:cut]))
+                del pending[:cut]
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._kill()
+                output.write(bytes(pending))
+                return output.text(), None
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            data = os.read(fd, 65536)
+            if not data:
+                # The command exited the shell (e.g. `exit 3`)
+                code = proc.wait()
+                self._kill()
+                output.write(bytes(pending))
+                return output.text(), code
+            pending.extend(data)
+
+    def _kill(self) -> None:
+        """Kill the shell and its whole process group."""
+        if self._proc is not None:
+            with contextlib.suppress(ProcessLookupError, PermissionError):
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            self._proc.wait()
+            if self._proc.stdin is not None:
+                with contextlib.suppress(OSError):
+                    self._proc.stdin.close()
+            if self._proc.stdout is not None:
+                self._proc.stdout.close()
+            self._proc = None
+
+    def close(self) -> None:
+        """
+        Stop the shell and remove its spill files.
+
+        If used again, a fresh shell starts in the original directory.
+        """
+        with self._lock:
+            self._kill()
+            self.cwd = self._start_cwd
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+
+def run_once(
+    command: str, timeout: float = 30, cwd: str | None = None, output: CommandOutput | None = None
+) -> tuple[str, int | None]:
+    """
+    Run a command in a one-off shell and return (output, exit_code).
+
+    exit_code is None when the command timed out; its process group is then killed.
+    """
+    output = output or CommandOutput()
+    with subprocess.Popen(
+        command,
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=cwd,
+        start_new_session=True,
+    ) as proc:
+        assert proc.stdout is not None
+        fd = proc.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with contextlib.suppress(ProcessLookupError, PermissionError):
+                    os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+                return output.text(), None
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            output.write(data)
+    return output.text(), proc.returncode
+
+
+_default_session: ShellSession | None = None
+_default_lock = threading.Lock()
+
+
+def default_session() -> ShellSession:
+    """Session used by callers that don't manage their own."""
+    global _default_session
+    with _default_lock:
+        if _default_session is None:
+            _default_session = ShellSession()
+        return _default_session
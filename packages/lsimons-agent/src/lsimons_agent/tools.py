@@ -1,124 +1,311 @@
 """Tools for the coding agent."""
 
-import subprocess
+import contextlib
+import os
+from collections.abc import Callable
 from pathlib import Path
 from typing import Any
 
-TOOLS: list[dict[str, Any]] = [
-    {
-        "type": "function",
-        "function": {
-            "name": "read_file",
-            "description": "Read the contents of a file",
-            "parameters": {
-                "type": "object",
-                "properties": {"path": {"type": "string", "description": "File path to read"}},
-                "required": ["path"],
+from lsimons_agent import metrics, trigram
+from lsimons_agent.filecache import file_cache
+from lsimons_agent.files import MAX_BYTES, read_text
+from lsimons_agent.registry import Registry
+from lsimons_agent.search import MAX_RESULTS, find, format_matches
+from lsimons_agent.shell import CommandOutput, ShellSession, default_session, run_once
+
+TIMEOUT = 30  # Default seconds before a bash command is killed
+MAX_TIMEOUT = 600
+
+registry = Registry()
+
+_tool_seconds = metrics.histogram(
+    "lsimons_agent_tool_seconds", "Wall time of tool calls, by tool", ["tool"]
+)
+
+
+def _observe(name: str, seconds: float, raised: bool) -> None:
+    _tool_seconds.labels(name).observe(seconds)
+
+
+registry.timing_hooks.append(_observe)
+
+
+@registry.tool(
+    description="Read the contents of a file. Output is capped at max_bytes; "
+    "read large files in parts with start_line and end_line",
+    parameters={
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "File path to read"},
+            "start_line": {
+                "type": "integer",
+                "description": "First line to read (1-based, default 1)",
+            },
+            "end_line": {
+                "type": "integer",
+                "description": "Last line to read, inclusive (default: to the end)",
+            },
+            "max_bytes": {
+                "type": "integer",
+                "description": f"Most bytes to return (default {MAX_BYTES})",
             },
         },
+        "required": ["path"],
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "write_file",
-            "description": "Write content to a file (creates or overwrites)",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path to write"},
-                    "content": {"type": "string", "description": "Content to write"},
+    read_only=True,
+    idempotent=True,
+    paths=lambda args: {args.get("path", "")},
+)
+def read_file(
+    path: str,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    max_bytes: int | None = None,
+) -> str:
+    """Read and return file contents, or a range of lines; binary files are only described."""
+    return read_text(path, start_line, end_line, max_bytes)
+
+
+@registry.tool(
+    description="Write content to a file (creates or overwrites)",
+    parameters={
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "File path to write"},
+            "content": {"type": "string", "description": "Content to write"},
+        },
+        "required": ["path", "content"],
+    },
+    idempotent=True,
+    paths=lambda args: {args.get("path", "")},
+)
+def write_file(path: str, content: str) -> str:
+    """Write content to file. Creates parent dirs if needed."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    file_cache.write(path, content)
+    return "OK"
+
+
+@registry.tool(
+    description="Edit a file by replacing a specific string with another. "
+    "For several changes to the file, pass them all as edits",
+    parameters={
+        "type": "object",
+        "properties": {
+            "path": {"type": "string", "description": "File path to edit"},
+            "old_string": {
+                "type": "string",
+                "description": "Exact string to find and replace",
+            },
+            "new_string": {"type": "string", "description": "String to replace with"},
+            "edits": {
+                "type": "array",
+                "description": "Replacements to apply in order, instead of old_string/new_string",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "old_string": {"type": "string"},
+                        "new_string": {"type": "string"},
+                    },
+                    "required": ["old_string", "new_string"],
                 },
-                "required": ["path", "content"],
             },
         },
+        "required": ["path"],
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "edit_file",
-            "description": "Edit a file by replacing a specific string with another",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "path": {"type": "string", "description": "File path to edit"},
-                    "old_string": {
-                        "type": "string",
-                        "description": "Exact string to find and replace",
+    paths=lambda args: {args.get("path", "")},
+)
+def edit_file(
+    path: str,
+    old_string: str | None = None,
+    new_string: str | None = None,
+    edits: list[dict[str, str]] | None = None,
+) -> str:
+    """Replace old_string with new_string in file, or apply several edits at once."""
+    if edits is None:
+        if old_string is None or new_string is None:
+            raise ValueError("Pass old_string and new_string, or edits")
+        edits = [{"old_string": old_string, "new_string": new_string}]
+    multi_edit([{**edit, "path": path} for edit in edits])
+    return "OK"
+
+
+@registry.tool(
+    description="Apply string replacements across one or more files at once. "
+    "All are checked first: if any fails, no file is changed",
+    parameters={
+        "type": "object",
+        "properties": {
+            "edits": {
+                "type": "array",
+                "description": "Replacements, applied in order",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string"},
+                        "old_string": {
+                            "type": "string",
+                            "description": "Exact string to find; must be unique",
+                        },
+                        "new_string": {"type": "string"},
                     },
-                    "new_string": {"type": "string", "description": "String to replace with"},
+                    "required": ["path", "old_string", "new_string"],
                 },
-                "required": ["path", "old_string", "new_string"],
             },
         },
+        "required": ["edits"],
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "bash",
-            "description": "Execute a shell command",
-            "parameters": {
-                "type": "object",
-                "properties": {"command": {"type": "string", "description": "Command to execute"}},
-                "required": ["command"],
+    paths=lambda args: {edit["path"] for edit in args["edits"]},
+)
+def multi_edit(edits: list[dict[str, str]]) -> str:
+    """
+    Apply replacements to one or more files, all or nothing.
+
+    Each old_string must occur exactly once in its file, as changed by the
+    edits before it. Every edit is checked before anything is written, and
+    each file is then written once, atomically.
+    """
+    # By real path, so that edits naming one file differently all apply to it
+    originals: dict[str, str] = {}
+    contents: dict[str, str] = {}
+    errors: list[str] = []
+    for i, edit in enumerate(edits, 1):
+        path = edit["path"]
+        real = os.path.realpath(path)
+        if real not in contents:
+            contents[real] = originals[real] = file_cache.read(real)
+        count = contents[real].count(edit["old_string"])
+        if count == 1:
+            contents[real] = contents[real].replace(edit["old_string"], edit["new_string"])
+            continue
+        if count == 0:
+            error = f"String not found in {path}"
+        else:
+            error = f"String appears {count} times in {path}, must be unique"
+        errors.append(error if len(edits) == 1 else f"edit {i}: {error}")
+    if errors:
+        raise ValueError("\n".join(errors if len(edits) == 1 else ["No changes made:", *errors]))
+
+    written: list[str] = []
+    try:
+        for path, content in contents.items():
+            if content != originals[path]:
+                file_cache.write(path, content)
+                written.append(path)
+    except OSError:
+        for path in written:  # Best effort: put back what was already written
+            with contextlib.suppress(OSError):
+                file_cache.write(path, originals[path])
+        raise
+    return f"OK: {len(edits)} edits in {len(contents)} files"
+
+
+@registry.tool(
+    description="Search file contents for a regex, skipping .git, gitignored and "
+    "binary files. Returns path:line:text for each matching line. Prefer this over "
+    "grep in bash",
+    parameters={
+        "type": "object",
+        "properties": {
+            "pattern": {"type": "string", "description": "Python regular expression"},
+            "path": {
+                "type": "string",
+                "description": "Directory or file to search (default: current directory)",
+            },
+            "glob": {
+                "type": "string",
+                "description": "Only search files whose name matches, e.g. *.py",
+            },
+            "ignore_case": {"type": "boolean", "description": "Case-insensitive match"},
+            "max_results": {
+                "type": "integer",
+                "description": f"Most matches to return (default {MAX_RESULTS})",
             },
         },
+        "required": ["pattern"],
     },
-]
+    read_only=True,
+    idempotent=True,
+    cost=0.2,
+)
+def search(
+    pattern: str,
+    path: str = ".",
+    glob: str | None = None,
+    ignore_case: bool = False,
+    max_results: int | None = None,
+) -> str:
+    """Search files under path for a regex and return the matching lines."""
+    keep = trigram.candidates(path, pattern, ignore_case)
+    limit = max_results or MAX_RESULTS
+    matches, truncated = find(pattern, path, glob, ignore_case, limit, keep=keep)
+    return format_matches(matches, truncated)
 
 
-def read_file(path: str) -> str:
-    """Read and return file contents."""
-    return Path(path).read_text()
+@registry.tool(
+    description="Execute a shell command. Long output is cut to its start and "
+    "end; the full output is saved to a file named in the result",
+    parameters={
+        "type": "object",
+        "properties": {
+            "command": {"type": "string", "description": "Command to execute"},
+            "read_only": {
+                "type": "boolean",
+                "description": "True if the command only reads state (ls, cat, grep, "
+                "git status, ...), so it can run in parallel with other reads",
+            },
+            "timeout": {
+                "type": "integer",
+                "description": f"Seconds before the command and everything it started "
+                f"are killed (default {TIMEOUT}, at most {MAX_TIMEOUT})",
+            },
+        },
+        "required": ["command"],
+    },
+    read_only=lambda args: args.get("read_only") is True,
+    cost=1.0,
+)
+def bash(
+    command: str,
+    read_only: bool = False,
+    timeout: float | None = None,
+    shell: ShellSession | None = None,
+    on_output: Callable[[str], None] | None = None,
+) -> str:
+    """Execute shell command and return combined stdout+stderr.
 
+    Commands run in a persistent shell (the given session, or a process-wide
+    default), so cwd and environment changes carry over between calls. A
+    read-only command that finds the session busy runs in a one-off shell in
+    the session's working directory instead of waiting. Output is passed to
+    on_output as it arrives; the result keeps the start and end of long
+    output and names the file that holds all of it.
+    """
+    session = shell or default_session()
+    timeout = min(timeout or TIMEOUT, MAX_TIMEOUT)
+    output = CommandOutput(on_output, session.spill_dir)
+    result = session.try_run(command, timeout, output) if read_only else None
+    if result is None and read_only:
+        result = run_once(command, timeout, cwd=session.cwd, output=output)
+    if result is None:
+        result = session.run(command, timeout, output)
 
-def write_file(path: str, content: str) -> str:
-    """Write content to file. Creates parent dirs if needed."""
-    p = Path(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_text(content)
-    return "OK"
+    text, exit_code = result
+    if exit_code is None:
+        text += f"\n[timed out after {timeout:g}s]"
+    elif exit_code != 0:
+        text += f"\n[exit code: {exit_code}]"
+    return text.strip() or "(no output)"
 
 
-def edit_file(path: str, old_string: str, new_string: str) -> str:
-    """Replace old_string with new_string in file."""
-    p = Path(path)
-    content = p.read_text()
-    count = content.count(old_string)
-    if count == 0:
-        raise ValueError(f"String not found in {path}")
-    if count > 1:
-        raise ValueError(f"String appears {count} times in {path}, must be unique")
-    p.write_text(content.replace(old_string, new_string))
-    return "OK"
+def execute(
+    name: str,
+    args: dict[str, Any],
+    shell: ShellSession | None = None,
+    on_output: Callable[[str], None] | None = None,
+) -> str:
+    """Execute a tool by name and return the result; bash streams its output to on_output."""
+    return registry.execute(name, args, shell=shell, on_output=on_output)
 
 
-def bash(command: str) -> str:
-    """Execute shell command and return combined stdout+stderr."""
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        output = result.stdout + result.stderr
-        if result.returncode != 0:
-            output += f"\n[exit code: {result.returncode}]"
-        return output.strip() or "(no output)"
-    except subprocess.TimeoutExpired:
-        return "[timed out after 30s]"
-
-
-def execute(name: str, args: dict[str, str]) -> str:
-    """Execute a tool by name and return the result."""
-    if name == "read_file":
-        return read_file(**args)
-    elif name == "write_file":
-        return write_file(**args)
-    elif name == "edit_file":
-        return edit_file(**args)
-    elif name == "bash":
-        return bash(**args)
-    else:
-        return f"Unknown tool: {name}"
+TOOLS: list[dict[str, Any]] = registry.schemas()
@@ -0,0 +1,502 @@
+"""On-disk trigram index that narrows the search tool's candidate files.
+
+Each project under ~/git/<org>/<repo> (the directories the web server opens
+terminals in) gets an index in AGENT_INDEX_DIR (default
+~/.cache/lsimons-agent/trigrams). For every file the index records its
+(mtime_ns, size) and which byte trigrams, ASCII-lowercased, occur in it. A
+search extracts the literal runs a regex requires, looks their trigrams up
+and only reads files that contain all of them. Files the index doesn't know
+about, or whose mtime or size changed since they were indexed, are always
+searched, so results never depend on how fresh the index is. As in git, a
+file whose mtime is not before the time its segment was written is treated
+as changed too: it may have changed again within the same timestamp tick,
+after it was read, without its mtime or size showing it.
+
+An index is a base segment plus a delta segment holding the files that
+changed since the base was built. Updates walk the project, re-index the
+changed files into a new delta and rebuild the base once the delta holds
+more than an eighth of the files. Segments are written to a temporary file
+and renamed into place, and are read through mmap, so any number of agent
+and server processes share one copy in the page cache. A lock file keeps
+two processes from building the same index at once. Updates run in a
+background thread when a search sees stale files. AGENT_SEARCH_INDEX=0
+turns the index off.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Sequence
+from typing import NamedTuple
+
+from lsimons_agent import metrics
+from lsimons_agent.files import BINARY_SAMPLE, is_binary
+from lsimons_agent.search import MAX_FILE_SIZE, walk
+
+PROJECTS_DIR = os.path.join(os.path.expanduser("~"), "git")
+INDEX_DIR = os.environ.get("AGENT_INDEX_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "lsimons-agent", "trigrams"
+)
+REFRESH_INTERVAL = 30.0  # Seconds between background updates of one project
+MIN_DELTA = 1000  # The delta may always hold this many files before a rebuild
+
+_update_seconds = metrics.histogram(
+    "lsimons_agent_search_index_update_seconds",
+    "Background search index updates: walking a project and indexing what changed",
+)
+
+_MAGIC = b"LSTRIG01"
+_HEADER = struct.Struct("=8sQQQ")  # magic, trigrams, postings, file table bytes
+# With ignore_case, re also matches these letters to non-ASCII ones (ı, İ, ſ, K)
+_FOLDS_OUTSIDE_ASCII = frozenset("iksIKS")
+
+
+def enabled() -> bool:
+    return os.environ.get("AGENT_SEARCH_INDEX", "1") != "0"
+
+
+def project_root(path: str) -> str | None:
+    """The ~/git/<org>/<repo> directory that contains path, if any."""
+    base = os.path.realpath(PROJECTS_DIR)
+    relative = os.path.relpath(os.path.realpath(path), base)
+    parts = relative.split(os.sep)
+    if parts[0] == os.pardir or len(parts) < 2:
+        return None
+    return os.path.join(base, parts[0], parts[1])
+
+
+class _Paths(NamedTuple):
+    base: str
+    delta: str
+    lock: str
+
+
+def _index_paths(project: str) -> _Paths:
+    name = hashlib.sha256(project.encode()).hexdigest()[:16]
+    prefix = os.path.join(INDEX_DIR, name)
+    return _Paths(prefix + ".base", prefix + ".delta", prefix + ".lock")
+
+
+# --- Trigrams ------------------------------------------------------------
+
+
+def trigrams(data: bytes) -> set[int]:
+    """Trigrams of the ASCII-lowercased lines of data, as 24-bit ints."""
+    data = b"\n".join(set(data.lower().split(b"\n")))  # Repeated lines only count once
+    return {a << 16 | b << 8 | c for a, b, c in set(zip(data, data[1:], data[2:], strict=False))}
+
+
+def _class_end(pattern: str, i: int) -> int:
+    """Index just past the character class that starts at pattern[i], or -1."""
+    i += 2 if pattern.startswith("[^", i) else 1
+    i += 1  # A "]" right after "[" or "[^" is part of the class
+    while i < len(pattern):
+        if pattern[i] == "\\":
+            i += 1
+        elif pattern[i] == "]":
+            return i + 1
+        i += 1
+    return -1
+
+
+def _group_end(pattern: str, i: int) -> int:
+    """Index just past the group that starts at pattern[i], or -1."""
+    depth = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            i = _class_end(pattern, i)
+            if i < 0:
+                return -1
+            continue
+        depth += 1 if c == "(" else -1 if c == ")" else 0
+        i += 1
+        if depth == 0:
+            return i
+    return -1
+
+
+_QUANTIFIER = re.compile(r"\{(\d*)(?:,\d*)?\}")
+
+
+def _literal_runs(branch: str, ignore_case: bool) -> list[str] | None:
+    """
+    Literal strings every match of one alternative must contain.
+
+    Groups, classes, anchors and character escapes end a run; a character
+    made optional by *, ? or {0,...} is dropped. Returns None for syntax
+    this scanner doesn't follow (numeric and named escapes).
+    """
+    runs: list[str] = []
+    run: list[str] = []
+
+    def end() -> None:
+        runs.append("".join(run))
+        run.clear()
+
+    i = 0
+    while i < len(branch):
+        c = branch[i]
+        if c == "\\":
+            nxt = branch[i + 1 : i + 2]
+            if nxt.isalnum():
+                if nxt in "xuUN0123456789":
+                    return None
+                end()
+            else:
+                run.append(nxt)
+            i += 2
+        elif c in "([":
+            i = _group_end(branch, i) if c == "(" else _class_end(branch, i)
+            if i < 0:
+                return None
+            end()
+        elif m := _QUANTIFIER.match(branch, i):
+            if run and int(m.group(1) or 0) == 0:
+                run.pop()
+            end()
+            i = m.end()
+        else:
+            if c in "*?" and run:
+                run.pop()  # Optional
+            if c in "*?+.^$)\n\ufffd" or (
+                ignore_case and (c in _FOLDS_OUTSIDE_ASCII or c > "\x7f")
+            ):
+                end()
+            else:
+                run.append(c)
+            i += 1
+    end()
+    return runs
+
+
+def _split_branches(pattern: str) -> list[str]:
+    """The pattern's top-level alternatives."""
+    branches: list[str] = []
+    start = i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c in "([":
+            end = _group_end(pattern, i) if c == "(" else _class_end(pattern, i)
+            i = end if end > 0 else len(pattern)
+            continue
+        if c == "|":
+            branches.append(pattern[start:i])
+            start = i + 1
+        i += 2 if c == "\\" else 1
+    branches.append(pattern[start:])
+    return branches
+
+
+def query(pattern: str, ignore_case: bool = False) -> list[set[int]] | None:
+    """
+    Trigrams a match of pattern implies, as alternatives of required sets.
+
+    A file can only match if it contains every trigram of at least one of
+    the returned sets. None means the pattern can't be narrowed that way.
+    """
+    try:
+        flags = re.compile(pattern).flags
+    except re.error:
+        return None
+    if flags & re.VERBOSE:
+        return None
+    ignore_case = ignore_case or bool(flags & re.IGNORECASE)
+    alternatives: list[set[int]] = []
+    for branch in _split_branches(pattern):
+        runs = _literal_runs(branch, ignore_case)
+        if runs is None:
+            return None
+        required: set[int] = set()
+        for run in runs:
+            try:
+                data = run.encode().lower()
+            except UnicodeEncodeError:
+                return None  # A lone surrogate
+            required |= {
+                a << 16 | b << 8 | c for a, b, c in zip(data, data[1:], data[2:], strict=False)
+            }
+        if not required:
+            return None  # This alternative could match anything
+        alternatives.append(required)
+    return alternatives
+
+
+# --- Segments ------------------------------------------------------------
+
+
+class _Segment:
+    """One memory-mapped index file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.version = (st.st_ino, st.st_mtime_ns)
+        self.written = st.st_mtime_ns
+        magic, n_keys, n_ids, n_table = _HEADER.unpack_from(self.mm)
+        if magic != _MAGIC:
+            raise ValueError(f"not a trigram index: {path}")
+        view = memoryview(self.mm)
+        offset = _HEADER.size
+        self.keys = view[offset : offset + 4 * n_keys].cast("I")
+        offset += _padded(4 * n_keys)
+        self.starts = view[offset : offset + 8 * (n_keys + 1)].cast("Q")
+        offset += 8 * (n_keys + 1)
+        self.ids = view[offset : offset + 4 * n_ids].cast("I")
+        offset += _padded(4 * n_ids)
+        table: list[tuple[str, int, int]] = json.loads(bytes(view[offset : offset + n_table]))
+        self.files = {path: i for i, (path, _, _) in enumerate(table)}
+        self.stats = [(mtime, size) for _, mtime, size in table]
+
+    def unchanged(self, i: int, st: os.stat_result) -> bool:
+        """Whether file i is known to be as it was indexed; False for racily clean files."""
+        return (st.st_mtime_ns, st.st_size) == self.stats[i] and st.st_mtime_ns < self.written
+
+    def postings(self, trigram: int) -> Sequence[int]:
+        i = bisect_left(self.keys, trigram)
+        if i == len(self.keys) or self.keys[i] != trigram:
+            return ()
+        return self.ids[self.starts[i] : self.starts[i + 1]]
+
+    def matching(self, alternatives: list[set[int]]) -> set[int]:
+        """Ids of the files that contain all trigrams of some alternative."""
+        found: set[int] = set()
+        for required in alternatives:
+            lists = sorted((self.postings(t) for t in required), key=len)
+            ids = set(lists[0])
+            for postings in lists[1:]:
+                if not ids:
+                    break
+                ids.intersection_update(postings)
+            found |= ids
+        return found
+
+
+def _padded(n: int) -> int:
+    return (n + 7) // 8 * 8
+
+
+def _open(path: str) -> _Segment | None:
+    try:
+        return _Segment(path)
+    except OSError, ValueError:
+        return None
+
+
+def _write(path: str, files: Iterable[tuple[str, str]]) -> int:
+    """Index files ((key, path) pairs) into a new segment at path; returns the file count."""
+    table: list[tuple[str, int, int]] = []
+    postings: defaultdict[int, array[int]] = defaultdict(lambda: array("I"))
+    for key, file in files:
+        try:
+            with open(file, "rb") as f:
+                st = os.fstat(f.fileno())  # Before reading: a later change shows as stale
+                data = f.read() if st.st_size <= MAX_FILE_SIZE else b""
+        except OSError:
+            continue  # Gone: the next walk won't list it either
+        table.append((key, st.st_mtime_ns, st.st_size))
+        if data and not is_binary(data[:BINARY_SAMPLE]):  # Others are never searched
+            for trigram in trigrams(data):
+                postings[trigram].append(len(table) - 1)
+    keys = array("I", sorted(postings))
+    starts = array("Q", [0])
+    ids = array("I")
+    for key in keys:
+        ids.extend(postings.pop(key))
+        starts.append(len(ids))
+    encoded = json.dumps(table, separators=(",", ":")).encode()
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(keys), len(ids), len(encoded)))
+            for part in (keys, starts, ids):
+                f.write(part)
+                f.write(b"\0" * (_padded(f.tell()) - f.tell()))
+            f.write(encoded)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    return len(table)
+
+
+# --- Index ---------------------------------------------------------------
+
+
+class Index:
+    """A project's base and delta segments; the delta's entries take precedence."""
+
+    def __init__(self, project: str, base: _Segment, delta: _Segment | None):
+        self.project = project
+        self.base = base
+        self.delta = delta
+
+    def filter(
+        self, root: str, alternatives: list[set[int]], on_stale: Callable[[], None]
+    ) -> Callable[[str], bool]:
+        """
+        Predicate for the files walk(root) yields: False only for files the
+        index shows to be unchanged and without the required trigrams.
+
+        on_stale is called once if a file is missing from the index or changed.
+        """
+        prefix = os.path.relpath(os.path.realpath(root), self.project)
+        segments = [(s, s.matching(alternatives)) for s in (self.delta, self.base) if s]
+        stale = False
+
+        def keep(path: str) -> bool:
+            nonlocal stale
+            rest = path[len(root) :].lstrip("/")
+            key = os.path.normpath(os.path.join(prefix, rest)) if rest else prefix
+            for segment, hits in segments:
+                i = segment.files.get(key)
+                if i is None:
+                    continue
+                if i in hits:
+                    return True
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    return False
+                if segment.unchanged(i, st):
+                    return False
+                break
+            if not stale:
+                stale = True
+                on_stale()
+            return True
+
+        return keep
+
+
+_indexes: dict[str, Index] = {}
+_last_update: dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def load(project: str) -> Index | None:
+    """The project's index, reopened if another process replaced its files."""
+    paths = _index_paths(project)
+    try:
+        st = os.stat(paths.base)
+    except OSError:
+        return None
+    try:
+        dst = os.stat(paths.delta)
+        delta_version = (dst.st_ino, dst.st_mtime_ns)
+    except OSError:
+        delta_version = None
+    with _lock:
+        index = _indexes.get(project)
+    if (
+        index is not None
+        and index.base.version == (st.st_ino, st.st_mtime_ns)
+        and (index.delta.version if index.delta else None) == delta_version
+    ):
+        return index
+    base = _open(paths.base)
+    if base is None:
+        return None
+    index = Index(project, base, _open(paths.delta) if delta_version else None)
+    with _lock:
+        _indexes[project] = index
+    return index
+
+
+def update(project: str) -> bool:
+    """
+    Bring the project's index up to date; returns whether anything was written.
+
+    Returns False straight away if another thread or process is updating it.
+    """
+    paths = _index_paths(project)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(paths.lock, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        base = _open(paths.base)
+        delta = _open(paths.delta) if base else None
+        files: list[tuple[str, str]] = []
+        changed: list[tuple[str, str]] = []
+        in_delta = 0
+        for path in walk(project):
+            key = path[len(project) + 1 :]
+            files.append((key, path))
+            if base is None:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            i = base.files.get(key)
+            if i is not None and base.unchanged(i, st):
+                continue
+            changed.append((key, path))
+            j = delta.files.get(key) if delta else None
+            if delta and j is not None and delta.unchanged(j, st):
+                in_delta += 1
+        if base is None or len(changed) > max(MIN_DELTA, len(files) // 8):
+            _write(paths.base, files)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(paths.delta)
+            return True
+        if in_delta == len(changed) == (len(delta.files) if delta else 0):
+            return False  # The delta already holds exactly these files
+        if changed:
+            _write(paths.delta, changed)
+        else:
+            os.unlink(paths.delta)
+        return True
+
+
+def update_in_background(project: str) -> None:
+    """Start update(project) in a daemon thread, at most every REFRESH_INTERVAL."""
+    now = time.monotonic()
+    with _lock:
+        if now - _last_update.get(project, -REFRESH_INTERVAL) < REFRESH_INTERVAL:
+            return
+        _last_update[project] = now
+    threading.Thread(target=_update_quietly, args=(project,), daemon=True).start()
+
+
+def _update_quietly(project: str) -> None:
+    with _update_seconds.time(), contextlib.suppress(OSError):
+        update(project)
+
+
+def candidates(root: str, pattern: str, ignore_case: bool = False) -> Callable[[str], bool] | None:
+    """
+    A filter for the files search.find walks under root, or None to search them all.
+
+    Schedules a background update when the index is missing or out of date.
+    """
+    if not enabled():
+        return None
+    project = project_root(root)
+    if project is None:
+        return None
+    index = load(project)
+    if index is None:
+        update_in_background(project)
+        return None
+    alternatives = query(pattern, ignore_case)
+    if alternatives is None:
+        return None
+    return index.filter(root, alternatives, lambda: update_in_background(project))
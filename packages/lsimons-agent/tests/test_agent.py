@@ -1,6 +1,20 @@
 """Tests for agent module."""
 
-from lsimons_agent.agent import SYSTEM_PROMPT, format_args, new_conversation
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from lsimons_agent import agent
+from lsimons_agent.agent import (
+    SYSTEM_PROMPT,
+    aprocess_message,
+    format_args,
+    new_conversation,
+    process_message,
+)
+from lsimons_agent.shell import ShellSession
 
 
 def test_new_conversation():
@@ -42,3 +56,107 @@ def testformat_args_empty():
 def test_system_prompt_content():
     assert "coding assistant" in SYSTEM_PROMPT
     assert "edit_file" in SYSTEM_PROMPT
+
+
+def test_process_message_streams_tool_output(monkeypatch: pytest.MonkeyPatch):
+    call = {"name": "bash", "arguments": json.dumps({"command": "echo one; echo two"})}
+    replies = iter(
+        [
+            {
+                "choices": [
+                    {"message": {"content": "", "tool_calls": [{"id": "1", "function": call}]}}
+                ]
+            },
+            {"choices": [{"message": {"content": "Done"}}]},
+        ]
+    )
+    monkeypatch.setattr(agent, "chat", lambda messages, tools=None, **_: next(replies))  # type: ignore[reportUnknownLambdaType]
+    messages = new_conversation()
+    session = ShellSession()
+    try:
+        events = list(process_message(messages, "run it", shell=session))
+    finally:
+        session.close()
+    types = [t for t, _ in events]
+    assert types[0] == "tool" and types[-2:] == ["text", "done"]
+    assert set(types[1:-2]) == {"tool_output"}
+    assert "".join(data for t, data in events if t == "tool_output") == "one\ntwo\n"
+    assert messages[-2]["content"] == "one\ntwo"
+
+
+def test_aprocess_message_streams_tool_output(monkeypatch: pytest.MonkeyPatch):
+    call = {"name": "bash", "arguments": json.dumps({"command": "echo one; echo two"})}
+    replies = iter(
+        [
+            {
+                "choices": [
+                    {"message": {"content": "", "tool_calls": [{"id": "1", "function": call}]}}
+                ]
+            },
+            {"choices": [{"message": {"content": "Done"}}]},
+        ]
+    )
+
+    async def achat(messages: list[dict[str, Any]], tools: Any = None, **_: Any) -> dict[str, Any]:
+        return next(replies)
+
+    async def main() -> list[tuple[str, Any]]:
+        return [event async for event in aprocess_message(messages, "run it", shell=session)]
+
+    monkeypatch.setattr(agent, "achat", achat)
+    messages = new_conversation()
+    session = ShellSession()
+    try:
+        events = asyncio.run(main())
+    finally:
+        session.close()
+    types = [t for t, _ in events]
+    assert types[0] == "tool" and types[-2:] == ["text", "done"]
+    assert set(types[1:-2]) == {"tool_output"}
+    assert "".join(data for t, data in events if t == "tool_output") == "one\ntwo\n"
+    assert messages[-2]["content"] == "one\ntwo"
+
+
+def test_process_message_timing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "a.txt").write_text("hello\n")
+    call = {"name": "read_file", "arguments": json.dumps({"path": str(tmp_path / "a.txt")})}
+    replies = iter(
+        [
+            {
+                "choices": [
+                    {"message": {"content": "", "tool_calls": [{"id": "1", "function": call}]}}
+                ]
+            },
+            {
+                "choices": [{"message": {"content": "Done"}}],
+                "usage": {"prompt_tokens": 120, "completion_tokens": 3},
+            },
+        ]
+    )
+
+    def chat(messages: list[dict[str, Any]], tools: Any = None, **kwargs: Any) -> dict[str, Any]:
+        kwargs["stats"].update(request_bytes=100, response_bytes=50)
+        return next(replies)
+
+    monkeypatch.setattr(agent, "chat", chat)
+    events = list(process_message(new_conversation(), "read it", timing=True))
+    timings = [data for t, data in events if t == "timing"]
+    assert [t["step"] for t in timings] == ["llm", "tool", "llm", "turn"]
+    assert timings[1]["name"] == "read_file" and timings[1]["seconds"] > 0
+    assert timings[2]["prompt_tokens"] == 120
+    turn = timings[3]
+    assert turn["llm_calls"] == 2 and turn["tool_calls"] == 1
+    assert turn["request_bytes"] == 200 and turn["response_bytes"] == 100
+    assert turn["prompt_tokens"] == 120 and turn["completion_tokens"] == 3
+    assert turn["seconds"] >= turn["llm_seconds"] + turn["tool_seconds"]
+    assert events[-1] == ("done", None)
+
+
+def test_process_message_without_timing(monkeypatch: pytest.MonkeyPatch):
+    def chat(messages: list[dict[str, Any]], tools: Any = None, **kwargs: Any) -> dict[str, Any]:
+        assert kwargs["stats"] is None
+        return {"choices": [{"message": {"content": "Hi"}}]}
+
+    monkeypatch.setattr(agent, "chat", chat)
+    events = list(process_message(new_conversation(), "hello"))
+    assert [t for t, _ in events] == ["text", "done"]
@@ -0,0 +1,85 @@
+"""Tests for cache module."""
+
+import json
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from lsimons_agent import llm
+from lsimons_agent.cache import ResponseCache
+
+
+def response(content: str) -> dict[str, Any]:
+    return {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+
+
+def test_get_returns_stored_response(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    assert cache.get("k") is None
+    cache.put("k", response("hello"), elapsed=1.5)
+    assert cache.get("k") == response("hello")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["saved_seconds"]) == (1, 1, 1.5)
+    cache.close()
+
+
+def test_entries_persist_across_instances(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    cache.put("k", response("hello"), elapsed=0.1)
+    cache.close()
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    assert cache.get("k") == response("hello")
+    assert cache.stats()["bytes"] > 0
+    cache.close()
+
+
+def test_replacing_an_entry_counts_its_size_once(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    cache.put("k", response("hello"), elapsed=0.1)
+    size = cache.stats()["bytes"]
+    cache.put("k", response("hello"), elapsed=0.1)
+    assert cache.stats()["bytes"] == size
+    cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path: Path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_bytes=10_000)
+    filler = "".join(chr(0x4E00 + i) for i in range(1000))  # Compresses poorly
+    cache.put("a", response("a" + filler), elapsed=0.1)
+    cache.put("b", response("b" + filler), elapsed=0.1)
+    assert cache.get("a") is not None  # Now b is the least recently used
+    for i in range(5):
+        cache.put(f"c{i}", response(f"c{i}" + filler), elapsed=0.1)
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] > 0
+    assert cache.stats()["bytes"] <= 10_000
+    cache.close()
+
+
+def test_chat_uses_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    requests: list[dict[str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=response("from the server"))
+
+    llm.close()
+    monkeypatch.setenv("LLM_CACHE", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(llm, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    messages = [{"role": "user", "content": "hi"}]
+    try:
+        assert llm.chat(messages) == response("from the server")
+        assert llm.chat(messages) == response("from the server")
+        assert len(requests) == 1
+        events = list(llm.chat_stream(messages))  # Streaming requests share the entry
+        assert events == [
+            ("text_delta", "from the server"),
+            ("response", response("from the server")),
+        ]
+        assert len(requests) == 1
+        cache = llm.get_cache()
+        assert cache is not None
+        assert cache.stats()["hits"] == 2
+    finally:
+        llm.close()
@@ -0,0 +1,183 @@
+"""Tests for context module."""
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from lsimons_agent import agent
+from lsimons_agent.agent import new_conversation, process_message
+from lsimons_agent.context import SUMMARY_PREFIX, ContextBudget, estimate_tokens
+from mock_llm.server import build_scenario_response
+
+
+def read_call(call_id: str, path: str) -> dict[str, Any]:
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [
+            {
+                "id": call_id,
+                "type": "function",
+                "function": {"name": "read_file", "arguments": json.dumps({"path": path})},
+            }
+        ],
+    }
+
+
+def tool_result(call_id: str, content: str) -> dict[str, Any]:
+    return {"role": "tool", "tool_call_id": call_id, "content": content}
+
+
+def no_chat(messages: list[dict[str, Any]]) -> dict[str, Any]:
+    raise AssertionError("unexpected summary request")
+
+
+def test_estimate_tokens_counts_content_and_tool_calls():
+    assert estimate_tokens({"role": "user", "content": "x" * 400}) == 104
+    assert estimate_tokens(read_call("c1", "a.py")) > estimate_tokens({"role": "assistant"})
+
+
+def test_tokens_notices_replaced_messages():
+    budget = ContextBudget(max_tokens=1000)
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert budget.tokens(messages) == 104
+    messages[0] = {"role": "user", "content": "x" * 40}
+    assert budget.tokens(messages) == 14
+
+
+def test_compact_does_nothing_under_threshold():
+    budget = ContextBudget(max_tokens=1000)
+    messages = new_conversation()
+    assert budget.compact(messages, no_chat) is None
+
+
+def test_compact_dedupes_repeated_reads():
+    budget = ContextBudget(max_tokens=1200)
+    body = "line\n" * 400
+    messages = [
+        *new_conversation(),
+        {"role": "user", "content": "look at a.py"},
+        read_call("c1", "a.py"),
+        tool_result("c1", body),
+        read_call("c2", "./a.py"),
+        tool_result("c2", body),
+    ]
+    stats = budget.compact(messages, no_chat)
+    assert stats is not None
+    assert stats["deduped"] == 1
+    assert "Outdated" in messages[3]["content"]
+    assert messages[5]["content"] == body  # The latest read stays
+    assert stats["tokens_after"] < stats["tokens_before"]
+
+
+def test_compact_elides_old_tool_results_only():
+    budget = ContextBudget(max_tokens=2000, keep_recent=2)
+    messages = [
+        *new_conversation(),
+        {"role": "user", "content": "look at a.py and b.py"},
+        read_call("c1", "a.py"),
+        tool_result("c1", "a" * 4000),
+        read_call("c2", "b.py"),
+        tool_result("c2", "b" * 4000),
+    ]
+    original = messages[3]
+    stats = budget.compact(messages, no_chat)
+    assert stats is not None
+    assert stats["elided"] == 1
+    assert "characters elided" in messages[3]["content"]
+    assert original["content"] == "a" * 4000  # Replaced, not changed
+    assert messages[5]["content"] == "b" * 4000
+
+
+def test_compact_summarizes_older_turns():
+    budget = ContextBudget(max_tokens=1000, keep_recent=2)
+    messages = new_conversation()
+    for i in range(20):
+        messages.append({"role": "user", "content": f"question {i} " + "q" * 200})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "a" * 200})
+
+    requests: list[list[dict[str, Any]]] = []
+
+    def chat(request: list[dict[str, Any]]) -> dict[str, Any]:
+        requests.append(request)
+        return {"choices": [{"message": {"content": "They asked 18 questions."}}]}
+
+    stats = budget.compact(messages, chat)
+    assert stats is not None
+    assert stats["summarized"] == 38
+    assert len(requests) == 1
+    assert "question 0" in requests[0][-1]["content"]
+    assert messages[0]["role"] == "system"
+    summary = {"role": "system", "content": SUMMARY_PREFIX + "They asked 18 questions."}
+    assert messages[1] == summary
+    assert messages[2]["content"].startswith("question 19")
+    assert stats["tokens_after"] <= budget.target
+
+
+def test_compact_summarizes_within_one_long_turn():
+    budget = ContextBudget(max_tokens=2000, keep_recent=3)
+    messages = new_conversation()
+    messages.append({"role": "user", "content": "fix the build"})
+    for i in range(10):
+        messages.append(read_call(f"call{i}", f"src/file{i}.py"))
+        messages.append(tool_result(f"call{i}", "x" * 800))
+
+    def chat(request: list[dict[str, Any]]) -> dict[str, Any]:
+        return {"choices": [{"message": {"content": "Read nine files."}}]}
+
+    stats = budget.compact(messages, chat)
+    assert stats is not None and stats["summarized"] > 0
+    roles = ["system", "system", "assistant", "tool", "assistant", "tool"]
+    assert [m["role"] for m in messages] == roles
+    assert messages[2]["tool_calls"][0]["id"] == messages[3]["tool_call_id"] == "call8"
+
+
+def test_keep_recent_must_be_positive():
+    with pytest.raises(ValueError):
+        ContextBudget(keep_recent=0)
+
+
+def test_compact_survives_failed_summary():
+    budget = ContextBudget(max_tokens=1000, keep_recent=2)
+    messages = new_conversation()
+    for i in range(20):
+        messages.append({"role": "user", "content": f"question {i} " + "q" * 200})
+
+    def chat(request: list[dict[str, Any]]) -> dict[str, Any]:
+        raise RuntimeError("model unavailable")
+
+    stats = budget.compact(messages, chat)
+    assert stats is not None
+    assert "model unavailable" in stats["error"]
+    assert len(messages) == 21
+
+
+def test_long_session_request_size_stays_bounded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """200 turns against the mock LLM, every other one reading a 20 KB log."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "app.log").write_text("INFO started\n" * 1500)
+
+    sizes: list[int] = []
+
+    def chat(
+        messages: list[dict[str, Any]], tools: list[dict[str, Any]] | None = None, **_: Any
+    ) -> dict[str, Any]:
+        sizes.append(len(json.dumps(messages)))
+        return build_scenario_response({"messages": messages})
+
+    monkeypatch.setattr(agent, "chat", chat)
+    budget = ContextBudget(max_tokens=20000)
+    messages = new_conversation()
+    compactions: list[dict[str, Any]] = []
+    for turn in range(200):
+        message = f"read the log ({turn})" if turn % 2 else f"how are you ({turn})"
+        for event_type, data in process_message(messages, message, budget=budget):
+            if event_type == "compacted":
+                compactions.append(data)
+
+    assert any(stats["deduped"] for stats in compactions)
+    assert any(stats["summarized"] for stats in compactions)
+    # About 4 characters per token, plus JSON framing
+    assert max(sizes) < 20000 * 4 * 1.2
+    assert budget.tokens(messages) <= budget.max_tokens
@@ -0,0 +1,81 @@
+"""Tests for filecache module."""
+
+import os
+from pathlib import Path
+
+from lsimons_agent.filecache import FileCache, atomic_write, file_cache
+from lsimons_agent.tools import edit_file, read_file, write_file
+
+
+def test_read_is_cached(tmp_path: Path):
+    cache = FileCache()
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+    assert cache.read(str(path)) == "hello"
+    assert cache.read(str(path)) == "hello"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_external_change_invalidates(tmp_path: Path):
+    cache = FileCache()
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+    cache.read(str(path))
+    path.write_text("hullo")  # Same size
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert cache.read(str(path)) == "hullo"
+    path.unlink()
+    assert cache.get(str(path)) is None
+
+
+def test_write_updates_cache(tmp_path: Path):
+    cache = FileCache()
+    path = tmp_path / "a.txt"
+    cache.write(str(path), "written")
+    assert path.read_text() == "written"
+    assert cache.get(str(path)) == "written"
+    assert cache.hits == 1
+
+
+def test_evicts_least_recently_used(tmp_path: Path):
+    cache = FileCache(max_bytes=800)  # Entries up to 100 bytes
+    for name in "abcdefgh":
+        cache.write(str(tmp_path / name), name * 100)
+    assert cache.get(str(tmp_path / "a")) == "a" * 100  # Now the most recently used
+    cache.write(str(tmp_path / "i"), "i" * 100)
+    assert cache.get(str(tmp_path / "b")) is None
+    assert cache.get(str(tmp_path / "a")) is not None
+    assert cache.stats()["bytes"] <= 800
+
+
+def test_large_and_binary_files_are_not_cached(tmp_path: Path):
+    cache = FileCache(max_bytes=800)
+    cache.write(str(tmp_path / "big"), "x" * 101)
+    cache.write(str(tmp_path / "nul"), "a\0b")
+    assert cache.stats()["files"] == 0
+
+
+def test_tools_share_the_cache(tmp_path: Path):
+    path = str(tmp_path / "a.py")
+    write_file(path, "x = 1\n")
+    hits = file_cache.hits
+    assert read_file(path) == "x = 1\n"
+    edit_file(path, "x = 1", "x = 2")
+    assert read_file(path) == "x = 2\n"
+    assert file_cache.hits == hits + 3  # Every read after the write
+    assert read_file(path, start_line=1, end_line=1) == "x = 2\n"  # Ranges read the file
+
+
+def test_atomic_write_keeps_mode_and_symlinks(tmp_path: Path):
+    target = tmp_path / "script.sh"
+    target.write_text("old")
+    target.chmod(0o755)
+    link = tmp_path / "link.sh"
+    link.symlink_to(target)
+    st = atomic_write(str(link), b"new")
+    assert link.is_symlink()
+    assert target.read_text() == "new"
+    assert target.stat().st_mode & 0o777 == 0o755
+    assert st.st_ino == target.stat().st_ino
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
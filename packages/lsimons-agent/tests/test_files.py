@@ -0,0 +1,96 @@
+"""Tests for files module."""
+
+from pathlib import Path
+
+from lsimons_agent import files
+from lsimons_agent.files import CHUNK, is_binary, read_text
+
+
+def numbered(tmp_path: Path, count: int) -> Path:
+    path = tmp_path / "numbered.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1, count + 1)))
+    return path
+
+
+def test_small_file_is_read_whole(tmp_path: Path):
+    path = tmp_path / "a.txt"
+    path.write_text("hello\nworld")
+    assert read_text(str(path)) == "hello\nworld"
+
+
+def test_empty_file(tmp_path: Path):
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    assert read_text(str(path)) == ""
+    assert read_text(str(path), start_line=1, end_line=3) == ""
+
+
+def test_line_range(tmp_path: Path):
+    path = numbered(tmp_path, 100)
+    assert read_text(str(path), start_line=5, end_line=7) == "line 5\nline 6\nline 7\n"
+    assert read_text(str(path), start_line=99) == "line 99\nline 100\n"
+    assert read_text(str(path), end_line=2) == "line 1\nline 2\n"
+
+
+def test_line_range_past_the_end(tmp_path: Path):
+    path = numbered(tmp_path, 10)
+    assert read_text(str(path), start_line=9, end_line=20) == "line 9\nline 10\n"
+    assert "fewer than 11 lines" in read_text(str(path), start_line=11)
+
+
+def test_line_range_across_chunks(tmp_path: Path):
+    # Enough lines for many index chunks; check lines right at chunk boundaries too
+    path = numbered(tmp_path, 200_000)
+    assert path.stat().st_size > 10 * CHUNK
+    lines = path.read_text().splitlines(keepends=True)
+    for start in (1, 7000, 7001, 100_000, 199_999):
+        end = start + 2
+        assert read_text(str(path), start, end) == "".join(lines[start - 1 : end])
+    # Reading backwards uses the index already built
+    assert read_text(str(path), 50, 50) == "line 50\n"
+
+
+def test_index_is_rebuilt_when_file_changes(tmp_path: Path):
+    path = numbered(tmp_path, 100_000)
+    assert read_text(str(path), 90_000, 90_000) == "line 90000\n"
+    path.write_text("".join(f"row {i}\n" for i in range(1, 100_001)))
+    assert read_text(str(path), 90_000, 90_000) == "row 90000\n"
+
+
+def test_index_cache_is_bounded(tmp_path: Path):
+    for i in range(files.MAX_INDEXES + 5):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text("a\nb\nc\n")
+        read_text(str(path), 2, 2)
+    assert len(files._indexes) <= files.MAX_INDEXES  # type: ignore[reportPrivateUsage]
+
+
+def test_large_file_is_truncated_at_a_line(tmp_path: Path):
+    path = numbered(tmp_path, 1000)
+    text = read_text(str(path), max_bytes=100)
+    assert text.startswith("line 1\n")
+    body, note = text.rsplit("\n[", 1)
+    assert body.endswith("line 13")  # Whole lines only
+    assert "Truncated" in note and "start_line" in note
+
+
+def test_line_range_is_capped(tmp_path: Path):
+    path = numbered(tmp_path, 1000)
+    text = read_text(str(path), start_line=500, end_line=900, max_bytes=50)
+    assert text.startswith("line 500\n")
+    assert "Truncated" in text
+
+
+def test_binary_file_is_described(tmp_path: Path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR" + bytes(range(256)) * 10)
+    text = read_text(str(path))
+    assert text.startswith("[Binary file: 2576 bytes")
+    assert "89 50 4e 47" in text
+
+
+def test_is_binary():
+    assert is_binary(b"abc\0def")
+    assert is_binary(b"\xff\xfe" + b"x" * 100)
+    assert not is_binary("héllo".encode())
+    assert not is_binary(b"x" * 10 + "é".encode()[:1])  # Cut off by the sample's end
@@ -0,0 +1,197 @@
+"""Tests for llm module."""
+
+import asyncio
+import json
+from typing import Any
+
+import httpx
+import pytest
+from lsimons_agent import llm
+
+
+def test_get_client_reuses_instance():
+    client1 = llm.get_client()
+    client2 = llm.get_client()
+    assert client1 is client2
+    llm.close()
+
+
+def test_close_creates_new_client_next_time():
+    client1 = llm.get_client()
+    llm.close()
+    client2 = llm.get_client()
+    assert client1 is not client2
+    assert client1.is_closed
+    llm.close()
+
+
+def test_close_is_idempotent():
+    llm.close()
+    llm.close()
+
+
+def test_pool_limits_from_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LLM_POOL_MAX_CONNECTIONS", "3")
+    monkeypatch.setenv("LLM_POOL_MAX_KEEPALIVE", "2")
+    monkeypatch.setenv("LLM_POOL_KEEPALIVE_EXPIRY", "5")
+    limits = llm._pool_limits()  # type: ignore[reportPrivateUsage]
+    assert limits.max_connections == 3
+    assert limits.max_keepalive_connections == 2
+    assert limits.keepalive_expiry == 5.0
+
+
+def test_http2_can_be_disabled(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LLM_HTTP2", "0")
+    assert not llm._http2_enabled()  # type: ignore[reportPrivateUsage]
+
+
+def test_build_request_body():
+    messages = [{"role": "user", "content": "hi"}]
+    tools = [{"type": "function", "function": {"name": "f"}}]
+    path, body, headers = llm._build_request(messages, tools, "m")  # type: ignore[reportPrivateUsage]
+    assert path == "/chat/completions"
+    assert headers["Content-Type"] == "application/json"
+    assert json.loads(body) == {
+        "model": "m",
+        "max_tokens": 4096,
+        "messages": messages,
+        "tools": tools,
+    }
+
+
+def test_build_request_is_canonical():
+    a = [{"role": "user", "content": "hi"}]
+    b = [{"content": "hi", "role": "user"}]
+    body_a = llm._build_request(a, None, "m")[1]  # type: ignore[reportPrivateUsage]
+    body_b = llm._build_request(b, None, "m")[1]  # type: ignore[reportPrivateUsage]
+    assert body_a == body_b
+
+
+def test_encoded_cache_reuses_and_refreshes():
+    cache = llm._EncodedCache()  # type: ignore[reportPrivateUsage]
+    message = {"role": "user", "content": "hi"}
+    assert cache.encode(message) is cache.encode(message)
+    replaced = {"role": "user", "content": "bye"}
+    assert json.loads(cache.encode(replaced)) == replaced
+
+
+def test_encoded_cache_is_bounded():
+    cache = llm._EncodedCache(max_bytes=1000)  # type: ignore[reportPrivateUsage]
+    messages = [{"content": "x" * 100} for _ in range(50)]
+    for message in messages:
+        cache.encode(message)
+    assert cache._size <= 1000  # type: ignore[reportPrivateUsage]
+
+
+def test_parse_stream_text_deltas():
+    lines = [
+        'data: {"choices": [{"index": 0, "delta": {"role": "assistant"}}]}',
+        "",
+        'data: {"choices": [{"index": 0, "delta": {"content": "Hello"}}]}',
+        'data: {"choices": [{"index": 0, "delta": {"content": " world"}}]}',
+        'data: {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}',
+        "data: [DONE]",
+    ]
+    events = list(llm.parse_stream(lines))
+    assert events[:2] == [("text_delta", "Hello"), ("text_delta", " world")]
+    event_type, response = events[2]
+    assert event_type == "response"
+    assert response["choices"][0]["message"] == {"role": "assistant", "content": "Hello world"}
+    assert response["choices"][0]["finish_reason"] == "stop"
+
+
+def test_parse_stream_reassembles_tool_calls():
+    lines = [
+        'data: {"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "call_1", '
+        '"function": {"name": "read_file", "arguments": ""}}]}}]}',
+        'data: {"choices": [{"delta": {"tool_calls": [{"index": 0, '
+        '"function": {"arguments": "{\\"path\\": "}}]}}]}',
+        'data: {"choices": [{"delta": {"tool_calls": [{"index": 1, "id": "call_2", '
+        '"function": {"name": "bash", "arguments": "{\\"command\\": \\"ls\\"}"}}]}}]}',
+        'data: {"choices": [{"delta": {"tool_calls": [{"index": 0, '
+        '"function": {"arguments": "\\"a.txt\\"}"}}]}}]}',
+        "data: [DONE]",
+    ]
+    events = list(llm.parse_stream(lines))
+    assert len(events) == 1
+    message = events[0][1]["choices"][0]["message"]
+    assert message["content"] is None
+    calls = message["tool_calls"]
+    assert [c["id"] for c in calls] == ["call_1", "call_2"]
+    assert calls[0]["function"] == {"name": "read_file", "arguments": '{"path": "a.txt"}'}
+    assert calls[1]["function"]["name"] == "bash"
+
+
+def test_parse_stream_keeps_usage():
+    lines = [
+        'data: {"choices": [{"delta": {"content": "hi"}}]}',
+        'data: {"choices": [], "usage": {"total_tokens": 7}}',
+        "data: [DONE]",
+    ]
+    response = list(llm.parse_stream(lines))[-1][1]
+    assert response["usage"] == {"total_tokens": 7}
+
+
+def test_achat_and_achat_stream(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    requests: list[dict[str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        if not body.get("stream"):
+            return httpx.Response(200, json={"choices": [{"message": {"content": "Hi"}}]})
+        chunks = [{"choices": [{"delta": {"content": text}}]} for text in ("H", "i")]
+        lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"]
+        return httpx.Response(200, text="".join(lines))
+
+    async def main() -> tuple[dict[str, Any], list[tuple[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        transport = httpx.MockTransport(handler)
+        llm._async_clients[loop] = httpx.AsyncClient(transport=transport)  # type: ignore[reportPrivateUsage]
+        assert llm.get_async_client() is llm.get_async_client()
+        try:
+            messages = [{"role": "user", "content": "hello"}]
+            return await llm.achat(messages), [e async for e in llm.achat_stream(messages)]
+        finally:
+            await llm.aclose()
+            assert loop not in llm._async_clients  # type: ignore[reportPrivateUsage]
+
+    response, events = asyncio.run(main())
+    assert response["choices"][0]["message"]["content"] == "Hi"
+    assert events[:2] == [("text_delta", "H"), ("text_delta", "i")]
+    assert events[2][1]["choices"][0]["message"]["content"] == "Hi"
+    assert [body.get("stream") for body in requests] == [None, True]
+
+
+def test_chat_reports_stats(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    monkeypatch.delenv("LLM_BASE_URLS", raising=False)
+    reply = {"choices": [{"message": {"content": "Hi"}}]}
+    body = json.dumps(reply).encode()
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+    monkeypatch.setattr(llm, "_client", httpx.Client(transport=transport))
+    stats: dict[str, Any] = {}
+    assert llm.chat([{"role": "user", "content": "hello"}], stats=stats) == reply
+    assert stats["request_bytes"] > 0
+    assert stats["response_bytes"] == len(body)
+    assert stats["wait_seconds"] >= 0 and stats["decode_seconds"] >= 0
+
+
+def test_chat_stream_reports_stats(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("LLM_CACHE", raising=False)
+    monkeypatch.delenv("LLM_BASE_URLS", raising=False)
+    sent: list[bytes] = []
+    text = 'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\ndata: [DONE]\n\n'
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.content)
+        return httpx.Response(200, stream=httpx.ByteStream(text.encode()))
+
+    monkeypatch.setattr(llm, "_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    stats: dict[str, Any] = {}
+    events = list(llm.chat_stream([{"role": "user", "content": "hello"}], stats=stats))
+    assert events[0] == ("text_delta", "Hi")
+    assert stats["request_bytes"] == len(sent[0])  # The body that was sent, with "stream"
+    assert stats["response_bytes"] == len(text)
+    assert stats["wait_seconds"] >= 0 and "cached" not in stats
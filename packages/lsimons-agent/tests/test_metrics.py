@@ -0,0 +1,70 @@
+"""Tests for metrics module."""
+
+import pytest
+from lsimons_agent import metrics
+from lsimons_agent.metrics import Registry
+
+
+def test_counters_and_gauges():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests made", ["status"])
+    requests.labels("200").inc()
+    requests.labels("200").inc(2)
+    requests.labels("500").inc()
+    open_files = registry.gauge("open_files", "Files open")
+    open_files.inc(3)
+    open_files.dec()
+    registry.gauge("answer", "The answer", function=lambda: 42)
+
+    assert registry.exposition() == (
+        "# HELP requests_total Requests made\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{status="200"} 3\n'
+        'requests_total{status="500"} 1\n'
+        "# HELP open_files Files open\n"
+        "# TYPE open_files gauge\n"
+        "open_files 2\n"
+        "# HELP answer The answer\n"
+        "# TYPE answer gauge\n"
+        "answer 42\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for seconds in (0.05, 0.1, 0.5, 2):
+        latency.observe(seconds)
+
+    assert registry.exposition().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("errors_total", "Errors\nby message", ["message"]).labels('a "b"\\c').inc()
+    assert registry.exposition().splitlines() == [
+        "# HELP errors_total Errors\\nby message",
+        "# TYPE errors_total counter",
+        'errors_total{message="a \\"b\\"\\\\c"} 1',
+    ]
+
+
+def test_misuse_is_an_error():
+    registry = Registry()
+    counter = registry.counter("calls_total", "Calls", ["tool"])
+    with pytest.raises(ValueError):
+        counter.labels("bash", "extra")
+    with pytest.raises(ValueError):
+        registry.counter("calls_total", "Calls again")
+
+
+def test_llm_and_tool_metrics_are_registered():
+    text = metrics.exposition()
+    assert "# TYPE lsimons_agent_llm_request_seconds histogram" in text
+    assert "# TYPE lsimons_agent_tool_calls_total counter" in text
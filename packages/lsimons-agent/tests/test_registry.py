@@ -0,0 +1,85 @@
+"""Tests for registry module."""
+
+from typing import Any
+
+import pytest
+from lsimons_agent.registry import Registry, compile_schema
+from lsimons_agent.tools import execute, registry
+
+SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "path": {"type": "string"},
+        "count": {"type": "integer"},
+        "mode": {"type": "string", "enum": ["a", "b"]},
+        "edits": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"old": {"type": "string"}},
+                "required": ["old"],
+            },
+        },
+    },
+    "required": ["path"],
+}
+
+
+def test_compiled_schema_reports_every_problem():
+    validate = compile_schema(SCHEMA, closed=True)
+    assert list(validate({"path": "x", "count": 2, "edits": [{"old": "y"}]}, "args")) == []
+    assert list(
+        validate({"count": True, "mode": "c", "edits": [{}, {"old": 1}], "x": 0}, "args")
+    ) == [
+        "args: missing required 'path'",
+        "args.count: expected integer, got boolean",
+        "args.mode: must be one of 'a', 'b'",
+        "args.edits[0]: missing required 'old'",
+        "args.edits[1].old: expected string, got integer",
+        "args: unknown argument 'x'",
+    ]
+    assert list(validate([], "args")) == ["args: expected object, got array"]
+
+
+def test_registry_builds_schemas_and_dispatches():
+    tools = Registry()
+    seen: list[tuple[str, bool]] = []
+    tools.timing_hooks.append(lambda name, seconds, raised: seen.append((name, raised)))
+
+    @tools.tool("Echo", SCHEMA, read_only=True, idempotent=True)
+    def echo(path: str, count: int = 1, prefix: str = "") -> str:  # type: ignore[reportUnusedFunction]
+        if count < 0:
+            raise ValueError("negative")
+        return prefix + path * count
+
+    assert tools.schemas() == [
+        {
+            "type": "function",
+            "function": {"name": "echo", "description": "Echo", "parameters": SCHEMA},
+        }
+    ]
+    tool = tools.get("echo")
+    assert tool is not None and tool.context == {"prefix"} and tool.is_read_only({})
+    assert tools.execute("echo", {"path": "ab", "count": 2}, prefix=">", shell=None) == ">abab"
+    assert tools.execute("echo", {"path": 3}) == (
+        "Error: invalid arguments for echo: arguments.path: expected string, got integer"
+    )
+    with pytest.raises(ValueError):
+        tools.execute("echo", {"path": "a", "count": -1})
+    assert tools.execute("nope", {}) == "Unknown tool: nope"
+    assert seen == [("echo", False), ("echo", True)]  # Invalid calls never ran
+
+
+def test_bad_arguments_come_back_as_results():
+    assert execute("read_file", {"paht": "x"}) == (
+        "Error: invalid arguments for read_file: arguments: missing required 'path'; "
+        "arguments: unknown argument 'paht'"
+    )
+    assert "expected integer, got string" in execute("bash", {"command": "true", "timeout": "5"})
+
+
+def test_tool_metadata():
+    read_file, bash = registry.get("read_file"), registry.get("bash")
+    assert read_file is not None and read_file.idempotent and read_file.is_read_only({})
+    assert bash is not None and not bash.idempotent
+    assert bash.is_read_only({"read_only": True}) and not bash.is_read_only({})
@@ -0,0 +1,161 @@
+"""Tests for retry module."""
+
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+from lsimons_agent import retry
+from lsimons_agent.retry import Attempt, Latencies, Policy
+
+
+def replies(*statuses: int, delays: tuple[float, ...] = ()) -> httpx.MockTransport:
+    """A transport answering with the given statuses in turn, after the given delays."""
+    calls = iter(range(len(statuses)))
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        i = next(calls)
+        time.sleep(delays[i] if i < len(delays) else 0)
+        headers = {"Retry-After": "0"} if statuses[i] == 429 else {}
+        return httpx.Response(statuses[i], headers=headers, json={"n": i})
+
+    return httpx.MockTransport(handler)
+
+
+def test_retries_until_success():
+    attempts: list[Attempt] = []
+    client = httpx.Client(transport=replies(429, 503, 200))
+    response = retry.send(
+        lambda: client.get("http://llm/"), Policy(base_delay=0), Latencies(), [attempts.append]
+    )
+    assert response.json() == {"n": 2}
+    assert [(a.number, a.status) for a in attempts] == [(1, 429), (2, 503), (3, 200)]
+
+
+def test_gives_up_after_retries():
+    client = httpx.Client(transport=replies(500, 500))
+    response = retry.send(
+        lambda: client.get("http://llm/"), Policy(retries=1, base_delay=0), Latencies()
+    )
+    assert response.status_code == 500
+
+
+def test_client_errors_are_not_retried():
+    client = httpx.Client(transport=replies(400, 200))
+    response = retry.send(lambda: client.get("http://llm/"), Policy(base_delay=0), Latencies())
+    assert response.status_code == 400
+
+
+def test_transport_errors_are_retried():
+    failures = iter([True, False])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if next(failures):
+            raise httpx.RemoteProtocolError("peer closed connection", request=request)
+        return httpx.Response(200)
+
+    attempts: list[Attempt] = []
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    response = retry.send(
+        lambda: client.get("http://llm/"), Policy(base_delay=0), Latencies(), [attempts.append]
+    )
+    assert response.status_code == 200
+    assert [a.error for a in attempts] == ["RemoteProtocolError", None]
+
+
+def test_last_transport_error_is_raised():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.ConnectError):
+        retry.send(lambda: client.get("http://llm/"), Policy(retries=1, base_delay=0), Latencies())
+
+
+def test_retry_after():
+    def response(value: str) -> httpx.Response:
+        return httpx.Response(429, headers={"Retry-After": value})
+
+    assert retry.retry_after(response("2.5")) == 2.5
+    when = email.utils.formatdate(time.time() + 60, usegmt=True)
+    after = retry.retry_after(response(when))
+    assert after is not None and 55 < after <= 60
+    assert retry.retry_after(response("soon")) is None
+    assert retry.retry_after(httpx.Response(429)) is None
+
+    policy = Policy(max_delay=10)
+    assert policy.backoff(1, response("3")) == 3
+    assert policy.backoff(1, response("30")) is None  # Longer than we're willing to wait
+    assert 0 <= (policy.backoff(3, httpx.Response(503)) or 0) <= 2.0
+
+
+def test_latencies_percentile():
+    latencies = Latencies(size=100, min_samples=10)
+    assert latencies.percentile(95) is None
+    for i in range(100):
+        latencies.add(i / 100)
+    assert latencies.percentile(95) == 0.95
+    latencies.add(5.0)  # Pushes out the oldest
+    assert latencies.percentile(100) == 5.0
+
+
+def test_hedge_answers_when_the_first_request_is_slow():
+    attempts: list[Attempt] = []
+    client = httpx.Client(transport=replies(200, 200, delays=(1.0, 0.0)))
+    policy = Policy(hedge=True, hedge_delay=0.05)
+    start = time.perf_counter()
+    response = retry.send(lambda: client.get("http://llm/"), policy, Latencies(), [attempts.append])
+    assert time.perf_counter() - start < 0.5
+    assert response.json() == {"n": 1}
+    assert [(a.number, a.hedge) for a in attempts] == [(2, True)]
+
+
+def test_no_hedge_when_the_first_request_is_fast():
+    attempts: list[Attempt] = []
+    client = httpx.Client(transport=replies(200, 200))
+    policy = Policy(hedge=True, hedge_delay=0.5)
+    response = retry.send(lambda: client.get("http://llm/"), policy, Latencies(), [attempts.append])
+    assert response.json() == {"n": 0}
+    assert [(a.number, a.hedge) for a in attempts] == [(1, False)]
+
+
+def test_async_hedge_cancels_the_loser():
+    cancelled: list[bool] = []
+    calls = iter(range(2))
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        i = next(calls)
+        if i == 0:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return httpx.Response(200, json={"n": i})
+
+    async def main() -> httpx.Response:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            policy = Policy(hedge=True, hedge_delay=0.05)
+            return await retry.asend(lambda: client.get("http://llm/"), policy, Latencies())
+
+    response = asyncio.run(main())
+    assert response.json() == {"n": 1}
+    assert cancelled == [True]
+
+
+def test_async_retries():
+    attempts: list[Attempt] = []
+    statuses = iter([429, 200])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses), headers={"Retry-After": "0"})
+
+    async def main() -> httpx.Response:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await retry.asend(
+                lambda: client.get("http://llm/"), Policy(), Latencies(), [attempts.append]
+            )
+
+    assert asyncio.run(main()).status_code == 200
+    assert [a.status for a in attempts] == [429, 200]
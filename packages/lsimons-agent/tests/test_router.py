@@ -0,0 +1,125 @@
+"""Tests for router module."""
+
+import random
+
+import httpx
+import pytest
+from lsimons_agent import llm
+from lsimons_agent.router import Endpoint, Router
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_router(clock: FakeClock | None = None, **kwargs: float) -> Router:
+    urls = ["http://a", "http://b", "http://c"]
+    return Router(urls, clock=clock or FakeClock(), rng=random.Random(1), explore=0, **kwargs)
+
+
+def by_url(router: Router) -> dict[str, Endpoint]:
+    return {e.url: e for e in router.endpoints}
+
+
+def learn(router: Router, latencies: dict[str, float]) -> None:
+    for url, seconds in latencies.items():
+        by_url(router)[url].latency = seconds
+
+
+def test_sends_requests_to_the_fastest_endpoint():
+    router = make_router()
+    learn(router, {"http://a": 0.5, "http://b": 0.1, "http://c": 0.3})
+    assert router.pick().url == "http://b"
+
+
+def test_requests_in_flight_spread_the_load():
+    router = make_router()
+    learn(router, {"http://a": 0.2, "http://b": 0.1, "http://c": 0.3})
+    assert [router.pick().url for _ in range(3)] == ["http://b", "http://a", "http://b"]
+
+
+def test_conversations_stick_to_their_endpoint():
+    router = make_router()
+    learn(router, {"http://a": 0.1, "http://b": 0.1, "http://c": 0.1})
+
+    def home(conversation: str) -> str:
+        endpoint = router.pick(conversation)
+        router.cancel(endpoint)
+        return endpoint.url
+
+    homes = [home(f"conversation {i}") for i in range(30)]
+    assert set(homes) == {"http://a", "http://b", "http://c"}
+    assert homes == [home(f"conversation {i}") for i in range(30)]
+
+    url = homes[0]
+    by_url(router)[url].latency = 0.15  # Worse, within the slack
+    assert home("conversation 0") == url
+    by_url(router)[url].latency = 1.0
+    assert home("conversation 0") != url
+
+
+def test_circuit_opens_and_endpoint_is_readmitted_slowly():
+    clock = FakeClock()
+    router = make_router(clock, cooldown=10, ramp=100)
+    learn(router, {"http://a": 0.1, "http://b": 0.2, "http://c": 0.3})
+    a = by_url(router)["http://a"]
+    for _ in range(3):
+        router.pick()
+        router.record(a, 0, ok=False)
+    assert a.open_until == 10
+    assert {router.pick().url for _ in range(20)} <= {"http://b", "http://c"}
+    for endpoint in router.endpoints:
+        endpoint.in_flight = 0
+        endpoint.error_rate = 0
+
+    clock.now = 20  # Ramping: 10% of the picks a would win
+    picks = [router.pick().url for _ in range(200)]
+    for endpoint in router.endpoints:
+        endpoint.in_flight = 0
+    assert 0 < picks.count("http://a") < 100
+
+    router.pick()
+    router.record(a, 0, ok=False)  # One failure while ramping reopens it, for longer
+    assert a.open_until == 40
+
+    clock.now = 200  # Fully re-admitted
+    assert router.pick().url == "http://a"
+    assert a.cooldown == 10
+
+
+def test_all_endpoints_down_picks_the_first_to_return():
+    clock = FakeClock()
+    router = make_router(clock, failure_threshold=1)
+    for endpoint, until in zip(router.endpoints, (30, 10, 20), strict=True):
+        endpoint.open_until = until
+    assert router.pick().url == "http://b"
+
+
+def test_call_records_failures():
+    router = Router(["http://a"], explore=0)
+
+    def fail(base_url: str) -> httpx.Response:
+        raise httpx.ConnectError("refused", request=httpx.Request("POST", base_url))
+
+    with pytest.raises(httpx.ConnectError):
+        router.call(None, fail)
+    assert router.call(None, lambda base_url: httpx.Response(503)).status_code == 503
+    assert router.call(None, lambda base_url: httpx.Response(400)).status_code == 400
+    (endpoint,) = router.endpoints
+    assert endpoint.in_flight == 0
+    assert endpoint.failures == 0  # The 400 was a success as far as routing goes
+    assert endpoint.error_rate > 0
+
+
+def test_llm_router_from_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("LLM_BASE_URL", "http://one")
+    monkeypatch.delenv("LLM_BASE_URLS", raising=False)
+    assert [e.url for e in llm.get_router().endpoints] == ["http://one"]
+    monkeypatch.setenv("LLM_BASE_URLS", "http://a/, http://b")
+    router = llm.get_router()
+    assert [e.url for e in router.endpoints] == ["http://a", "http://b"]
+    assert llm.get_router() is router
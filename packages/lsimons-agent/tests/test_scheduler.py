@@ -0,0 +1,109 @@
+"""Tests for scheduler module."""
+
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from lsimons_agent import metrics, scheduler
+from lsimons_agent.scheduler import conflicts, run_tool_calls, tool_access
+from lsimons_agent.tools import registry
+
+
+def test_tool_access_multi_edit():
+    one = {"edits": [{"path": "/a"}, {"path": "/a"}]}
+    two = {"edits": [{"path": "/a"}, {"path": "/b"}]}
+    assert tool_access("multi_edit", one) == ("write", "/a")
+    assert tool_access("multi_edit", two) == ("exclusive", None)
+
+
+def test_readers_do_not_conflict():
+    assert not conflicts(("read", "/a"), ("read", "/a"))
+    assert not conflicts(("read", "/a"), ("read_all", None))
+    assert not conflicts(("read_all", None), ("read_all", None))
+
+
+def test_writes_conflict_on_same_path_only():
+    assert conflicts(("write", "/a"), ("read", "/a"))
+    assert conflicts(("write", "/a"), ("write", "/a"))
+    assert not conflicts(("write", "/a"), ("write", "/b"))
+    assert conflicts(("write", "/a"), ("read_all", None))
+
+
+def test_exclusive_conflicts_with_everything():
+    assert conflicts(("exclusive", None), ("read", "/a"))
+    assert conflicts(("read_all", None), ("exclusive", None))
+
+
+def test_tool_access_bash_read_only_flag():
+    assert tool_access("bash", {"command": "ls", "read_only": True}) == ("read_all", None)
+    assert tool_access("bash", {"command": "rm -rf x"}) == ("exclusive", None)
+    assert tool_access("unknown", {}) == ("exclusive", None)
+
+
+def test_results_keep_call_order():
+    calls = [("bash", {"command": f"echo {i}", "read_only": True}) for i in range(6)]
+    assert run_tool_calls(calls) == [str(i) for i in range(6)]
+
+
+def test_read_only_commands_run_in_parallel():
+    calls = [("bash", {"command": "sleep 0.3", "read_only": True}) for _ in range(3)]
+    start = time.monotonic()
+    run_tool_calls(calls)
+    assert time.monotonic() - start < 0.8
+
+
+def test_writes_to_same_path_stay_ordered():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / "f.txt")
+        calls = [
+            ("write_file", {"path": path, "content": "one"}),
+            ("edit_file", {"path": path, "old_string": "one", "new_string": "two"}),
+            ("read_file", {"path": path}),
+        ]
+        assert run_tool_calls(calls) == ["OK", "OK", "two"]
+
+
+def test_errors_become_results():
+    results = run_tool_calls(
+        [("read_file", {"path": "/nonexistent/x"}), ("bash", {"command": "echo hi"})]
+    )
+    assert results[0].startswith("Error:")
+    assert results[1] == "hi"
+
+
+def test_tool_calls_are_counted():
+    def count(tool: str) -> float:
+        series = f'lsimons_agent_tool_calls_total{{tool="{tool}",outcome="error"}} '
+        lines = metrics.exposition().splitlines()
+        return next((float(line.split()[-1]) for line in lines if line.startswith(series)), 0)
+
+    before = count("read_file"), count("unknown")
+    run_tool_calls([("read_file", {"path": "/nonexistent/x"}), ("no_such_tool", {})])
+    assert (count("read_file"), count("unknown")) == (before[0] + 1, before[1] + 1)
+
+
+def test_repeated_reads_run_once(monkeypatch: pytest.MonkeyPatch):
+    ran: list[str] = []
+    monkeypatch.setattr(registry, "timing_hooks", [lambda name, seconds, raised: ran.append(name)])
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / "f.txt")
+        Path(path).write_text("one")
+        read = ("read_file", {"path": path})
+        calls = [read, read, ("write_file", {"path": path, "content": "two"}), read]
+        assert run_tool_calls(calls) == ["one", "one", "OK", "two"]
+        assert ran.count("read_file") == 2  # Re-read after the write
+
+
+def test_costly_calls_start_first():
+    calls = [
+        ("read_file", {"path": "/a"}),
+        ("search", {"pattern": "x", "path": "/src"}),
+        ("bash", {"command": "make test"}),
+        ("write_file", {"path": "/a", "content": ""}),
+    ]
+    accesses = [tool_access(name, args) for name, args in calls]
+    repeats: list[int | None] = [None] * len(calls)
+    order = scheduler._start_order(calls, accesses, repeats)  # type: ignore[reportPrivateUsage]
+    # bash may change anything, so it waits for the reads before it to start
+    assert order == [1, 0, 2, 3]
@@ -0,0 +1,122 @@
+"""Tests for search module."""
+
+from pathlib import Path
+
+from lsimons_agent.search import find, format_matches, walk
+from lsimons_agent.tools import execute
+
+
+def make_tree(root: Path, files: dict[str, str | bytes]) -> None:
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, bytes):
+            path.write_bytes(content)
+        else:
+            path.write_text(content)
+
+
+def relative(root: Path, paths: list[str]) -> list[str]:
+    return [str(Path(p).relative_to(root)) for p in paths]
+
+
+def test_walk_skips_git_and_gitignored(tmp_path: Path):
+    make_tree(
+        tmp_path,
+        {
+            ".gitignore": "node_modules/\n*.log\n/build\n!keep.log\n",
+            ".git/config": "x",
+            "a.py": "",
+            "app.log": "",
+            "keep.log": "",
+            "build/out.py": "",
+            "src/build/gen.py": "",  # /build is anchored to the root
+            "node_modules/pkg/index.js": "",
+            "src/b.py": "",
+            "src/.gitignore": "secret*\n",
+            "src/secret.py": "",
+        },
+    )
+    assert relative(tmp_path, list(walk(str(tmp_path)))) == [
+        ".gitignore",
+        "a.py",
+        "keep.log",
+        "src/.gitignore",
+        "src/b.py",
+        "src/build/gen.py",
+    ]
+
+
+def test_walk_double_star(tmp_path: Path):
+    make_tree(
+        tmp_path,
+        {
+            ".gitignore": "**/cache/**\ndocs/**/*.tmp\n",
+            "a/cache/x": "",
+            "docs/a/b.tmp": "",
+            "y": "",
+        },
+    )
+    assert relative(tmp_path, list(walk(str(tmp_path)))) == [".gitignore", "y"]
+
+
+def test_find_matches_lines(tmp_path: Path):
+    make_tree(
+        tmp_path,
+        {
+            "a.py": "import os\n\ndef foo():\n    return os.getcwd()  # os twice\n",
+            "b.txt": "nothing here\n",
+            "c.bin": b"\0os\0",
+        },
+    )
+    matches, truncated = find(r"\bos\b", str(tmp_path))
+    assert not truncated
+    assert [(Path(m.path).name, m.line, m.text) for m in matches] == [
+        ("a.py", 1, "import os"),
+        ("a.py", 4, "    return os.getcwd()  # os twice"),
+    ]
+
+
+def test_find_glob_and_ignore_case(tmp_path: Path):
+    make_tree(tmp_path, {"a.py": "TODO\n", "b.md": "todo\n"})
+    matches, _ = find("todo", str(tmp_path), glob="*.md")
+    assert [Path(m.path).name for m in matches] == ["b.md"]
+    matches, _ = find("todo", str(tmp_path), ignore_case=True)
+    assert [Path(m.path).name for m in matches] == ["a.py", "b.md"]
+
+
+def test_find_stops_at_max_results(tmp_path: Path):
+    make_tree(tmp_path, {f"f{i:03d}.txt": "hit\nhit\n" for i in range(200)})
+    matches, truncated = find("hit", str(tmp_path), max_results=5)
+    assert truncated
+    assert [(Path(m.path).name, m.line) for m in matches] == [
+        ("f000.txt", 1),
+        ("f000.txt", 2),
+        ("f001.txt", 1),
+        ("f001.txt", 2),
+        ("f002.txt", 1),
+    ]
+    assert "Stopped after 5 matches" in format_matches(matches, truncated)
+
+
+def test_search_tool(tmp_path: Path):
+    make_tree(tmp_path, {"a.py": "x = 1\n"})
+    assert execute("search", {"pattern": "x =", "path": str(tmp_path)}).endswith("a.py:1:x = 1")
+    assert execute("search", {"pattern": "nope", "path": str(tmp_path)}) == "No matches found"
+
+
+def test_walk_below_the_top_of_a_repository(tmp_path: Path):
+    make_tree(
+        tmp_path,
+        {
+            ".git/info/exclude": "notes.txt\n",
+            ".gitignore": "*.log\n/src/gen/\n",
+            "src/a.py": "",
+            "src/a.log": "",
+            "src/notes.txt": "",
+            "src/gen/x.py": "",
+            "src/lib/gen/y.py": "",  # /src/gen/ is anchored to the top
+        },
+    )
+    root = str(tmp_path / "src")
+    assert relative(Path(root), list(walk(root))) == ["a.py", "lib/gen/y.py"]
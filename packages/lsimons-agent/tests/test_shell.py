@@ -0,0 +1,147 @@
+"""Tests for shell module."""
+
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from lsimons_agent.shell import HEAD_BYTES, TAIL_BYTES, CommandOutput, ShellSession, run_once
+from lsimons_agent.tools import bash
+
+
+def test_run_returns_output_and_exit_code():
+    session = ShellSession()
+    try:
+        assert session.run("echo hello") == ("hello\n", 0)
+        assert session.run("echo oops >&2; exit_code() { return 3; }; exit_code")[1] == 3
+    finally:
+        session.close()
+
+
+def test_cwd_and_env_persist_between_commands():
+    session = ShellSession()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            session.run(f"cd {tmpdir}")
+            session.run("export GREETING=hi")
+            output, _ = session.run("pwd; echo $GREETING")
+            assert output.split() == [session.cwd, "hi"]
+        finally:
+            session.close()
+
+
+def test_command_does_not_read_session_input():
+    session = ShellSession()
+    try:
+        assert session.run("cat", timeout=5) == ("", 0)
+        assert session.run("echo after") == ("after\n", 0)
+    finally:
+        session.close()
+
+
+def test_timeout_kills_command_and_session_recovers():
+    session = ShellSession()
+    try:
+        session.run("cd /")
+        start = time.monotonic()
+        assert session.run("sleep 10", timeout=0.3)[1] is None
+        assert time.monotonic() - start < 5
+        assert session.run("pwd") == ("/\n", 0)
+    finally:
+        session.close()
+
+
+def test_exit_restarts_shell():
+    session = ShellSession()
+    try:
+        assert session.run("exit 4")[1] == 4
+        assert session.run("echo back") == ("back\n", 0)
+    finally:
+        session.close()
+
+
+def test_syntax_error_does_not_break_session():
+    session = ShellSession()
+    try:
+        output, code = session.run("if then")
+        assert code != 0
+        assert "syntax error" in output
+        assert session.run("echo ok") == ("ok\n", 0)
+    finally:
+        session.close()
+
+
+def test_close_resets_cwd():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        session = ShellSession(cwd=tmpdir)
+        session.run("cd /")
+        session.close()
+        assert session.cwd == tmpdir
+
+
+def test_run_once_timeout():
+    assert run_once("sleep 10", timeout=0.2) == ("", None)
+
+
+def test_bash_uses_given_session():
+    session = ShellSession()
+    try:
+        bash("cd /tmp", shell=session)
+        assert bash("pwd", shell=session) == session.cwd
+        assert bash("exit 2", shell=session) == "[exit code: 2]"
+    finally:
+        session.close()
+
+
+def test_output_is_streamed_without_the_sentinel():
+    session = ShellSession()
+    chunks: list[str] = []
+    try:
+        output = CommandOutput(chunks.append, session.spill_dir)
+        assert session.run("echo one; sleep 0.2; echo two", output=output) == ("one\ntwo\n", 0)
+        assert len(chunks) >= 2  # one arrived before two was printed
+        assert "".join(chunks) == "one\ntwo\n"
+    finally:
+        session.close()
+
+
+def test_long_output_keeps_head_and_tail_and_spills():
+    session = ShellSession()
+    try:
+        output, code = session.run("seq 1 100000")
+        assert code == 0
+        assert output.startswith("1\n2\n")
+        assert output.endswith("99999\n100000\n")
+        assert len(output) < HEAD_BYTES + TAIL_BYTES + 200
+        path = re.search(r"is in (\S+);", output)
+        assert path is not None
+        with open(path.group(1)) as f:
+            assert f.read().split() == [str(i) for i in range(1, 100001)]
+    finally:
+        session.close()
+    assert not os.path.exists(path.group(1))
+
+
+def test_command_output_cuts_at_lines_and_decodes_across_chunks(tmp_path: Path):
+    chunks: list[str] = []
+    output = CommandOutput(chunks.append, str(tmp_path))
+    data = ("é" * 50 + "\n").encode() * 1000
+    for i in range(0, len(data), 7):  # Splits the two-byte characters
+        output.write(data[i : i + 7])
+    text = output.text()
+    assert "".join(chunks) == data.decode()
+    head, note, tail = text.partition("\n[...")
+    assert set(head.splitlines()) == {"é" * 50}
+    assert set(tail.splitlines()[1:]) == {"é" * 50}
+    assert "�" not in text
+
+
+def test_timeout_keeps_output_so_far():
+    assert bash("echo started; sleep 10", timeout=0.3) == "started\n\n[timed out after 0.3s]"
+
+
+def test_run_once_streams():
+    chunks: list[str] = []
+    assert run_once("echo a; echo b >&2", output=CommandOutput(chunks.append)) == ("a\nb\n", 0)
+    assert "".join(chunks) == "a\nb\n"
@@ -3,7 +3,8 @@
 import tempfile
 from pathlib import Path
 
-from lsimons_agent.tools import bash, edit_file, execute, read_file, write_file
+import pytest
+from lsimons_agent.tools import bash, edit_file, execute, multi_edit, read_file, write_file
 
 
 def test_read_file():
@@ -14,6 +15,13 @@ def test_read_file():
         assert result == "hello world"
 
 
+def test_read_file_line_range(tmp_path: Path):
+    path = tmp_path / "lines.txt"
+    path.write_text("one\ntwo\nthree\n")
+    assert read_file(str(path), start_line=2, end_line=2) == "two\n"
+    assert execute("read_file", {"path": str(path), "start_line": 3}) == "three\n"
+
+
 def test_read_file_not_found():
     try:
         read_file("/nonexistent/file.txt")
@@ -92,6 +100,80 @@ def test_execute_read_file():
         assert result == "content"
 
 
+def test_edit_file_with_edits(tmp_path: Path):
+    path = tmp_path / "a.py"
+    path.write_text("a = 1\nb = 2\n")
+    edits = [
+        {"old_string": "a = 1", "new_string": "a = 10"},
+        {"old_string": "a = 10", "new_string": "c = 3"},
+    ]
+    assert edit_file(str(path), edits=edits) == "OK"
+    assert path.read_text() == "c = 3\nb = 2\n"
+
+
+def test_multi_edit_across_files(tmp_path: Path):
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("x = 1\ny = 2\n")
+    b.write_text("z = 3\n")
+    result = multi_edit(
+        [
+            {"path": str(a), "old_string": "x = 1", "new_string": "x = 5"},
+            {"path": str(b), "old_string": "z = 3", "new_string": "z = 6"},
+            {"path": str(a), "old_string": "y = 2", "new_string": "y = 7"},
+        ]
+    )
+    assert result == "OK: 3 edits in 2 files"
+    assert a.read_text() == "x = 5\ny = 7\n"
+    assert b.read_text() == "z = 6\n"
+
+
+def test_multi_edit_one_file_by_two_paths(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text("x = 1\ny = 2\n")
+    result = multi_edit(
+        [
+            {"path": "a.txt", "old_string": "x = 1", "new_string": "x = 5"},
+            {"path": "./a.txt", "old_string": "y = 2", "new_string": "y = 7"},
+        ]
+    )
+    assert result == "OK: 2 edits in 1 files"
+    assert (tmp_path / "a.txt").read_text() == "x = 5\ny = 7\n"
+
+
+def test_multi_edit_is_all_or_nothing(tmp_path: Path):
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("x = 1\n")
+    b.write_text("z = 3\nz = 3\n")
+    edits = [
+        {"path": str(a), "old_string": "x = 1", "new_string": "x = 5"},
+        {"path": str(b), "old_string": "z = 3", "new_string": "z = 6"},
+        {"path": str(a), "old_string": "missing", "new_string": ""},
+    ]
+    try:
+        multi_edit(edits)
+        raise AssertionError("Should have raised ValueError")
+    except ValueError as e:
+        assert "edit 2: String appears 2 times" in str(e)
+        assert "edit 3: String not found" in str(e)
+    assert a.read_text() == "x = 1\n"
+    assert b.read_text() == "z = 3\nz = 3\n"
+
+
+def test_multi_edit_missing_file_changes_nothing(tmp_path: Path):
+    a = tmp_path / "a.py"
+    a.write_text("x = 1\n")
+    edits = [
+        {"path": str(a), "old_string": "x = 1", "new_string": "x = 5"},
+        {"path": str(tmp_path / "missing.py"), "old_string": "y", "new_string": "z"},
+    ]
+    try:
+        multi_edit(edits)
+        raise AssertionError("Should have raised FileNotFoundError")
+    except FileNotFoundError:
+        pass
+    assert a.read_text() == "x = 1\n"
+
+
 def test_execute_write_file():
     with tempfile.TemporaryDirectory() as tmpdir:
         path = str(Path(tmpdir) / "test.txt")
@@ -107,6 +189,13 @@ def test_execute_edit_file():
         assert result == "OK"
 
 
+def test_execute_multi_edit(tmp_path: Path):
+    path = tmp_path / "a.txt"
+    path.write_text("old text")
+    edits = [{"path": str(path), "old_string": "old", "new_string": "new"}]
+    assert execute("multi_edit", {"edits": edits}) == "OK: 1 edits in 1 files"
+
+
 def test_execute_bash():
     result = execute("bash", {"command": "echo test"})
     assert result == "test"
@@ -0,0 +1,145 @@
+"""Tests for trigram module."""
+
+import os
+import re
+from pathlib import Path
+
+import pytest
+from lsimons_agent import trigram
+from lsimons_agent.search import find
+from lsimons_agent.tools import search
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(trigram, "PROJECTS_DIR", str(tmp_path / "git"))
+    monkeypatch.setattr(trigram, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(trigram, "_indexes", {})
+    root = tmp_path / "git" / "org" / "repo"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "a.py").write_text("def handle_request(req):\n    return req\n")
+    (root / "src" / "b.py").write_text("x = 1\n")
+    (root / "README.md").write_text("Call Handle_Request to begin.\n")
+    (root / "logo.png").write_bytes(b"\x89PNG\0handle_request")
+    return root
+
+
+def trigrams_of(text: str) -> set[int]:
+    data = text.lower().encode()
+    return {a << 16 | b << 8 | c for a, b, c in zip(data, data[1:], data[2:], strict=False)}
+
+
+def test_project_root(project: Path, tmp_path: Path):
+    assert trigram.project_root(str(project / "src")) == str(project)
+    assert trigram.project_root(str(project)) == str(project)
+    assert trigram.project_root(str(tmp_path / "git" / "org")) is None
+    assert trigram.project_root(str(tmp_path)) is None
+
+
+def test_query_extracts_required_literals():
+    assert trigram.query("handle_request") == [trigrams_of("handle_request")]
+    assert trigram.query(r"foo\.bar(baz|qux)+") == [trigrams_of("foo.bar")]
+    assert trigram.query("abcd?e") == [trigrams_of("abc") | trigrams_of("e")]
+    assert trigram.query("abcx{0,2}def") == [trigrams_of("abc") | trigrams_of("def")]
+    assert trigram.query("abc{2}") == [trigrams_of("abc")]
+    assert trigram.query("one|two[|]xyz") == [
+        trigrams_of("one"),
+        trigrams_of("two") | trigrams_of("xyz"),
+    ]
+    assert trigram.query(r"def \w+\(self") == [trigrams_of("def ") | trigrams_of("(self")]
+
+
+def test_query_gives_up_when_a_branch_matches_anything():
+    assert trigram.query("foo|.*") is None
+    assert trigram.query(r"\x41bc") is None
+    assert trigram.query("(?x) a b c") is None
+    assert trigram.query("[") is None
+
+
+def test_query_breaks_at_unicode_case_folds():
+    # With IGNORECASE, "s" also matches "ſ" and "k" the Kelvin sign
+    assert trigram.query("taskmaster", ignore_case=True) == [trigrams_of("ter")]
+    assert trigram.query("(?i)taskmaster") == [trigrams_of("ter")]
+    assert re.search("(?i)taskmaster", "TAſKMAſTER")
+
+
+def test_index_narrows_search(project: Path):
+    assert trigram.update(str(project))
+    keep = trigram.candidates(str(project), "handle_request")
+    assert keep is not None
+    files = [str(project / n) for n in ("README.md", "src/a.py", "src/b.py")]
+    assert [os.path.basename(p) for p in files if keep(p)] == ["README.md", "a.py"]
+    assert not keep(str(project / "logo.png"))  # Binary: indexed without trigrams
+    matches, _ = find("handle_request", str(project), keep=keep)
+    assert [m.path for m in matches] == [str(project / "src" / "a.py")]
+
+
+def test_relative_roots(project: Path, monkeypatch: pytest.MonkeyPatch):
+    trigram.update(str(project))
+    monkeypatch.chdir(project / "src")
+    keep = trigram.candidates(".", "x = 1")
+    assert keep is not None
+    assert keep("./b.py") and not keep("./a.py")
+    keep = trigram.candidates("a.py", "x = 1")
+    assert keep is not None and not keep("a.py")
+
+
+def test_changed_and_new_files_are_searched(project: Path, monkeypatch: pytest.MonkeyPatch):
+    trigram.update(str(project))
+    updates: list[str] = []
+    monkeypatch.setattr(trigram, "update_in_background", updates.append)
+    (project / "src" / "b.py").write_text("handle_request = None\n")
+    (project / "src" / "c.py").write_text("handle_request()\n")
+    output = search("handle_request", str(project / "src"))
+    assert output.splitlines() == [
+        f"{project}/src/a.py:1:def handle_request(req):",
+        f"{project}/src/b.py:1:handle_request = None",
+        f"{project}/src/c.py:1:handle_request()",
+    ]
+    assert updates == [str(project)]
+
+
+def test_update_writes_a_delta(project: Path):
+    assert trigram.update(str(project))
+    assert not trigram.update(str(project))  # Nothing changed
+    (project / "src" / "b.py").write_text("y = 2\n")
+    assert trigram.update(str(project))
+    index = trigram.load(str(project))
+    assert index is not None and index.delta is not None
+    assert list(index.delta.files) == ["src/b.py"]
+    keep = trigram.candidates(str(project), "y = 2")
+    assert keep is not None and keep(str(project / "src" / "b.py"))
+    assert not trigram.update(str(project))
+
+
+def test_update_rebuilds_when_most_files_changed(project: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(trigram, "MIN_DELTA", 0)
+    trigram.update(str(project))
+    for name in ("src/a.py", "src/b.py"):
+        (project / name).write_text("z = 3\n")
+    assert trigram.update(str(project))
+    index = trigram.load(str(project))
+    assert index is not None and index.delta is None
+    assert len(index.base.files) == 4
+
+
+def test_disabled_or_outside_projects(
+    project: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    trigram.update(str(project))
+    assert trigram.candidates(str(tmp_path), "handle_request") is None
+    monkeypatch.setenv("AGENT_SEARCH_INDEX", "0")
+    assert trigram.candidates(str(project), "handle_request") is None
+
+
+def test_racily_clean_files_are_searched(project: Path, monkeypatch: pytest.MonkeyPatch):
+    trigram.update(str(project))
+    monkeypatch.setattr(trigram, "update_in_background", lambda project: None)
+    b = project / "src" / "b.py"
+    keep = trigram.candidates(str(project), "handle_request")
+    assert keep is not None and not keep(str(b))
+    # The index was written in the same timestamp tick b.py was last changed
+    mtime = b.stat().st_mtime_ns
+    os.utime(trigram._index_paths(str(project)).base, ns=(mtime, mtime))  # type: ignore[reportPrivateUsage]
+    keep = trigram.candidates(str(project), "handle_request")
+    assert keep is not None and keep(str(b))
@@ -1,14 +1,69 @@
 """Mock LLM server that returns canned responses."""
 
+import argparse
 import json
+import random
+import re
+import time
 import uuid
+from collections.abc import Generator
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 
 app = FastAPI()
 
+
+@dataclass
+class Settings:
+    """Runtime behaviour, set from the command line."""
+
+    chunk_delay: float = 0.0  # Seconds between generated chunks, to imitate a real model
+
+    # Fault injection: the share of requests that are slow or fail, and how
+    latency: float = 0.0  # Seconds before every response
+    slow_rate: float = 0.0
+    slow_delay: float = 1.0  # Extra seconds for slow responses
+    rate_429: float = 0.0
+    rate_500: float = 0.0
+    drop_rate: float = 0.0  # Close the connection before the body is complete
+    retry_after: float = 1.0  # Seconds, sent with 429 responses
+
+
+settings = Settings()
+rng = random.Random()
+
+
+def inject_fault() -> Response | None:
+    """Wait as long as the settings say, and return an error response if one is due."""
+    delay = settings.latency
+    if rng.random() < settings.slow_rate:
+        delay += settings.slow_delay
+    time.sleep(delay)
+    roll = rng.random()
+    if roll < settings.rate_429:
+        error = {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}}
+        headers = {"Retry-After": f"{settings.retry_after:g}"}
+        return JSONResponse(error, status_code=429, headers=headers)
+    roll -= settings.rate_429
+    if roll < settings.rate_500:
+        error = {"error": {"message": "Injected failure", "type": "server_error"}}
+        return JSONResponse(error, status_code=500)
+    roll -= settings.rate_500
+    if roll < settings.drop_rate:
+        return StreamingResponse(dropped(), media_type="application/json")
+    return None
+
+
+def dropped() -> Generator[str]:
+    """Start a response body and break off, which closes the connection."""
+    yield '{"id": "mock-'
+    raise ConnectionAbortedError("injected fault: dropped connection")
+
+
 # Load scenarios from file
 SCENARIOS_PATH = Path(__file__).parent.parent.parent / "scenarios.json"
 with open(SCENARIOS_PATH) as f:
@@ -26,8 +81,14 @@ def find_scenario(user_message: str) -> dict[str, Any] | None:
 
 
 def get_step_index(messages: list[dict[str, Any]]) -> int:
-    """Count tool result messages to determine current step."""
-    return sum(1 for m in messages if m.get("role") == "tool")
+    """Count tool-calling assistant turns since the last user message to determine current step."""
+    step = 0
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            break
+        if m.get("role") == "assistant" and m.get("tool_calls"):
+            step += 1
+    return step
 
 
 def build_response(
@@ -52,9 +113,50 @@ def build_response(
     }
 
 
-@app.post("/chat/completions")
-def chat_completions(request: dict[str, Any]) -> dict[str, Any]:
-    """Handle chat completion requests."""
+def stream_response(response: dict[str, Any]) -> Generator[str]:
+    """Split a response into OpenAI-format streaming chunks (server-sent events)."""
+    message: dict[str, Any] = response["choices"][0]["message"]
+    chunk_id = response["id"]
+
+    def chunk(delta: dict[str, Any], finish_reason: str | None = None) -> str:
+        data = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "model": "mock-model",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    yield chunk({"role": "assistant"})
+
+    # Content one word at a time
+    for word in re.findall(r"\s*\S+", message.get("content") or ""):
+        time.sleep(settings.chunk_delay)
+        yield chunk({"content": word})
+
+    # Tool calls: id and name first, then the arguments in small fragments
+    tool_calls: list[dict[str, Any]] = message.get("tool_calls", [])
+    for index, call in enumerate(tool_calls):
+        header = {"name": call["function"]["name"], "arguments": ""}
+        yield chunk(
+            {
+                "tool_calls": [
+                    {"index": index, "id": call["id"], "type": "function", "function": header}
+                ]
+            }
+        )
+        arguments: str = call["function"]["arguments"]
+        for start in range(0, len(arguments), 16):
+            time.sleep(settings.chunk_delay)
+            fragment = {"arguments": arguments[start : start + 16]}
+            yield chunk({"tool_calls": [{"index": index, "function": fragment}]})
+
+    yield chunk({}, response["choices"][0]["finish_reason"])
+    yield "data: [DONE]\n\n"
+
+
+def build_scenario_response(request: dict[str, Any]) -> dict[str, Any]:
+    """Build the canned response for a chat completion request."""
     messages: list[dict[str, Any]] = request.get("messages", [])
 
     # Get last user message
@@ -83,6 +185,22 @@ def chat_completions(request: dict[str, Any]) -> dict[str, Any]:
     )
 
 
+@app.post("/chat/completions", response_model=None)
+def chat_completions(request: dict[str, Any]) -> dict[str, Any] | Response:
+    """Handle chat completion requests, streaming them when asked to."""
+    fault = inject_fault()
+    if fault is not None:
+        return fault
+    response = build_scenario_response(request)
+    if request.get("stream"):
+        return StreamingResponse(stream_response(response), media_type="text/event-stream")
+    if settings.chunk_delay:
+        # Take as long to answer as the streamed version would
+        for _ in stream_response(response):
+            pass
+    return response
+
+
 @app.get("/health")
 def health() -> dict[str, str]:
     """Health check endpoint."""
@@ -93,8 +211,38 @@ def main() -> None:
     """Run the mock server."""
     import uvicorn
 
-    print("Starting mock LLM server on http://localhost:8000")
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    parser = argparse.ArgumentParser(description="Mock LLM server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--chunk-delay", type=float, default=0.0, help="Seconds between streamed chunks"
+    )
+    faults = parser.add_argument_group("fault injection")
+    faults.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    faults.add_argument("--slow-rate", type=float, default=0.0, help="Share of slow responses")
+    faults.add_argument(
+        "--slow-delay", type=float, default=1.0, help="Extra seconds for slow responses"
+    )
+    faults.add_argument("--rate-429", type=float, default=0.0, help="Share of 429 responses")
+    faults.add_argument("--rate-500", type=float, default=0.0, help="Share of 500 responses")
+    faults.add_argument("--drop-rate", type=float, default=0.0, help="Share of dropped connections")
+    faults.add_argument(
+        "--retry-after", type=float, default=1.0, help="Retry-After seconds for 429s"
+    )
+    faults.add_argument("--seed", type=int, help="Seed for the fault dice")
+    args = parser.parse_args()
+
+    settings.chunk_delay = args.chunk_delay
+    settings.latency = args.latency
+    settings.slow_rate = args.slow_rate
+    settings.slow_delay = args.slow_delay
+    settings.rate_429 = args.rate_429
+    settings.rate_500 = args.rate_500
+    settings.drop_rate = args.drop_rate
+    settings.retry_after = args.retry_after
+    rng.seed(args.seed)
+
+    print(f"Starting mock LLM server on http://localhost:{args.port}")
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
 
 
 if __name__ == "__main__":
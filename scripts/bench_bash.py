@@ -0,0 +1,40 @@
+"""Per-call overhead of the bash tool: fresh subprocess vs persistent shell session.
+
+Usage: uv run python scripts/bench_bash.py [calls]
+"""
+
+import subprocess
+import sys
+import time
+
+from benchlib import percentile
+from lsimons_agent.shell import ShellSession
+
+
+def fresh_subprocess(command: str) -> None:
+    """The pre-session bash tool: one shell=True subprocess per call."""
+    subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
+
+
+def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    session = ShellSession()
+    runners = [("subprocess", fresh_subprocess), ("session", session.run)]
+    for command in ("true", "echo hello", "ls /"):
+        for label, fn in runners:
+            fn(command)  # warm up
+            latencies: list[float] = []
+            for _ in range(calls):
+                start = time.perf_counter()
+                fn(command)
+                latencies.append(time.perf_counter() - start)
+            print(
+                f"{command!r:<14} {label:<11}"
+                f" p50 {percentile(latencies, 50) * 1e6:8.0f} us"
+                f"  p99 {percentile(latencies, 99) * 1e6:8.0f} us"
+            )
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""LLM response cache: uncached requests vs cache hits.
+
+Replays the same set of prompts twice through lsimons_agent.llm.chat against
+mock-llm-server with LLM_CACHE pointing at a fresh database. The first pass
+fills the cache, the second is answered from it.
+
+Usage: uv run python scripts/bench_cache.py [prompts] [chunk_delay]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchlib import mock_llm_server, report
+
+
+def replay(prompts: int) -> list[float]:
+    from lsimons_agent import llm
+
+    latencies: list[float] = []
+    for i in range(prompts):
+        messages = [{"role": "user", "content": f"how are you ({i})"}]
+        start = time.perf_counter()
+        llm.chat(messages)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main() -> None:
+    prompts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chunk_delay = sys.argv[2] if len(sys.argv) > 2 else "0.01"
+    with tempfile.TemporaryDirectory() as tmp, mock_llm_server("--chunk-delay", chunk_delay) as url:
+        os.environ["LLM_BASE_URL"] = url
+        os.environ["LLM_CACHE"] = os.path.join(tmp, "cache.sqlite")
+        from lsimons_agent import llm
+
+        for label in ("miss", "hit"):
+            start = time.perf_counter()
+            latencies = replay(prompts)
+            report(label, latencies, time.perf_counter() - start)
+        llm.close()  # Prints the hit/miss summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Per-step request encoding cost as a conversation grows.
+
+Simulates an agent session where every step appends an assistant tool call
+and a 4 KB tool result, and times building the request body for each step:
+json.dumps of the whole payload (what httpx's json= did) against
+llm._build_request, which only encodes messages it hasn't seen. "new only"
+is the JSON encoding of the step's new messages: the incremental time minus
+a second, fully cached build. The part that still grows with the history is
+copying the cached fragments into one body.
+
+Usage: uv run python scripts/bench_encode.py [steps]
+"""
+
+import json
+import sys
+import time
+from typing import Any
+
+from lsimons_agent import llm
+from lsimons_agent.agent import new_conversation
+from lsimons_agent.tools import TOOLS
+
+
+def full_encode(messages: list[dict[str, Any]]) -> bytes:
+    payload = {"model": "mock-model", "messages": messages, "max_tokens": 4096, "tools": TOOLS}
+    return json.dumps(payload).encode()
+
+
+def main() -> None:
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    checkpoints = {10, 100, 500, 1000, 2000, steps}
+    messages = new_conversation()
+    print(f"{'step':>6} {'history':>9} {'full encode':>12} {'incremental':>12} {'new only':>10}")
+    for step in range(1, steps + 1):
+        call_id = f"call_{step}"
+        arguments = json.dumps({"command": f"cat log.{step}"})
+        messages.append(
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": call_id,
+                        "type": "function",
+                        "function": {"name": "bash", "arguments": arguments},
+                    }
+                ],
+            }
+        )
+        messages.append({"role": "tool", "tool_call_id": call_id, "content": f"{step} " * 1000})
+
+        start = time.perf_counter()
+        body = full_encode(messages)
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        llm._build_request(messages, TOOLS, "mock-model")  # type: ignore[reportPrivateUsage]
+        incremental = time.perf_counter() - start
+        start = time.perf_counter()
+        llm._build_request(messages, TOOLS, "mock-model")  # type: ignore[reportPrivateUsage]
+        cached = time.perf_counter() - start
+        if step in checkpoints:
+            print(
+                f"{step:>6} {len(body) / 1e6:>7.1f}MB {full * 1000:>10.2f}ms"
+                f" {incremental * 1000:>10.2f}ms {max(0.0, incremental - cached) * 1000:>8.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Tail latency and failure rate of chat() with and without retries and hedging.
+
+Runs mock-llm-server with fault injection twice: once with occasional slow
+responses, to compare latency percentiles without and with hedging, and
+once with 429s, 500s and dropped connections, to compare how many requests
+fail without and with retries.
+
+Usage: uv run python scripts/bench_hedging.py [requests]
+"""
+
+import os
+import sys
+import time
+
+import httpx
+from benchlib import mock_llm_server, report
+from lsimons_agent import llm, retry
+
+MESSAGES = [{"role": "user", "content": "how are you"}]
+
+
+def run(requests: int, env: dict[str, str]) -> tuple[list[float], int, float]:
+    """Send requests one at a time; return latencies, failures and elapsed seconds."""
+    os.environ.update(env)
+    llm._latencies = retry.Latencies()  # type: ignore[reportPrivateUsage]
+    attempts: list[retry.Attempt] = []
+    llm.attempt_hooks[:] = [attempts.append]
+    latencies: list[float] = []
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        began = time.perf_counter()
+        try:
+            llm.chat(MESSAGES)
+        except httpx.HTTPError:
+            failures += 1
+        latencies.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - start
+    hedges = sum(attempt.hedge for attempt in attempts)
+    print(f"{len(attempts)} attempts for {requests} requests, {hedges} of them hedges")
+    return latencies, failures, elapsed
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    slow = ("--latency", "0.02", "--slow-rate", "0.03", "--slow-delay", "1", "--seed", "1")
+    with mock_llm_server(*slow) as base_url:
+        os.environ["LLM_BASE_URL"] = base_url
+        for label, hedge in (("no hedging", "0"), ("hedging", "1")):
+            env = {"LLM_HEDGE": hedge, "LLM_HEDGE_DELAY": "0.1", "LLM_RETRIES": "0"}
+            latencies, _, elapsed = run(requests, env)
+            report(label, latencies, elapsed)
+        llm.close()
+
+    faults = ("--rate-429", "0.1", "--rate-500", "0.1", "--drop-rate", "0.05", "--seed", "1")
+    with mock_llm_server(*faults, "--retry-after", "0.05") as base_url:
+        os.environ["LLM_BASE_URL"] = base_url
+        for label, retries in (("no retries", "0"), ("3 retries", "3")):
+            env = {"LLM_HEDGE": "0", "LLM_RETRIES": retries, "LLM_RETRY_BASE_DELAY": "0.05"}
+            latencies, failures, elapsed = run(requests, env)
+            report(label, latencies, elapsed)
+            print(f"{'':<12} {failures} of {requests} requests failed")
+        llm.close()
+
+
+if __name__ == "__main__":
+    main()
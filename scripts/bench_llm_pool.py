@@ -0,0 +1,58 @@
+"""Benchmark llm.chat with and without connection pooling against mock-llm-server.
+
+Usage: uv run python scripts/bench_llm_pool.py [requests] [threads]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import httpx
+from benchlib import mock_llm_server, report
+from lsimons_agent import llm
+
+MESSAGES: list[dict[str, Any]] = [{"role": "user", "content": "how are you"}]
+
+
+def unpooled_chat() -> None:
+    """The pre-pooling request path: a fresh client per call."""
+    base_url = os.environ["LLM_BASE_URL"]
+    payload = {"model": "mock-model", "messages": MESSAGES, "max_tokens": 4096}
+    response = httpx.post(f"{base_url}/chat/completions", json=payload, timeout=120.0)
+    response.raise_for_status()
+    response.json()
+
+
+def pooled_chat() -> None:
+    llm.chat(MESSAGES)
+
+
+def run(label: str, fn: Any, requests: int, threads: int) -> None:
+    def timed(_: int) -> float:
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    fn()  # warm up
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(timed, range(requests)))
+    report(label, latencies, time.perf_counter() - start)
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    with mock_llm_server() as base_url:
+        os.environ["LLM_BASE_URL"] = base_url
+        print(f"{requests} requests, {threads} thread(s), {base_url}")
+        run("unpooled", unpooled_chat, requests, threads)
+        run("pooled", pooled_chat, requests, threads)
+        llm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Compare sequential and parallel tool execution on the 'run slow commands' scenario.
+
+The scenario returns four read-only `sleep 1` bash calls in one response.
+
+Usage: uv run python scripts/bench_parallel_tools.py
+"""
+
+import os
+import time
+
+from benchlib import mock_llm_server
+from lsimons_agent import llm
+from lsimons_agent.agent import new_conversation, process_message
+
+
+def main() -> None:
+    with mock_llm_server() as base_url:
+        os.environ["LLM_BASE_URL"] = base_url
+        for workers in ("1", "4"):
+            os.environ["AGENT_TOOL_WORKERS"] = workers
+            start = time.perf_counter()
+            for _ in process_message(new_conversation(), "run slow commands"):
+                pass
+            print(f"AGENT_TOOL_WORKERS={workers}  {time.perf_counter() - start:6.2f} s")
+        llm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""read_file on large files: whole-file read_text vs ranged, memory-mapped reads.
+
+Writes a synthetic log of the given size (default 1 GB) and a binary file of
+the same size to a temporary directory, then times:
+- Path.read_text (what read_file did before),
+- a capped read without a range,
+- lines 100000-100200, cold (building the line index up to there) and warm,
+- 200 lines near the end of the file, cold and warm,
+- describing the binary file.
+
+Usage: uv run python scripts/bench_read_file.py [megabytes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from lsimons_agent import files
+from lsimons_agent.tools import read_file
+
+
+def timed(label: str, fn: Callable[[], str]) -> None:
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:10.2f} ms  {len(result):>12,} chars")
+
+
+def main() -> None:
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "big.log"
+        line = b"2024-01-01T00:00:00Z INFO request handled in 12ms path=/api/v1/items\n"
+        block = line * (1024 * 1024 // len(line))
+        with open(log, "wb") as f:
+            for _ in range(megabytes):
+                f.write(block)
+        lines = megabytes * (len(block) // len(line))
+        binary = Path(tmp) / "big.bin"
+        with open(binary, "wb") as f:
+            for _ in range(megabytes):
+                f.write(os.urandom(1024 * 1024))
+        print(f"{log.stat().st_size / 1e6:.0f} MB, {lines:,} lines")
+
+        path = str(log)
+        if megabytes <= 1024:
+            timed("read_text (whole file)", lambda: log.read_text())
+        timed("read_file, no range", lambda: read_file(path))
+        timed("lines 100000-100200, cold", lambda: read_file(path, 100_000, 100_200))
+        timed("lines 100000-100200, warm", lambda: read_file(path, 100_000, 100_200))
+        files._indexes.clear()  # type: ignore[reportPrivateUsage]
+        timed("last 200 lines, cold", lambda: read_file(path, lines - 199, lines))
+        timed("last 200 lines, warm", lambda: read_file(path, lines - 199, lines))
+        timed("binary file", lambda: read_file(str(binary)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Repo discovery for /api/repos: full rescan vs incremental RepoIndex.
+
+Builds a synthetic ~/git with 10k repos (50 orgs x 200 repos) in a temporary
+directory and times the old full scan, a cold index build, a refresh with
+nothing changed and a refresh after one org changed.
+
+Usage: uv run python scripts/bench_repos.py [orgs] [repos_per_org]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from lsimons_agent_web.repos import RepoIndex
+
+
+def full_scan(base_dir: Path) -> dict[str, list[str]]:
+    """The pre-index scan: iterdir plus an exists() check per directory, every call."""
+    repos: dict[str, list[str]] = {}
+    for org_dir in sorted(base_dir.iterdir()):
+        if not org_dir.is_dir() or org_dir.name.startswith("."):
+            continue
+        org_repos = [
+            repo_dir.name
+            for repo_dir in sorted(org_dir.iterdir())
+            if repo_dir.is_dir() and not repo_dir.name.startswith(".")
+            if (repo_dir / ".git").exists()
+        ]
+        if org_repos:
+            repos[org_dir.name] = org_repos
+    return repos
+
+
+def timed(label: str, fn: Callable[[], object], runs: int = 5) -> None:
+    """Print the best of several runs."""
+    times: list[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    print(f"{label:<22} {min(times) * 1000:9.2f} ms")
+
+
+def main() -> None:
+    orgs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    per_org = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = Path(tmp)
+        for org in range(orgs):
+            for repo in range(per_org):
+                os.makedirs(base_dir / f"org{org:03d}" / f"repo{repo:04d}" / ".git")
+        print(f"{orgs * per_org} repos in {orgs} orgs")
+
+        timed("full scan", lambda: full_scan(base_dir))
+        timed("index, cold", lambda: RepoIndex(base_dir).get())
+
+        index = RepoIndex(base_dir)
+        assert index.get()[0] == full_scan(base_dir)
+        timed("index, unchanged", index.get, runs=50)
+
+        counter = iter(range(1_000_000))
+
+        def change_one_org() -> None:
+            os.makedirs(base_dir / "org000" / f"new{next(counter)}" / ".git")
+            index.get()
+
+        timed("index, one org changed", change_one_org)
+
+
+if __name__ == "__main__":
+    main()
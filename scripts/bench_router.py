@@ -0,0 +1,93 @@
+"""Latency of chat() over several endpoints, routed at random and by the router.
+
+Runs three mock-llm-server instances: a fast one, a slower one and a slow
+one that fails a fifth of its requests. Eight threads each hold a
+conversation and send requests one after another. Reports latency, how
+many requests failed despite retries, and how often a conversation's
+request went to the same endpoint as its previous one (what keeps a
+provider's prompt cache warm).
+
+Usage: uv run python scripts/bench_router.py [requests per conversation]
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from benchlib import mock_llm_server, report
+from lsimons_agent import llm
+from lsimons_agent.router import Endpoint, Router
+
+CONVERSATIONS = 8
+SERVERS = (
+    ("--latency", "0.02"),
+    ("--latency", "0.06"),
+    ("--latency", "0.2", "--rate-500", "0.2"),
+)
+
+
+class Recording(Router):
+    """A router that remembers which endpoint each conversation's requests went to."""
+
+    def __init__(self, urls: list[str]):
+        super().__init__(urls)
+        self.picks: dict[str | None, list[str]] = {}
+        self._picks_lock = threading.Lock()
+
+    def pick(self, affinity: str | None = None) -> Endpoint:
+        endpoint = super().pick(affinity)
+        with self._picks_lock:
+            self.picks.setdefault(affinity, []).append(endpoint.url)
+        return endpoint
+
+
+class RandomRouter(Recording):
+    def _choose(self, affinity: str | None) -> Endpoint:
+        return self.rng.choice(self.endpoints)
+
+
+def converse(index: int, requests: int) -> tuple[list[float], int]:
+    messages = [{"role": "user", "content": f"how are you, conversation {index}"}]
+    latencies: list[float] = []
+    failures = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            llm.chat(messages)
+        except httpx.HTTPError:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failures
+
+
+def run(label: str, router: Recording, requests: int) -> None:
+    llm._router = router  # type: ignore[reportPrivateUsage]
+    llm._router_urls = os.environ["LLM_BASE_URLS"]  # type: ignore[reportPrivateUsage]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONVERSATIONS) as pool:
+        results = list(pool.map(converse, range(CONVERSATIONS), [requests] * CONVERSATIONS))
+    elapsed = time.perf_counter() - start
+    report(label, [latency for latencies, _ in results for latency in latencies], elapsed)
+    failures = sum(failures for _, failures in results)
+    pairs = [pair for urls in router.picks.values() for pair in zip(urls, urls[1:], strict=False)]
+    same = sum(a == b for a, b in pairs) / len(pairs)
+    print(f"{'':<12} {failures} failed, same endpoint as the previous request {same:.0%}")
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    os.environ.update(LLM_RETRIES="3", LLM_RETRY_BASE_DELAY="0.05", LLM_HEDGE="0")
+    with contextlib.ExitStack() as stack:
+        urls = [stack.enter_context(mock_llm_server(*args)) for args in SERVERS]
+        os.environ["LLM_BASE_URLS"] = ",".join(urls)
+        run("random", RandomRouter(urls), requests)
+        run("router", Recording(urls), requests)
+        llm.close()
+
+
+if __name__ == "__main__":
+    main()
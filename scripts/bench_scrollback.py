@@ -0,0 +1,67 @@
+"""Terminal scrollback throughput: trimmed bytearray vs ring buffer.
+
+Feeds 4KB chunks (the size of a typical PTY read) into a full scrollback
+buffer of 64KB, 1MB and 16MB and reports write throughput, then the time to
+read the whole scrollback back, as a reconnecting viewer does.
+
+Usage: uv run python scripts/bench_scrollback.py [megabytes_per_run]
+"""
+
+import sys
+import time
+
+from lsimons_agent_web.terminal import RingBuffer
+
+CHUNK = bytes(range(256)) * 16  # 4KB
+READS = 20
+
+
+class TrimmedBytearray:
+    """The pre-ring-buffer scrollback: append, then delete the excess from the front."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self._buffer.extend(data)
+        if len(self._buffer) > self.capacity:
+            del self._buffer[: len(self._buffer) - self.capacity]
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
+
+
+def measure(
+    buffer: TrimmedBytearray | RingBuffer, capacity: int, total: int
+) -> tuple[float, float]:
+    """Return (MB/s written into an already full buffer, ms per full read)."""
+    for _ in range(capacity // len(CHUNK) + 1):
+        buffer.write(CHUNK)
+    chunks = total // len(CHUNK)
+    start = time.perf_counter()
+    for _ in range(chunks):
+        buffer.write(CHUNK)
+    throughput = chunks * len(CHUNK) / (time.perf_counter() - start) / 1e6
+
+    start = time.perf_counter()
+    for _ in range(READS):
+        buffer.getvalue()
+    return throughput, (time.perf_counter() - start) / READS * 1000
+
+
+def main() -> None:
+    total = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 256 * 1024 * 1024
+    for label, capacity in (("64KB", 64 * 1024), ("1MB", 1024**2), ("16MB", 16 * 1024**2)):
+        for name, buffer in (
+            ("bytearray", TrimmedBytearray(capacity)),
+            ("ring", RingBuffer(capacity)),
+        ):
+            throughput, read_ms = measure(buffer, capacity, total)
+            print(
+                f"{label:<6} {name:<10} write {throughput:8.1f} MB/s  full read {read_ms:7.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""The search tool vs grep through the bash tool.
+
+Searches a synthetic checkout (source files plus a large ignored
+node_modules and a .git directory) or an existing directory, with both the
+search tool and `grep -rn` via the bash tool. Reports the time and the size
+of the output that would go into the conversation.
+
+Usage: uv run python scripts/bench_search.py [directory] [pattern]
+"""
+
+import os
+import shlex
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+from lsimons_agent.shell import ShellSession
+from lsimons_agent.tools import bash, search
+
+
+def make_checkout(root: str, sources: int = 3000, modules: int = 20000) -> None:
+    body = "".join(
+        f"def handler_{i}(request):\n    return render(request, {i})\n" for i in range(60)
+    )
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("node_modules/\n*.pyc\n")
+    for i in range(sources):
+        directory = os.path.join(root, "src", f"pkg{i // 100}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"mod{i}.py"), "w") as f:
+            f.write(body + ("# TODO: remove legacy path\n" if i % 50 == 0 else ""))
+    for i in range(modules):
+        directory = os.path.join(root, "node_modules", f"dep{i // 200}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"index{i}.js"), "w") as f:
+            f.write("// TODO: vendored\nmodule.exports = {};\n" * 20)
+    os.makedirs(os.path.join(root, ".git", "objects"))
+    for i in range(2000):
+        with open(os.path.join(root, ".git", "objects", f"obj{i}"), "wb") as f:
+            f.write(os.urandom(4096))
+
+
+def timed(label: str, fn: Callable[[], str]) -> None:
+    start = time.perf_counter()
+    output = fn()
+    elapsed = time.perf_counter() - start
+    lines = output.count("\n") + 1
+    print(f"{label:<24} {elapsed * 1000:9.1f} ms  {lines:>8,} lines  {len(output):>10,} chars")
+
+
+def main() -> None:
+    pattern = sys.argv[2] if len(sys.argv) > 2 else "TODO"
+    with tempfile.TemporaryDirectory() as tmp:
+        root = sys.argv[1] if len(sys.argv) > 1 else tmp
+        if root == tmp:
+            make_checkout(tmp)
+        shell = ShellSession()
+        try:
+            bash(f"cd {shlex.quote(root)}", shell=shell)
+            timed("bash: grep -rn", lambda: bash(f"grep -rn {shlex.quote(pattern)} .", shell=shell))
+            timed("search", lambda: search(pattern, root))
+            timed("search, first 10", lambda: search(pattern, root, max_results=10))
+            timed("search, all", lambda: search(pattern, root, max_results=1_000_000))
+        finally:
+            shell.close()
+
+
+if __name__ == "__main__":
+    main()
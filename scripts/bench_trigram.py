@@ -0,0 +1,111 @@
+"""Build time, size and query latency of the trigram search index.
+
+Writes a synthetic project of about a million lines (10,000 files of 100
+lines drawn from a mixed vocabulary) under a temporary ~/git/<org>/<repo>,
+then times a full index build, a no-op update and an update after editing
+20 files, and compares search with and without the index for a few
+patterns.
+
+Usage: uv run python scripts/bench_trigram.py [files] [lines per file]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+from lsimons_agent import trigram
+from lsimons_agent.search import find
+
+WORDS = (
+    "request",
+    "response",
+    "handler",
+    "config",
+    "value",
+    "result",
+    "buffer",
+    "stream",
+    "token",
+    "session",
+    "parse",
+    "render",
+    "update",
+    "delete",
+    "create",
+    "index",
+    "cache",
+    "query",
+    "filter",
+    "client",
+    "server",
+    "user",
+    "account",
+    "order",
+    "item",
+    "price",
+    "total",
+    "count",
+    "limit",
+    "offset",
+    "error",
+    "retry",
+    "timeout",
+)
+
+
+def make_project(root: str, files: int, lines: int) -> None:
+    rng = random.Random(1)
+    for i in range(files):
+        directory = os.path.join(root, "src", f"pkg{i // 100}")
+        os.makedirs(directory, exist_ok=True)
+        body: list[str] = []
+        for _ in range(lines):
+            a, b, c = rng.sample(WORDS, 3)
+            body.append(f"    {a}_{rng.randrange(500)} = {b}.{c}_{rng.randrange(500)}({a}, {i})\n")
+        if i % 1000 == 7:
+            body.append("# FIXME: drop the legacy_fallback_path\n")
+        with open(os.path.join(directory, f"mod{i}.py"), "w") as f:
+            f.writelines(body)
+
+
+def timed(label: str, fn: Callable[[], object]) -> object:
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<40} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def main() -> None:
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        trigram.PROJECTS_DIR = os.path.join(tmp, "git")
+        trigram.INDEX_DIR = os.path.join(tmp, "index")
+        project = os.path.join(trigram.PROJECTS_DIR, "org", "repo")
+        make_project(project, files, lines)
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(project) for f in fs)
+        print(f"{files:,} files, {files * lines:,} lines, {size / 1e6:.1f} MB")
+
+        timed("full build", lambda: trigram.update(project))
+        paths = trigram._index_paths(project)  # type: ignore[reportPrivateUsage]
+        print(f"{'index size':<40} {os.path.getsize(paths.base) / 1e6:10.1f} MB")
+        timed("update, nothing changed", lambda: trigram.update(project))
+        for i in range(0, files, max(1, files // 20)):
+            with open(os.path.join(project, "src", f"pkg{i // 100}", f"mod{i}.py"), "a") as f:
+                f.write("# touched\n")
+        timed("update, 20 files changed", lambda: trigram.update(project))
+        print(f"{'delta size':<40} {os.path.getsize(paths.delta) / 1e6:10.1f} MB")
+
+        for pattern in ("legacy_fallback_path", "FIXME|XXX", r"retry_4\d\d = session", "value"):
+            timed(f"scan:  {pattern}", lambda p=pattern: find(p, project))
+            timed(
+                f"index: {pattern}",
+                lambda p=pattern: find(p, project, keep=trigram.candidates(project, p)),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Measure time-to-first-token of process_message with and without streaming.
+
+Runs mock-llm-server with a per-chunk delay so that generating a reply takes
+a while, like a real model.
+
+Usage: uv run python scripts/bench_ttft.py [chunk_delay_seconds]
+"""
+
+import os
+import sys
+import time
+
+from benchlib import mock_llm_server
+from lsimons_agent import llm
+from lsimons_agent.agent import new_conversation, process_message
+
+
+def measure(stream: bool) -> tuple[float, float]:
+    """Return (seconds to first text event, seconds to done) for one turn."""
+    messages = new_conversation()
+    start = time.perf_counter()
+    first = 0.0
+    for event_type, _ in process_message(messages, "how are you", stream=stream):
+        if event_type in ("text", "text_delta") and not first:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main() -> None:
+    delay = sys.argv[1] if len(sys.argv) > 1 else "0.05"
+    with mock_llm_server("--chunk-delay", delay) as base_url:
+        os.environ["LLM_BASE_URL"] = base_url
+        measure(stream=False)  # warm up the connection pool
+        for stream in (False, True):
+            first, total = measure(stream)
+            label = "stream" if stream else "blocking"
+            print(f"{label:<10} first text {first * 1000:8.1f} ms  total {total * 1000:8.1f} ms")
+        llm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Shared helpers for the benchmark scripts."""
+
+import contextlib
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Generator
+
+import httpx
+
+
+def free_port() -> int:
+    """Return a TCP port that is currently free on localhost."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+@contextlib.contextmanager
+def mock_llm_server(*args: str) -> Generator[str]:
+    """Run mock-llm-server in a subprocess and yield its base URL."""
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "mock_llm.server", "--port", str(port), *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                httpx.get(f"{base_url}/health", timeout=1.0)
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Return the pct-th percentile (0-100) of values using nearest rank."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(label: str, latencies: list[float], elapsed: float) -> None:
+    """Print requests/sec and p50/p99 latency in milliseconds."""
+    print(
+        f"{label:<12} {len(latencies) / elapsed:8.1f} req/s"
+        f"  p50 {percentile(latencies, 50) * 1000:6.2f} ms"
+        f"  p99 {percentile(latencies, 99) * 1000:6.2f} ms"
+    )
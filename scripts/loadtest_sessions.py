@@ -0,0 +1,94 @@
+"""Load test /chat with many concurrent sessions against mock-llm-server.
+
+Runs the web server in-process and drives it with one thread per session.
+Every turn carries a message unique to its session, so afterwards each
+session's history must hold exactly its own messages, in order. Throughput
+with all sessions at once is compared with a single session.
+
+Usage: uv run python scripts/loadtest_sessions.py [sessions] [turns_per_session]
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import uvicorn
+from benchlib import free_port, mock_llm_server, report
+
+
+def run_turns(base_url: str, session_id: str, turns: int) -> list[float]:
+    """Send turns one after another in one session; return their latencies."""
+    latencies: list[float] = []
+    with httpx.Client(base_url=base_url, timeout=60.0) as client:
+        for turn in range(turns):
+            message = f"how are you ({session_id} turn {turn})"
+            start = time.perf_counter()
+            with client.stream(
+                "POST", "/chat", json={"message": message, "session_id": session_id}
+            ) as response:
+                response.raise_for_status()
+                lines = list(response.iter_lines())
+            latencies.append(time.perf_counter() - start)
+            assert "event: done" in lines, lines
+    return latencies
+
+
+def drive(base_url: str, prefix: str, sessions: int, turns: int) -> float:
+    """Run all sessions concurrently; return turns per second."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [
+            pool.submit(run_turns, base_url, f"{prefix}-{i}", turns) for i in range(sessions)
+        ]
+        latencies = [latency for future in futures for latency in future.result()]
+    elapsed = time.perf_counter() - start
+    report(f"{sessions} session{'s' * (sessions > 1)}", latencies, elapsed)
+    return len(latencies) / elapsed
+
+
+def main() -> None:
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    # Let every session hold an LLM connection at once
+    os.environ.setdefault("LLM_POOL_MAX_CONNECTIONS", str(sessions))
+
+    with mock_llm_server("--chunk-delay", "0.02") as llm_url:
+        os.environ["LLM_BASE_URL"] = llm_url
+        from lsimons_agent_web import server
+
+        server.sessions.max_sessions = 2 * sessions
+        port = free_port()
+        web = uvicorn.Server(uvicorn.Config(server.app, port=port, log_level="warning"))
+        thread = threading.Thread(target=web.run, daemon=True)
+        thread.start()
+        while not web.started:
+            time.sleep(0.05)
+        base_url = f"http://127.0.0.1:{port}"
+
+        try:
+            single = drive(base_url, "single", 1, turns)
+            concurrent = drive(base_url, "load", sessions, turns)
+
+            for i in range(sessions):
+                session_id = f"load-{i}"
+                history = server.sessions.get(session_id).messages
+                expected = [f"how are you ({session_id} turn {turn})" for turn in range(turns)]
+                actual = [m["content"] for m in history if m["role"] == "user"]
+                assert actual == expected, f"{session_id}: {actual}"
+            print(f"isolation ok: {sessions} sessions x {turns} turns")
+        finally:
+            web.should_exit = True
+            thread.join()
+
+    # Serialized sessions would stay near 1x. Most of a turn is spent waiting
+    # for the (slow) model, so even one CPU core gets well above that.
+    speedup = concurrent / single
+    print(f"throughput {speedup:.1f}x a single session")
+    assert speedup > min(sessions, 4), "sessions are not running in parallel"
+
+
+if __name__ == "__main__":
+    main()